@@ -45,6 +45,18 @@
 from __future__ import absolute_import
 
 import ast
+import hashlib
+import json
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+# Timestamp suffix that the SDK appends to job names and to the S3 prefixes of uploaded code
+_TIMESTAMP = re.compile(r"\d{4}-\d{2}-\d{2}-\d{2}-\d{2}-\d{2}-\d{3}")
+# Line written by python -X importtime: self and cumulative microseconds, indented module name
+_IMPORT_TIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|\s+(\S+)$")
 
 
 def get_pipeline_driver(module_name, passed_args=None):
@@ -88,4 +100,114 @@ def get_pipeline_custom_tags(module_name, args, tags):
         return _imports.get_pipeline_custom_tags(tags, kwargs["region"], kwargs["sagemaker_project_arn"])
     except Exception as e:
         print(f"Error getting project tags: {e}")
-    return tags
\ No newline at end of file
+    return tags
+
+
+def normalize_definition(definition):
+    """Parses a pipeline definition and masks the upload timestamps that change on every build.
+
+    The masked S3 prefixes only hold code whose content must be reflected elsewhere in the
+    definition, for example by the content-addressed cache keys of the training pipeline.
+
+    Args:
+        definition (str): pipeline definition JSON, as returned by ``pipeline.definition()``
+
+    Returns:
+        the definition as a dict
+    """
+    return json.loads(_TIMESTAMP.sub("<timestamp>", definition))
+
+
+def definition_hash(definition, **context):
+    """Canonical SHA-256 of a normalized pipeline definition.
+
+    Args:
+        definition (dict): normalized definition
+        context: other upsert arguments that must trigger an update, like the role ARN and tags
+
+    Returns:
+        hex digest
+    """
+    payload = json.dumps({"definition": definition, **context}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def diff_definitions(old, new, path=""):
+    """Structural diff of two normalized definitions.
+
+    Lists of named objects (steps, parameters) are matched by ``Name`` rather than by position.
+
+    Returns:
+        list of ``+ path: value``, ``- path: value`` and ``~ path: old -> new`` lines
+    """
+    if isinstance(old, list) and isinstance(new, list) and _named(old) and _named(new):
+        old, new = {item["Name"]: item for item in old}, {item["Name"]: item for item in new}
+    elif isinstance(old, list) and isinstance(new, list):
+        old, new = dict(enumerate(old)), dict(enumerate(new))
+    if not (isinstance(old, dict) and isinstance(new, dict)):
+        return [] if old == new else [f"~ {path}: {json.dumps(old)} -> {json.dumps(new)}"]
+    lines = []
+    for key in list(old) + [key for key in new if key not in old]:
+        child = f"{path}.{key}" if path else str(key)
+        if key not in new:
+            lines.append(f"- {child}: {json.dumps(old[key])}")
+        elif key not in old:
+            lines.append(f"+ {child}: {json.dumps(new[key])}")
+        else:
+            lines.extend(diff_definitions(old[key], new[key], child))
+    return lines
+
+
+def _named(items):
+    return all(isinstance(item, dict) and "Name" in item for item in items)
+
+
+def profile_startup(top=15, extra_arguments=()):
+    """Runs the current CLI again under ``python -X importtime`` and prints where its imports spend time.
+
+    The command runs with the same arguments minus ``--profile-startup`` plus ``extra_arguments``,
+    its output passes through and the breakdown goes to stderr: import time per top-level package
+    (self time, so every microsecond is counted once), and the slowest imports including their own
+    dependencies.
+
+    Args:
+        top (int): number of packages and modules to list
+        extra_arguments: arguments added to the profiled command, like a CLI's ``--dry-run`` so
+            that profiling never changes anything
+
+    Returns:
+        exit code of the command
+    """
+    spec = getattr(sys.modules["__main__"], "__spec__", None)
+    command = ["-m", spec.name] if spec is not None else [sys.argv[0]]
+    arguments = [argument for argument in sys.argv[1:] if argument != "--profile-startup"]
+    arguments += [argument for argument in extra_arguments if argument not in arguments]
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *command, *arguments], stderr=subprocess.PIPE, text=True
+    )
+    elapsed = time.perf_counter() - start
+
+    packages, modules = defaultdict(int), []
+    for line in result.stderr.splitlines():
+        match = _IMPORT_TIME.match(line)
+        if match is None:
+            if not line.startswith("import time:"):
+                print(line, file=sys.stderr)
+            continue
+        self_us, cumulative_us, module = match.groups()
+        packages[module.split(".")[0]] += int(self_us)
+        modules.append((int(cumulative_us), module))
+
+    total = sum(packages.values())
+    print(
+        f"\nStartup profile: {elapsed:.2f} s wall, {total / 1e6:.2f} s importing {len(modules)} modules",
+        file=sys.stderr,
+    )
+    print("Import time by package (self):", file=sys.stderr)
+    for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {self_us / 1e3:10.1f} ms {100 * self_us / max(total, 1):5.1f}%  {package}", file=sys.stderr)
+    print("Slowest imports (cumulative):", file=sys.stderr)
+    for cumulative_us, module in sorted(modules, reverse=True)[:top]:
+        print(f"  {cumulative_us / 1e3:10.1f} ms  {module}", file=sys.stderr)
+    return result.returncode
@@ -22,7 +22,7 @@ from __future__ import absolute_import
 import argparse
 import sys
 
-from ml_pipelines._utils import get_pipeline_driver
+from ml_pipelines._utils import get_pipeline_driver, profile_startup
 
 
 def main():  # pragma: no cover
@@ -54,12 +54,21 @@ def main():  # pragma: no cover
         default=None,
         help="Dict string of keyword arguments for the pipeline generation (if supported)",
     )
+    parser.add_argument(
+        "--profile-startup",
+        dest="profile_startup",
+        action="store_true",
+        help="Run the command under python -X importtime and print the slowest imports to stderr.",
+    )
     args = parser.parse_args()
 
     if args.module_name is None:
         parser.print_help()
         sys.exit(2)
 
+    if args.profile_startup:
+        sys.exit(profile_startup())
+
     try:
         pipeline = get_pipeline_driver(args.module_name, args.kwargs)
         content = pipeline.definition()
@@ -5,16 +5,88 @@ import logging
 import os
 import sys
 
-import boto3
-import sagemaker
-import sagemaker.session
+from botocore.exceptions import ClientError
 
-from sagemaker.workflow.pipeline import Pipeline
-from sagemaker.workflow.parameters import ParameterString
+# The SageMaker SDK is only imported by the pipeline module, see --profile-startup
+from _utils import definition_hash, diff_definitions, normalize_definition, profile_startup
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Pipeline tag holding the hash of the last upserted definition
+DEFINITION_HASH_TAG = "DefinitionSha256"
+
+
+def get_deployed_pipeline(sm_client, pipeline_name):
+    """Gets the ARN and the definition of an existing pipeline.
+
+    Returns:
+        (ARN, definition JSON), or (None, None) if the pipeline does not exist
+    """
+    try:
+        response = sm_client.describe_pipeline(PipelineName=pipeline_name)
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ResourceNotFound":
+            return None, None
+        raise
+    return response["PipelineArn"], response["PipelineDefinition"]
+
+
+def read_definition_state(state_path, pipeline_name):
+    """Reads the hash and definition last upserted for a pipeline from the local state file."""
+    if not state_path or not os.path.exists(state_path):
+        return None, None
+    with open(state_path) as f:
+        entry = json.load(f).get(pipeline_name, {})
+    return entry.get("hash"), entry.get("definition")
+
+
+def write_definition_state(state_path, pipeline_name, digest, definition):
+    state = {}
+    if os.path.exists(state_path):
+        with open(state_path) as f:
+            state = json.load(f)
+    state[pipeline_name] = {"hash": digest, "definition": definition}
+    os.makedirs(os.path.dirname(state_path) or ".", exist_ok=True)
+    with open(state_path, "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+
+
+def upsert_pipeline(pipeline, definition, role_arn, tags):
+    """Creates or updates a pipeline with its already serialised definition.
+
+    ``Pipeline.upsert`` serialises the definition again, and under a PipelineSession that uploads
+    the step code a second time. This sends the JSON that was hashed instead, as ``upsert`` does:
+    inline, or through S3 above 100 KB, then ``UpdatePipeline`` and the new tags if the pipeline
+    already exists.
+
+    Returns:
+        the CreatePipeline or UpdatePipeline response
+    """
+    session = pipeline.sagemaker_session
+    request = {"PipelineName": pipeline.name, "RoleArn": role_arn}
+    if len(definition.encode("utf-8")) < 100 * 1024:
+        request["PipelineDefinition"] = definition
+    else:
+        from sagemaker.s3 import S3Uploader
+
+        bucket = session.default_bucket()
+        S3Uploader.upload_string_as_file_body(
+            body=definition, desired_s3_uri=f"s3://{bucket}/{pipeline.name}", sagemaker_session=session
+        )
+        request["PipelineDefinitionS3Location"] = {"Bucket": bucket, "ObjectKey": pipeline.name}
+    try:
+        return session.sagemaker_client.create_pipeline(**request, Tags=tags)
+    except ClientError as e:
+        error = e.response["Error"]
+        if not (error["Code"] == "ValidationException" and "already exists" in error["Message"]):
+            raise
+    response = session.sagemaker_client.update_pipeline(**request)
+    # Adding tags overwrites those with the same keys and keeps the others
+    session.sagemaker_client.add_tags(ResourceArn=response["PipelineArn"], Tags=tags)
+    return response
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--module-name", type=str, required=True)
@@ -23,8 +95,31 @@ def main():
     parser.add_argument("--kwargs", type=str, default=None)
     parser.add_argument("--pipeline-name", type=str, default=None)
     parser.add_argument("--log-level", type=str, default=None)
+    parser.add_argument(
+        "--definition-state",
+        type=str,
+        default=None,
+        help="Local JSON file recording the last upserted definition; by default its hash is read from a pipeline tag",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help=(
+            "Print the structural diff against the last upserted definition, without upserting or starting. "
+            "Rendering the definition still uploads the step code to S3, like every run."
+        ),
+    )
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="Run the command as a --dry-run under python -X importtime and print the slowest imports",
+    )
     args = parser.parse_args()
 
+    if args.profile_startup:
+        # Profile building and diffing the definition, never a real upsert and execution
+        sys.exit(profile_startup(extra_arguments=["--dry-run"]))
+
     if args.log_level is not None:
         level = logging.getLevelName(args.log_level.upper())
         logger.setLevel(level)
@@ -46,11 +141,48 @@ def main():
     if args.pipeline_name is not None:
         pipeline.name = args.pipeline_name
 
-    logger.info(f"Creating/updating pipeline: {pipeline.name}")
-    pipeline.upsert(role_arn=args.role_arn, tags=tags)
+    # Serialised once: rendering uploads the step code, and the same JSON is upserted below
+    pipeline_definition = pipeline.definition()
+    # Upload timestamps are masked, so an unchanged pipeline hashes the same on every build
+    definition = normalize_definition(pipeline_definition)
+    digest = definition_hash(
+        definition, role_arn=args.role_arn, tags=[tag for tag in tags if tag["Key"] != DEFINITION_HASH_TAG]
+    )
+    sm_client = pipeline.sagemaker_session.sagemaker_client
+    if args.definition_state:
+        deployed_hash, deployed_definition = read_definition_state(args.definition_state, pipeline.name)
+    else:
+        pipeline_arn, deployed_definition = get_deployed_pipeline(sm_client, pipeline.name)
+        deployed_definition = normalize_definition(deployed_definition) if deployed_definition else None
+        deployed_tags = sm_client.list_tags(ResourceArn=pipeline_arn)["Tags"] if pipeline_arn else []
+        deployed_hash = next((tag["Value"] for tag in deployed_tags if tag["Key"] == DEFINITION_HASH_TAG), None)
+
+    if args.dry_run:
+        if deployed_definition is None:
+            print(f"Pipeline {pipeline.name} would be created")
+        else:
+            print("\n".join(diff_definitions(deployed_definition, definition)) or "No definition changes")
+        print(f"Definition hash {digest}, last upserted {deployed_hash}")
+        print("Upsert would be skipped" if digest == deployed_hash else "Upsert would run")
+        return
+
+    if digest == deployed_hash:
+        logger.info(f"Definition of {pipeline.name} unchanged (sha256 {digest[:12]}), skipping the upsert")
+    else:
+        logger.info(f"Creating/updating pipeline: {pipeline.name}")
+        upsert_pipeline(
+            pipeline, pipeline_definition, args.role_arn, tags + [{"Key": DEFINITION_HASH_TAG, "Value": digest}]
+        )
+        if args.definition_state:
+            write_definition_state(args.definition_state, pipeline.name, digest, definition)
 
     logger.info("Starting pipeline execution")
-    pipeline.start()
+    execution = pipeline.start()
+
+    # Pipeline modules may keep a local record of the step cache keys used by this execution
+    record_step_cache = getattr(module, "record_step_cache", None)
+    if record_step_cache is not None:
+        record_step_cache(execution.arn)
 
     logger.info(f"Pipeline {pipeline.name} successfully created/updated and started")
 
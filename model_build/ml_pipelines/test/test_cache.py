@@ -0,0 +1,110 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# SPDX-License-Identifier: MIT-0
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import datetime
+
+import pytest
+
+from ml_pipelines.training._cache import (
+    StepCache,
+    compute_cache_key,
+    hash_paths,
+    parse_duration,
+    retrieve_image_uri,
+)
+
+
+@pytest.mark.parametrize(
+    "duration, expected",
+    [
+        ("P30D", datetime.timedelta(days=30)),
+        ("PT12H", datetime.timedelta(hours=12)),
+        ("P1W", datetime.timedelta(weeks=1)),
+        ("P1DT2H3M4S", datetime.timedelta(days=1, hours=2, minutes=3, seconds=4)),
+    ],
+)
+def test_parse_duration(duration, expected):
+    assert parse_duration(duration) == expected
+
+
+@pytest.mark.parametrize("duration", ["", "P", "PT", "30D", "P1Y", None])
+def test_parse_duration_rejects_invalid_durations(duration):
+    with pytest.raises(ValueError):
+        parse_duration(duration)
+
+
+def test_cache_key_is_stable_and_order_sensitive():
+    assert compute_cache_key("a", {"x": 1, "y": 2}) == compute_cache_key("a", {"y": 2, "x": 1})
+    assert compute_cache_key("a", "b") != compute_cache_key("b", "a")
+    assert compute_cache_key("a", None) != compute_cache_key("a")
+
+
+def test_hash_paths_covers_every_file_but_bytecode(tmp_path):
+    (tmp_path / "code").mkdir()
+    (tmp_path / "code" / "main.py").write_text("print(1)\n")
+    (tmp_path / "code" / "requirements.txt").write_text("pandas==1.1.3\n")
+    before = hash_paths([tmp_path / "code"])
+
+    (tmp_path / "code" / "__pycache__").mkdir()
+    (tmp_path / "code" / "__pycache__" / "main.cpython-311.pyc").write_bytes(b"\0")
+    assert hash_paths([tmp_path / "code"]) == before
+
+    (tmp_path / "code" / "requirements.txt").write_text("pandas==1.3.5\n")
+    assert hash_paths([tmp_path / "code"]) != before
+
+
+def test_step_cache_counts_keys_only_once_their_step_succeeded(tmp_path):
+    class Paginator:
+        def paginate(self, PipelineExecutionArn):
+            yield {"PipelineExecutionSteps": [{"StepName": "Train", "StepStatus": "Succeeded"}]}
+
+    class Client:
+        def describe_pipeline_execution(self, PipelineExecutionArn):
+            return {"PipelineExecutionStatus": "Failed"}
+
+        def get_paginator(self, name):
+            return Paginator()
+
+    path = str(tmp_path / "cache.json")
+    cache = StepCache(path)
+    cache.add("Train", "k1")
+    cache.add("Evaluate", "k2")
+    cache.record("arn:execution")
+    assert not StepCache(path).lookup("Train", "k1")
+
+    cache = StepCache(path)
+    cache.refresh(Client())
+    assert cache.lookup("Train", "k1")
+    # The execution failed before the step ran
+    assert "k2" not in cache.entries["Evaluate"]
+
+
+def test_image_uri_is_only_retrieved_on_a_miss(tmp_path, monkeypatch):
+    from sagemaker import image_uris
+
+    calls = []
+
+    def retrieve(framework, region, version, **kwargs):
+        calls.append((framework, region, version))
+        return f"{framework}:{version}-{region}"
+
+    monkeypatch.setattr(image_uris, "retrieve", retrieve)
+    path = str(tmp_path / "image-uris.json")
+    assert retrieve_image_uri("xgboost", "us-east-1", "1.7-1", cache_path=path) == "xgboost:1.7-1-us-east-1"
+    assert retrieve_image_uri("xgboost", "us-east-1", "1.7-1", cache_path=path) == "xgboost:1.7-1-us-east-1"
+    assert retrieve_image_uri("xgboost", "eu-west-1", "1.7-1", cache_path=path) == "xgboost:1.7-1-eu-west-1"
+    assert calls == [("xgboost", "us-east-1", "1.7-1"), ("xgboost", "eu-west-1", "1.7-1")]
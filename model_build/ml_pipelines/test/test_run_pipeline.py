@@ -0,0 +1,81 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# SPDX-License-Identifier: MIT-0
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import types
+
+import pytest
+from botocore.exceptions import ClientError
+
+from ml_pipelines.run_pipeline import upsert_pipeline
+
+
+class Client:
+    def __init__(self, exists):
+        self.exists = exists
+        self.calls = []
+
+    def create_pipeline(self, **request):
+        self.calls.append(("create_pipeline", request))
+        if self.exists:
+            error = {"Code": "ValidationException", "Message": "Pipeline names must be unique, it already exists"}
+            raise ClientError({"Error": error}, "CreatePipeline")
+        return {"PipelineArn": "arn:pipeline"}
+
+    def update_pipeline(self, **request):
+        self.calls.append(("update_pipeline", request))
+        return {"PipelineArn": "arn:pipeline"}
+
+    def add_tags(self, **request):
+        self.calls.append(("add_tags", request))
+
+
+class Pipeline:
+    """Fails if the definition is serialised again."""
+
+    name = "AbalonePipeline"
+
+    def __init__(self, client):
+        self.sagemaker_session = types.SimpleNamespace(sagemaker_client=client)
+
+    def definition(self):
+        raise AssertionError("definition() called")
+
+
+@pytest.mark.parametrize("exists", [False, True])
+def test_upsert_sends_the_hashed_definition(exists):
+    client = Client(exists)
+    tags = [{"Key": "DefinitionSha256", "Value": "abc"}]
+    upsert_pipeline(Pipeline(client), '{"Steps": []}', "arn:role", tags)
+    assert client.calls[0] == (
+        "create_pipeline",
+        {"PipelineName": "AbalonePipeline", "RoleArn": "arn:role", "PipelineDefinition": '{"Steps": []}', "Tags": tags},
+    )
+    if exists:
+        assert client.calls[1][0] == "update_pipeline"
+        assert client.calls[1][1]["PipelineDefinition"] == '{"Steps": []}'
+        assert client.calls[2] == ("add_tags", {"ResourceArn": "arn:pipeline", "Tags": tags})
+    else:
+        assert len(client.calls) == 1
+
+
+def test_upsert_raises_other_errors():
+    class Failing(Client):
+        def create_pipeline(self, **request):
+            raise ClientError({"Error": {"Code": "AccessDeniedException", "Message": "denied"}}, "CreatePipeline")
+
+    with pytest.raises(ClientError):
+        upsert_pipeline(Pipeline(Failing(False)), "{}", "arn:role", [])
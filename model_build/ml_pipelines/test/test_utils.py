@@ -0,0 +1,70 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# SPDX-License-Identifier: MIT-0
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import json
+import subprocess
+import sys
+import types
+
+from ml_pipelines._utils import definition_hash, diff_definitions, normalize_definition, profile_startup
+
+
+def definition(timestamp, instance_type="ml.m5.xlarge"):
+    return json.dumps(
+        {
+            "Parameters": [{"Name": "ProcessingInstanceType", "DefaultValue": instance_type}],
+            "Steps": [
+                {
+                    "Name": "PreprocessAbaloneData",
+                    "Arguments": {
+                        "AppSpecification": {"ContainerEntrypoint": [f"s3://bucket/code/{timestamp}/main.py"]}
+                    },
+                }
+            ],
+        }
+    )
+
+
+def test_normalize_definition_masks_upload_timestamps():
+    first = normalize_definition(definition("2026-10-17-05-16-19-123"))
+    second = normalize_definition(definition("2026-10-18-09-00-00-456"))
+    assert first == second
+    assert "<timestamp>" in json.dumps(first)
+
+
+def test_definition_hash_changes_with_the_definition_and_context():
+    base = normalize_definition(definition("2026-10-17-05-16-19-123"))
+    changed = normalize_definition(definition("2026-10-17-05-16-19-123", "ml.m5.large"))
+    assert definition_hash(base, role="a") == definition_hash(base, role="a")
+    assert definition_hash(base, role="a") != definition_hash(base, role="b")
+    assert definition_hash(base) != definition_hash(changed)
+    assert diff_definitions(base, changed)
+
+
+def test_profile_startup_adds_the_extra_arguments_once(monkeypatch):
+    commands = []
+
+    def run(command, **kwargs):
+        commands.append(command)
+        return types.SimpleNamespace(stderr="import time: 10 | 20 | json\n", returncode=0)
+
+    monkeypatch.setattr(subprocess, "run", run)
+    for argv in [["run_pipeline.py", "--profile-startup"], ["run_pipeline.py", "--dry-run", "--profile-startup"]]:
+        monkeypatch.setattr(sys, "argv", argv)
+        assert profile_startup(extra_arguments=["--dry-run"]) == 0
+        assert commands[-1][commands[-1].index("importtime") + 1 :].count("--dry-run") == 1
+        assert "--profile-startup" not in commands[-1]
@@ -0,0 +1,262 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# SPDX-License-Identifier: MIT-0
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import datetime
+import hashlib
+import json
+import logging
+import os
+import re
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+logger = logging.getLogger(__name__)
+
+# Local record of resolved container image URIs, IMAGE_URI_CACHE overrides it
+IMAGE_URI_CACHE = ".pipeline-cache/image-uris.json"
+
+DURATION_PATTERN = re.compile(
+    r"^P(?:(?P<weeks>\d+)W)?(?:(?P<days>\d+)D)?"
+    r"(?:T(?:(?P<hours>\d+)H)?(?:(?P<minutes>\d+)M)?(?:(?P<seconds>\d+)S)?)?$"
+)
+
+
+def parse_duration(expire_after):
+    """Parses an ISO 8601 duration such as "P30D" or "PT12H", as used by CacheConfig.
+
+    Args:
+        expire_after: the duration string
+
+    Returns:
+        the duration as a timedelta
+    """
+    match = DURATION_PATTERN.match(expire_after or "")
+    if not match or not any(match.groupdict().values()):
+        raise ValueError(f"Invalid ISO 8601 duration: {expire_after}")
+    return datetime.timedelta(**{unit: int(value) for unit, value in match.groupdict().items() if value})
+
+
+def hash_paths(paths):
+    """Hashes the content of files, and of every file under directories, in a stable order.
+
+    Every file that is uploaded with a step counts, requirements and configuration as much as
+    code. Only ``__pycache__`` directories are skipped, their bytecode is derived from the
+    sources and differs between machines.
+
+    Args:
+        paths: list of file or directory paths
+
+    Returns:
+        hex digest of the content
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        if os.path.isdir(path):
+            files = []
+            for root, directories, names in os.walk(path):
+                directories[:] = [name for name in directories if name != "__pycache__"]
+                files.extend(os.path.join(root, name) for name in names)
+            files.sort()
+        else:
+            files = [path]
+        for file_path in files:
+            digest.update(file_path.encode())
+            with open(file_path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def get_table_manifest(boto_session, database, table):
+    """Lists the S3 objects behind a Glue table with their ETags.
+
+    Args:
+        boto_session: boto3 session used for the Glue and S3 clients
+        database: Glue database name
+        table: Glue table name
+
+    Returns:
+        list of [key, etag, size] for every object under the table location, or None if the
+        location could not be listed
+    """
+    try:
+        location = boto_session.client("glue").get_table(DatabaseName=database, Name=table)["Table"][
+            "StorageDescriptor"
+        ]["Location"]
+        bucket, _, prefix = location.replace("s3://", "", 1).partition("/")
+        manifest = []
+        paginator = boto_session.client("s3").get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                manifest.append([obj["Key"], obj["ETag"], obj["Size"]])
+        return sorted(manifest)
+    except (BotoCoreError, ClientError, KeyError) as e:
+        logger.warning(f"Could not list the data of {database}.{table}: {e}")
+        return None
+
+
+def compute_cache_key(*parts):
+    """Content-addressed key over any JSON serialisable parts (hashes, arguments, manifests)."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def retrieve_image_uri(framework, region, version, cache_path=None, **kwargs):
+    """Memoized ``sagemaker.image_uris.retrieve``.
+
+    The URI of a framework image only depends on the framework, version, region and the other
+    arguments, for a given SDK release, so it is kept in a local JSON file under that key and
+    the SDK's image config is only read on a miss.
+
+    Args:
+        framework: framework name, like "xgboost"
+        region: AWS region of the image
+        version: framework version, like "1.7-1"
+        cache_path: JSON cache file, IMAGE_URI_CACHE by default
+        kwargs: other arguments of ``retrieve``, like py_version and instance_type
+
+    Returns:
+        the ECR image URI
+    """
+    from importlib.metadata import version as package_version
+
+    cache_path = cache_path or os.environ.get("IMAGE_URI_CACHE", IMAGE_URI_CACHE)
+    key = "/".join(
+        [framework, version, region, *(f"{name}={value}" for name, value in sorted(kwargs.items()))]
+        + [f"sagemaker={package_version('sagemaker')}"]
+    )
+    cache = {}
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path) as f:
+                cache = json.load(f)
+        except ValueError:
+            logger.warning(f"Ignoring the unreadable image URI cache {cache_path}")
+    if key in cache:
+        return cache[key]
+
+    from sagemaker import image_uris
+
+    cache[key] = image_uris.retrieve(framework=framework, region=region, version=version, **kwargs)
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    with open(cache_path, "w") as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+    return cache[key]
+
+
+class StepCache:
+    """Local record of the step cache keys of pipeline executions.
+
+    SageMaker skips a cached step when its arguments match a previous successful execution
+    within the expiry, so each step key is threaded into the step arguments. This file mirrors
+    those keys locally to report which steps of a new definition will be reused and which will
+    run. Keys are recorded as pending when an execution starts and only count as hits once
+    ``refresh`` has seen their step succeed.
+    """
+
+    # Pipeline execution states in which steps may still succeed
+    RUNNING_STATES = ("Executing", "Stopping")
+
+    def __init__(self, path, expire_after="P30D"):
+        self.path = path
+        self.expire_after = parse_duration(expire_after)
+        self.pending = {}
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)
+
+    def _expired(self, entry):
+        created = datetime.datetime.fromisoformat(entry["created"])
+        return datetime.datetime.now(datetime.timezone.utc) - created > self.expire_after
+
+    def lookup(self, step_name, key):
+        """Returns True if the step succeeded with this key within the expiry."""
+        entry = self.entries.get(step_name, {}).get(key)
+        return entry is not None and entry.get("status") == "succeeded" and not self._expired(entry)
+
+    def refresh(self, sagemaker_client):
+        """Resolves the pending keys from the step statuses of their executions.
+
+        Keys of succeeded steps become hits. Keys of steps that failed, were stopped or never
+        ran in a finished execution are dropped, those of running executions stay pending. If
+        the statuses cannot be read the keys stay pending, so they are never wrongly reported as
+        hits.
+        """
+        executions = {
+            entry.get("execution_arn")
+            for step_entries in self.entries.values()
+            for entry in step_entries.values()
+            if entry.get("status") != "succeeded"
+        }
+        changed = False
+        for execution_arn in executions:
+            if execution_arn is None:
+                continue
+            try:
+                execution_status = sagemaker_client.describe_pipeline_execution(
+                    PipelineExecutionArn=execution_arn
+                )["PipelineExecutionStatus"]
+                statuses = {}
+                paginator = sagemaker_client.get_paginator("list_pipeline_execution_steps")
+                for page in paginator.paginate(PipelineExecutionArn=execution_arn):
+                    for step in page["PipelineExecutionSteps"]:
+                        statuses.setdefault(step["StepName"], step["StepStatus"])
+            except (BotoCoreError, ClientError) as e:
+                logger.warning(f"Could not read the step statuses of {execution_arn}: {e}")
+                continue
+            for step_name, step_entries in self.entries.items():
+                for key, entry in list(step_entries.items()):
+                    if entry.get("execution_arn") != execution_arn or entry.get("status") == "succeeded":
+                        continue
+                    status = statuses.get(step_name)
+                    if status == "Succeeded":
+                        entry["status"] = "succeeded"
+                        changed = True
+                    elif status in ("Failed", "Stopped") or (
+                        status is None and execution_status not in self.RUNNING_STATES
+                    ):
+                        del step_entries[key]
+                        changed = True
+        if changed:
+            self._save()
+
+    def add(self, step_name, key):
+        """Registers the key of a step in the definition being built."""
+        self.pending[step_name] = key
+
+    def report(self):
+        """Hit/miss status of every registered step."""
+        return {
+            step_name: {"key": key, "status": "hit" if self.lookup(step_name, key) else "miss"}
+            for step_name, key in self.pending.items()
+        }
+
+    def record(self, execution_arn=None):
+        """Stores the registered keys as pending once an execution using them has been started."""
+        now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        for step_name, key in self.pending.items():
+            step_entries = self.entries.setdefault(step_name, {})
+            if not self.lookup(step_name, key):
+                step_entries[key] = {"created": now, "execution_arn": execution_arn, "status": "pending"}
+            # Drop expired keys so the file stays small
+            for old_key in [k for k in step_entries if self._expired(step_entries[k])]:
+                del step_entries[old_key]
+        self._save()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "w") as f:
+            json.dump(self.entries, f, indent=2, sort_keys=True)
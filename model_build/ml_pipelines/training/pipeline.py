@@ -1,3 +1,11 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Step cache of the last pipeline built by get_pipeline, recorded once an execution starts
+_step_cache = None
+
+
 def get_pipeline(
     region,
     role=None,
@@ -9,6 +17,19 @@ def get_pipeline(
     sagemaker_session=None,
     glue_database_name=None,
     glue_table_name=None,
+    data_format="csv",
+    cache_expire_after=None,
+    cache_state_path=None,
+    incremental_state_uri=None,
+    incremental_refit=False,
+    hyperparameters_path=None,
+    warm_start=False,
+    use_spot_training=False,
+    cross_validation_folds=0,
+    champion_challenger=False,
+    batch_transform_input=None,
+    compile_model=False,
+    latency_gate=False,
 ):
     """Gets a SageMaker ML Pipeline instance working with on abalone data.
 
@@ -16,16 +37,45 @@ def get_pipeline(
         region: AWS region to create and run the pipeline.
         role: IAM role to create and run steps and pipeline.
         default_bucket: the bucket to use for storing the artifacts
+        data_format: format of the preprocessed splits, "csv" or "parquet"
+        cache_expire_after: ISO 8601 duration for which step results are reused, like "P30D". None,
+            the default, disables caching, so building the definition makes no AWS calls
+        cache_state_path: local file recording the step cache keys of started executions
+        incremental_state_uri: S3 URI of the incremental preprocessing state; when set only new
+            table objects are processed and the splits accumulate under a fixed S3 prefix
+        incremental_refit: refit the incremental preprocessor on all data seen so far and rewrite
+            every part with it, reading the whole table. Otherwise new parts are written with the
+            preprocessor of the earlier ones
+        hyperparameters_path: best_hyperparameters.json written by
+            source_scripts/training/xgboost/tune.py, overriding the default hyperparameters
+        warm_start: continue boosting from the latest approved model package, looked up when
+            preprocessing runs, adding num_round rounds. Preprocessing transforms the data with
+            the preprocessor packaged with that model instead of fitting one. Not cached, and not
+            supported with incremental_state_uri
+        use_spot_training: train on managed spot instances, resuming from checkpoints after interruptions
+        cross_validation_folds: when above 1, cross-validates the hyperparameters on that many folds
+            next to training and adds the fold metrics to the evaluation report
+        champion_challenger: score the latest approved model package, looked up when the evaluation
+            runs, next to the new model and register the new model only if its squared errors are
+            significantly lower
+        batch_transform_input: S3 URI of raw abalone CSV records; when set, a model that passes the
+            registration conditions also scores them with a batch transform job
+        compile_model: flatten the trained booster into a numpy forest, check its predictions
+            and add its latency gain to the evaluation report
+        latency_gate: also require the p99 single-row latency measured by the evaluation to be
+            within the LatencyBudgetMs parameter to register the model; otherwise the latency is
+            only reported
 
     Returns:
         an instance of a pipeline
     """
+    import json
+
     import boto3
     import sagemaker
     import sagemaker.session
     
-    from sagemaker.estimator import Estimator
-    from sagemaker.inputs import TrainingInput
+    from sagemaker.inputs import CreateModelInput, TrainingInput, TransformInput
     from sagemaker.model_metrics import (
         MetricsSource,
         ModelMetrics,
@@ -36,24 +86,44 @@ def get_pipeline(
         ScriptProcessor,
     )
     from sagemaker.sklearn.processing import SKLearnProcessor
-    from sagemaker.workflow.conditions import ConditionLessThanOrEqualTo
+    from sagemaker.workflow.conditions import ConditionEquals, ConditionLessThanOrEqualTo
     from sagemaker.workflow.condition_step import (
         ConditionStep,
     )
+    from sagemaker.workflow.execution_variables import ExecutionVariables
     from sagemaker.workflow.functions import (
         JsonGet,
+        Join,
     )
     from sagemaker.workflow.parameters import (
+        ParameterFloat,
         ParameterInteger,
         ParameterString,
     )
     from sagemaker.workflow.pipeline import Pipeline
     from sagemaker.workflow.properties import PropertyFile
+    from sagemaker.transformer import Transformer
     from sagemaker.workflow.steps import (
+        CacheConfig,
+        CreateModelStep,
         ProcessingStep,
         TrainingStep,
+        TransformStep,
     )
     from sagemaker.workflow.step_collections import RegisterModel
+    from sagemaker.xgboost.estimator import XGBoost
+    from sagemaker.xgboost.model import XGBoostModel
+
+    from ._cache import StepCache, compute_cache_key, get_table_manifest, hash_paths, retrieve_image_uri
+    global _step_cache
+
+    if warm_start and incremental_state_uri:
+        raise ValueError("warm_start is not supported with incremental_state_uri")
+    if incremental_refit and not incremental_state_uri:
+        raise ValueError("incremental_refit needs incremental_state_uri")
+
+    # Content type of the preprocessed splits consumed by the training container
+    content_type = {"csv": "text/csv", "parquet": "application/x-parquet"}[data_format]
     
     # Parameters for pipeline execution
     processing_instance_type = ParameterString(
@@ -65,6 +135,9 @@ def get_pipeline(
     training_instance_type = ParameterString(
         name="TrainingInstanceType", default_value="ml.m5.xlarge"
     )
+    training_instance_count = ParameterInteger(
+        name="TrainingInstanceCount", default_value=1
+    )
     model_approval_status = ParameterString(
         name="ModelApprovalStatus", default_value="PendingManualApproval"
     )
@@ -74,10 +147,96 @@ def get_pipeline(
     glue_table = ParameterString(
         name="GlueTable", default_value=glue_table_name
     )
+    preprocess_chunk_size = ParameterString(
+        name="PreprocessChunkSize", default_value="0"
+    )
+    split_seed = ParameterString(
+        name="SplitSeed", default_value="0"
+    )
+    evaluation_chunk_size = ParameterString(
+        name="EvaluationChunkSize", default_value="0"
+    )
+    bootstrap_samples = ParameterString(
+        name="BootstrapSamples", default_value="1000"
+    )
+    promotion_significance = ParameterString(
+        name="PromotionSignificance", default_value="0.05"
+    )
+    # Largest single-row p99 prediction latency, in milliseconds, of a model that gets registered,
+    # checked with latency_gate
+    latency_budget = ParameterFloat(
+        name="LatencyBudgetMs", default_value=10.0
+    )
+    # Applied before any Parquet data is read; "*" keeps every partition or feature column
+    partition_filter = ParameterString(
+        name="PartitionFilter", default_value="*"
+    )
+    sample_fraction = ParameterString(
+        name="SampleFraction", default_value="1.0"
+    )
+    feature_columns = ParameterString(
+        name="FeatureColumns", default_value="*"
+    )
     
+    # Content-addressed step cache: each key hashes the step source, its arguments, the defaults of
+    # the parameters it reads and, through the upstream keys, the input data manifest. Keys are
+    # threaded into the step arguments so that SageMaker only reuses a previous result when all of
+    # them are unchanged. Only enabled caching lists the table objects and reads earlier executions.
+    cache_config = None
+    step_cache = None
+    table_manifest = None
+    if cache_expire_after and warm_start:
+        # Preprocessing and training depend on the model approved when the execution runs
+        logger.warning("Step caching is disabled with warm_start")
+        cache_expire_after = None
+    if cache_expire_after:
+        cache_config = CacheConfig(enable_caching=True, expire_after=cache_expire_after)
+        step_cache = StepCache(cache_state_path or f".pipeline-cache/{pipeline_name}.json", cache_expire_after)
+        boto_session = sagemaker_session.boto_session if sagemaker_session else boto3.Session(region_name=region)
+        # Keys of earlier executions only count as hits once their steps succeeded
+        step_cache.refresh(boto_session.client("sagemaker"))
+        if glue_database_name and glue_table_name:
+            table_manifest = get_table_manifest(boto_session, glue_database_name, glue_table_name)
+        if table_manifest is None:
+            logger.warning("Input data manifest unavailable, preprocessing results will not be reused")
+
+    preprocess_code = "source_scripts/preprocessing/prepare_abalone_data/main.py"
+    # The dependency bundle uploaded by CI is built from requirements.txt, and is not in git
+    preprocess_requirements = "source_scripts/preprocessing/prepare_abalone_data/requirements/requirements.txt"
+    helpers_dir = "source_scripts/helpers"
+    # Executions that override these parameters change the step arguments, so SageMaker does not
+    # reuse results computed with the defaults for them
+    preprocess_parameters = [
+        processing_instance_count,
+        preprocess_chunk_size,
+        split_seed,
+        partition_filter,
+        sample_fraction,
+        feature_columns,
+        training_instance_count,
+    ]
+    preprocess_key = compute_cache_key(
+        hash_paths([preprocess_code, preprocess_requirements, helpers_dir]),
+        [glue_database_name, glue_table_name, data_format],
+        {parameter.name: parameter.default_value for parameter in preprocess_parameters},
+        table_manifest,
+    )
+
+    # Incremental runs write new parts of each split next to the earlier ones, so that training
+    # always sees the accumulated history. Downstream steps then read the same S3 prefixes every
+    # run and must not be cached on their arguments.
+    split_destinations = {}
+    downstream_cache_config = cache_config
+    if incremental_state_uri:
+        split_destinations = {
+            split: f"s3://{default_bucket}/{base_job_prefix}/AbaloneIncremental/{split}"
+            for split in ["train", "validation", "test", "raw_test"]
+        }
+        downstream_cache_config = None
+
     # Create a ScriptProcessor for data preprocessing with requirements.txt
     script_processor = ScriptProcessor(
-        image_uri=sagemaker.image_uris.retrieve(
+        image_uri=retrieve_image_uri(
             framework="sklearn",
             region=region,
             version="1.0-1",
@@ -103,66 +262,228 @@ def get_pipeline(
                 source=f"s3://{default_bucket}/SMUSMLOPS/requirements-preprocess/input/dependencies/",
                 destination="/opt/ml/processing/input/requirements",
                 input_name="requirements"
-            )
+            ),
+            # Shared helper modules imported by the source scripts
+            ProcessingInput(
+                source=helpers_dir,
+                destination="/opt/ml/processing/input/helpers",
+                input_name="helpers"
+            ),
         ],
         outputs=[
-            ProcessingOutput(output_name="train", source="/opt/ml/processing/train"),
-            ProcessingOutput(output_name="validation", source="/opt/ml/processing/validation"),
-            ProcessingOutput(output_name="test", source="/opt/ml/processing/test"),
+            ProcessingOutput(
+                output_name=split,
+                source=f"/opt/ml/processing/{split}",
+                destination=split_destinations.get(split),
+            )
+            # raw_test holds the test rows before the transform, for scoring the champion
+            for split in ["train", "validation", "test", "raw_test"]
+        ]
+        + [
+            # Fitted medians, means/scales and categories as JSON, see helpers/preprocessor.py
+            ProcessingOutput(output_name="preprocessor", source="/opt/ml/processing/preprocessor"),
+            # Column statistics of the input table computed during the same read
+            ProcessingOutput(output_name="profile", source="/opt/ml/processing/profile"),
         ],
-        code="source_scripts/preprocessing/prepare_abalone_data/main.py",
+        code=preprocess_code,
         job_arguments=[
             "--database-name", glue_database,
-            "--table-name", glue_table
-        ],
+            "--table-name", glue_table,
+            "--chunk-size", preprocess_chunk_size,
+            "--output-format", data_format,
+            "--split-seed", split_seed,
+            "--partition-filter", partition_filter,
+            "--sample-fraction", sample_fraction,
+            "--feature-columns", feature_columns,
+            # One train file per training instance, ShardedByS3Key distributes whole files
+            "--train-parts", training_instance_count.to_string(),
+            "--cache-key", preprocess_key,
+            # Partial statistics are exchanged here when ProcessingInstanceCount > 1
+            "--coordination-uri", f"s3://{default_bucket}/{base_job_prefix}/PreprocessCoordination",
+        ]
+        + (["--state-uri", incremental_state_uri] if incremental_state_uri else [])
+        + (["--refit"] if incremental_refit else [])
+        # The approved model is looked up when the job runs, and its preprocessor applied
+        + (["--warm-start-model-package-group-name", model_package_group_name] if warm_start else []),
+        cache_config=cache_config if table_manifest is not None else None,
     )
 
     # training step for generating model artifacts
     model_path = f"s3://{default_bucket}/{base_job_prefix}/AbaloneTrain"
 
-    image_uri = sagemaker.image_uris.retrieve(
+    image_uri = retrieve_image_uri(
         framework="xgboost",
         region=region,
-        version="1.0-1",
+        version="1.7-1",
         py_version="py3",
         instance_type="ml.m5.xlarge",
     )
 
-    xgb_train = Estimator(
+    # Script-mode training, see source_scripts/training/xgboost/__main__.py. num_round is an upper
+    # bound, training stops once validation-rmse has not improved for early_stopping_rounds and
+    # only the trees up to the best round are kept.
+    train_source_dir = "source_scripts/training/xgboost"
+    hyperparameters = {
+        "objective": "reg:squarederror",
+        "num_round": 500,
+        "early_stopping_rounds": 10,
+        "tree_method": "hist",
+        "max_depth": 5,
+        "eta": 0.2,
+        "gamma": 4,
+        "min_child_weight": 6,
+        "subsample": 0.7,
+        "checkpoint_frequency": 10,
+    }
+    if hyperparameters_path:
+        with open(hyperparameters_path) as f:
+            tuned = json.load(f)["hyperparameters"]
+        logger.info(f"Using tuned hyperparameters from {hyperparameters_path}: {tuned}")
+        hyperparameters.update(tuned)
+    train_key = compute_cache_key(
+        preprocess_key,
+        image_uri,
+        hash_paths([train_source_dir, helpers_dir]),
+        hyperparameters,
+    )
+    xgb_train = XGBoost(
+        entry_point="__main__.py",
+        source_dir=train_source_dir,
+        # Packaged as helpers/ next to the entry point
+        dependencies=[helpers_dir],
+        framework_version="1.7-1",
         image_uri=image_uri,
         instance_type=training_instance_type,
-        instance_count=1,
+        instance_count=training_instance_count,
         output_path=model_path,
         base_job_name=f"{base_job_prefix}/abalone-train",
         sagemaker_session=sagemaker_session,
         role=role,
         output_kms_key=bucket_kms_id,
-    )
-    xgb_train.set_hyperparameters(
-        objective="reg:linear",
-        num_round=50,
-        max_depth=5,
-        eta=0.2,
-        gamma=4,
-        min_child_weight=6,
-        subsample=0.7,
-        silent=0,
+        # The key stands in for the source code, whose S3 location changes with every upload
+        hyperparameters={**hyperparameters, "cache_key": train_key},
+        metric_definitions=[
+            {"Name": "train:rmse", "Regex": r"train-rmse=([0-9\.]+)"},
+            {"Name": "validation:rmse", "Regex": r"validation-rmse=([0-9\.]+)"},
+        ],
+        # Checkpoints written every checkpoint_frequency rounds are synced here, scoped to the
+        # execution so that a retried or interrupted job resumes but a new execution does not
+        checkpoint_s3_uri=Join(
+            on="/",
+            values=[f"s3://{default_bucket}/{base_job_prefix}/AbaloneCheckpoints", ExecutionVariables.PIPELINE_EXECUTION_ID],
+        ),
+        use_spot_instances=use_spot_training,
+        max_wait=172800 if use_spot_training else None,
     )
     step_train = TrainingStep(
         name="TrainAbaloneModel",
         estimator=xgb_train,
         inputs={
+            # With TrainingInstanceCount > 1 every instance gets a share of the train files, of
+            # which preprocessing writes at least one per instance, and the instances train one
+            # model collectively
             "train": TrainingInput(
                 s3_data=step_process.properties.ProcessingOutputConfig.Outputs["train"].S3Output.S3Uri,
-                content_type="text/csv",
+                content_type=content_type,
+                distribution="ShardedByS3Key",
             ),
             "validation": TrainingInput(
                 s3_data=step_process.properties.ProcessingOutputConfig.Outputs["validation"].S3Output.S3Uri,
-                content_type="text/csv",
+                content_type=content_type,
+            ),
+            # Packaged with the model. With a warm start it also names the approved model that
+            # preprocessing took the preprocessor from, which training continues
+            "preprocessor": TrainingInput(
+                s3_data=step_process.properties.ProcessingOutputConfig.Outputs["preprocessor"].S3Output.S3Uri,
+                content_type="application/json",
             ),
         },
+        cache_config=downstream_cache_config,
     )
 
+    # Optional k-fold cross-validation, running concurrently with the training step
+    step_cv = None
+    if cross_validation_folds > 1:
+        script_cv = ScriptProcessor(
+            image_uri=image_uri,
+            command=["python3"],
+            instance_type=processing_instance_type,
+            instance_count=1,
+            base_job_name=f"{base_job_prefix}/script-abalone-cv",
+            sagemaker_session=sagemaker_session,
+            role=role,
+            output_kms_key=bucket_kms_id,
+        )
+        cv_code = f"{train_source_dir}/cross_validate.py"
+        cv_key = compute_cache_key(train_key, hash_paths([cv_code]), cross_validation_folds)
+        step_cv = ProcessingStep(
+            name="CrossValidateAbaloneModel",
+            processor=script_cv,
+            inputs=[
+                ProcessingInput(
+                    source=step_process.properties.ProcessingOutputConfig.Outputs[split].S3Output.S3Uri,
+                    destination=f"/opt/ml/processing/{split}",
+                )
+                for split in ["train", "validation"]
+            ]
+            + [
+                # The training entry point, for its data loading and core detection, and its helpers
+                ProcessingInput(source=train_source_dir, destination="/opt/ml/processing/input/training"),
+                ProcessingInput(source=helpers_dir, destination="/opt/ml/processing/input/helpers"),
+            ],
+            outputs=[
+                ProcessingOutput(output_name="cv", source="/opt/ml/processing/cv"),
+            ],
+            code=cv_code,
+            job_arguments=[
+                "--folds", str(cross_validation_folds),
+                "--hyperparameters", json.dumps(hyperparameters, sort_keys=True),
+                "--cache-key", cv_key,
+            ],
+            cache_config=downstream_cache_config,
+        )
+
+    # optional compilation of the booster into an array-backed forest for low-latency scoring
+    step_compile = None
+    if compile_model:
+        script_compile = ScriptProcessor(
+            image_uri=image_uri,
+            command=["python3"],
+            instance_type=processing_instance_type,
+            instance_count=1,
+            base_job_name=f"{base_job_prefix}/script-abalone-compile",
+            sagemaker_session=sagemaker_session,
+            role=role,
+            output_kms_key=bucket_kms_id,
+        )
+        compile_code = "source_scripts/compile/compile_xgboost/main.py"
+        compile_key = compute_cache_key(train_key, hash_paths([compile_code, helpers_dir]), data_format)
+        step_compile = ProcessingStep(
+            name="CompileAbaloneModel",
+            processor=script_compile,
+            inputs=[
+                ProcessingInput(
+                    source=step_train.properties.ModelArtifacts.S3ModelArtifacts,
+                    destination="/opt/ml/processing/model",
+                ),
+                ProcessingInput(
+                    source=step_process.properties.ProcessingOutputConfig.Outputs["test"].S3Output.S3Uri,
+                    destination="/opt/ml/processing/test",
+                ),
+                ProcessingInput(source=helpers_dir, destination="/opt/ml/processing/input/helpers"),
+            ],
+            outputs=[
+                # compiled-model.npz and compile_report.json, see helpers/compiled_predictor.py
+                ProcessingOutput(output_name="compiled", source="/opt/ml/processing/compiled"),
+            ],
+            code=compile_code,
+            job_arguments=[
+                "--data-format", data_format,
+                "--cache-key", compile_key,
+            ],
+            cache_config=downstream_cache_config,
+        )
+
     # processing step for evaluation
     script_eval = ScriptProcessor(
         image_uri=image_uri,
@@ -179,6 +500,18 @@ def get_pipeline(
         output_name="evaluation",
         path="evaluation.json",
     )
+    eval_code = "source_scripts/evaluate/evaluate_xgboost/main.py"
+    eval_key = compute_cache_key(
+        train_key,
+        hash_paths([eval_code, helpers_dir]),
+        data_format,
+        cross_validation_folds,
+        compile_key if step_compile else None,
+        {
+            parameter.name: parameter.default_value
+            for parameter in [evaluation_chunk_size, bootstrap_samples, promotion_significance]
+        },
+    )
     step_eval = ProcessingStep(
         name="EvaluateAbaloneModel",
         processor=script_eval,
@@ -191,12 +524,65 @@ def get_pipeline(
                 source=step_process.properties.ProcessingOutputConfig.Outputs["test"].S3Output.S3Uri,
                 destination="/opt/ml/processing/test",
             ),
+            # Maps the one-hot columns back to the sex segments
+            ProcessingInput(
+                source=step_process.properties.ProcessingOutputConfig.Outputs["preprocessor"].S3Output.S3Uri,
+                destination="/opt/ml/processing/preprocessor",
+            ),
+        ]
+        + (
+            [
+                ProcessingInput(
+                    source=step_cv.properties.ProcessingOutputConfig.Outputs["cv"].S3Output.S3Uri,
+                    destination="/opt/ml/processing/cv",
+                )
+            ]
+            if step_cv
+            else []
+        )
+        + (
+            [
+                # The champion is scored on the raw test rows with its own preprocessor
+                ProcessingInput(
+                    source=step_process.properties.ProcessingOutputConfig.Outputs["raw_test"].S3Output.S3Uri,
+                    destination="/opt/ml/processing/raw_test",
+                )
+            ]
+            if champion_challenger
+            else []
+        )
+        + (
+            [
+                ProcessingInput(
+                    source=step_compile.properties.ProcessingOutputConfig.Outputs["compiled"].S3Output.S3Uri,
+                    destination="/opt/ml/processing/compiled",
+                )
+            ]
+            if step_compile
+            else []
+        )
+        + [
+            ProcessingInput(
+                source=helpers_dir,
+                destination="/opt/ml/processing/input/helpers",
+                input_name="helpers",
+            ),
         ],
         outputs=[
             ProcessingOutput(output_name="evaluation", source="/opt/ml/processing/evaluation"),
         ],
-        code="source_scripts/evaluate/evaluate_xgboost/main.py",
+        code=eval_code,
+        job_arguments=[
+            "--data-format", data_format,
+            "--chunk-size", evaluation_chunk_size,
+            "--bootstrap-samples", bootstrap_samples,
+            "--significance", promotion_significance,
+            "--cache-key", eval_key,
+        ]
+        + (["--model-package-group-name", model_package_group_name, "--region", region] if champion_challenger else []),
         property_files=[evaluation_report],
+        # The champion is looked up when the job runs, so a cached result could compare with an old one
+        cache_config=None if champion_challenger else downstream_cache_config,
     )
 
     # register model step that will be conditionally executed
@@ -229,13 +615,93 @@ def get_pipeline(
         ),
         right=6.0,
     )
+    # Set by the evaluation when the new model beats the champion significantly, or there is none
+    cond_promote = ConditionEquals(
+        left=JsonGet(
+            step_name=step_eval.name, property_file=evaluation_report, json_path="champion_challenger.promote"
+        ),
+        right=1,
+    )
+    cond_latency = ConditionLessThanOrEqualTo(
+        left=JsonGet(
+            step_name=step_eval.name,
+            property_file=evaluation_report,
+            json_path="performance_metrics.single_row_latency.p99_ms",
+        ),
+        right=latency_budget,
+    )
+
+    # optional batch scoring of raw records with the fitted preprocessor and the new model
+    batch_steps = []
+    if batch_transform_input:
+        score_source_dir = "source_scripts/scoring/batch_score"
+        batch_model = XGBoostModel(
+            model_data=step_train.properties.ModelArtifacts.S3ModelArtifacts,
+            role=role,
+            entry_point="inference.py",
+            source_dir=score_source_dir,
+            dependencies=[helpers_dir],
+            framework_version="1.7-1",
+            code_location=f"s3://{default_bucket}/{base_job_prefix}/AbaloneBatchModel",
+            env={
+                # Content hash of the uploaded code, whose S3 location changes with every upload
+                "SCORING_CODE_KEY": hash_paths([score_source_dir, helpers_dir]),
+                "PREPROCESSOR_URI": Join(
+                    on="/",
+                    values=[
+                        step_process.properties.ProcessingOutputConfig.Outputs["preprocessor"].S3Output.S3Uri,
+                        "preprocessor.json",
+                    ],
+                ),
+            },
+            sagemaker_session=sagemaker_session,
+        )
+        step_create_model = CreateModelStep(
+            name="CreateAbaloneBatchModel",
+            model=batch_model,
+            inputs=CreateModelInput(instance_type="ml.m5.large"),
+        )
+        transformer = Transformer(
+            model_name=step_create_model.properties.ModelName,
+            instance_type="ml.m5.large",
+            instance_count=1,
+            strategy="MultiRecord",
+            assemble_with="Line",
+            accept="text/csv",
+            output_path=f"s3://{default_bucket}/{base_job_prefix}/AbaloneBatchScores",
+            output_kms_key=bucket_kms_id,
+            sagemaker_session=sagemaker_session,
+        )
+        step_transform = TransformStep(
+            name="ScoreAbaloneBatch",
+            transformer=transformer,
+            inputs=TransformInput(data=batch_transform_input, content_type="text/csv", split_type="Line"),
+        )
+        batch_steps = [step_create_model, step_transform]
+
     step_cond = ConditionStep(
         name="CheckMSEAbaloneEvaluation",
-        conditions=[cond_lte],
-        if_steps=[step_register],
+        conditions=[cond_lte]
+        + ([cond_latency] if latency_gate else [])
+        + ([cond_promote] if champion_challenger else []),
+        if_steps=[step_register] + batch_steps,
         else_steps=[],
     )
 
+    if step_cache is not None and table_manifest is not None:
+        step_cache.add(step_process.name, preprocess_key)
+        if downstream_cache_config is not None:
+            step_cache.add(step_train.name, train_key)
+            if step_cv:
+                step_cache.add(step_cv.name, cv_key)
+            if step_compile:
+                step_cache.add(step_compile.name, compile_key)
+            if not champion_challenger:
+                step_cache.add(step_eval.name, eval_key)
+        for step_name, entry in step_cache.report().items():
+            logger.info(f"Step cache {entry['status']} for {step_name} (key {entry['key'][:12]})")
+    _step_cache = step_cache
+
     # Create pipeline
     pipeline = Pipeline(
         name=pipeline_name,
@@ -243,11 +709,33 @@ def get_pipeline(
             processing_instance_type,
             processing_instance_count,
             training_instance_type,
+            training_instance_count,
             model_approval_status,
             glue_database,
             glue_table,
+            preprocess_chunk_size,
+            split_seed,
+            evaluation_chunk_size,
+            bootstrap_samples,
+            promotion_significance,
+            latency_budget,
+            partition_filter,
+            sample_fraction,
+            feature_columns,
         ],
-        steps=[step_process, step_train, step_eval, step_cond],
+        steps=[step_process, step_train]
+        + [step for step in [step_cv, step_compile] if step]
+        + [step_eval, step_cond],
         sagemaker_session=sagemaker_session,
     )
-    return pipeline
\ No newline at end of file
+    return pipeline
+
+
+def record_step_cache(execution_arn=None):
+    """Records the step cache keys of the last pipeline built by get_pipeline.
+
+    Args:
+        execution_arn: ARN of the pipeline execution that was started with them
+    """
+    if _step_cache is not None:
+        _step_cache.record(execution_arn)
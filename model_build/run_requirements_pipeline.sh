@@ -27,6 +27,10 @@ pymysql
 pandas==1.1.3
 EOF
 
+# Prebuild the dependencies so the processing job does not pip install at start-up
+echo "Building preprocessing dependency bundle..."
+bash source_scripts/preprocessing/prepare_abalone_data/build_dependency_bundle.sh
+
 # Copy the AWS Data Wrangler script to S3
 echo "Copying AWS Data Wrangler script to S3..."
 aws s3 cp source_scripts/preprocessing/prepare_abalone_data/data_wrangler_requirements.py s3://${S3_BUCKET}/SMUSMLOPS/requirements-preprocess/input/code/data_wrangler_requirements.py
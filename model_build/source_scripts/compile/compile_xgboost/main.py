@@ -0,0 +1,139 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# SPDX-License-Identifier: MIT-0
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Compiles the trained booster into a flattened numpy forest, checks it and measures the latency gain."""
+import argparse
+import json
+import logging
+import os
+import pathlib
+import sys
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import xgboost
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+logger.addHandler(logging.StreamHandler())
+
+# Shared helpers are mounted as a processing input; fall back to the repo layout for local runs
+sys.path.append(os.environ.get("HELPERS_DIR", "/opt/ml/processing/input/helpers"))
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[2] / "helpers"))
+from benchmark import batch_throughput, single_row_latency
+from compiled_predictor import ARTIFACT_NAME, CompiledForest
+from model_io import load_model_artifact
+
+REPORT_NAME = "compile_report.json"
+
+
+def iter_features(test_dir, data_format, chunk_size):
+    """Yields the feature columns of every test part in chunks of ``chunk_size`` rows."""
+    for path in sorted(pathlib.Path(test_dir).glob(f"*.{data_format}")):
+        if data_format == "parquet":
+            batches = (
+                batch.to_pandas().to_numpy() for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size)
+            )
+        else:
+            batches = (chunk.to_numpy() for chunk in pd.read_csv(path, header=None, chunksize=chunk_size))
+        for batch in batches:
+            yield batch[:, 1:].astype(np.float32)
+
+
+def check_parity(booster, forest, chunks):
+    """Compares both predictors on every row.
+
+    Returns:
+        (rows compared, largest absolute difference, largest difference relative to max(1, |prediction|))
+    """
+    rows, max_abs, max_rel = 0, 0.0, 0.0
+    for features in chunks:
+        expected = booster.predict(xgboost.DMatrix(features))
+        difference = np.abs(forest.predict(features) - expected)
+        rows += len(features)
+        max_abs = max(max_abs, float(difference.max()))
+        max_rel = max(max_rel, float((difference / np.maximum(1.0, np.abs(expected))).max()))
+    return rows, max_abs, max_rel
+
+
+def compare_latency(booster, forest, sample, batch_sizes, latency_samples):
+    """Single-row latency and batch throughput of the booster and the compiled forest, one thread each."""
+    booster.set_param({"nthread": 1})
+    predictors = {
+        "xgboost": lambda batch: booster.predict(xgboost.DMatrix(batch, nthread=1), validate_features=False),
+        "compiled": forest.predict,
+    }
+    report = {"single_row_latency": {}, "throughput": []}
+    for name, predict in predictors.items():
+        report["single_row_latency"][name] = single_row_latency(predict, sample, latency_samples)
+        for batch_size in batch_sizes:
+            report["throughput"].append({"predictor": name, **batch_throughput(predict, sample, batch_size)})
+    for percentile in ["p50_ms", "p99_ms"]:
+        latency = report["single_row_latency"]
+        latency[f"{percentile[:3]}_speedup"] = latency["xgboost"][percentile] / latency["compiled"][percentile]
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data-format", type=str, default="csv", choices=["csv", "parquet"])
+    # Content hash of the step inputs, only used to key the SageMaker step cache
+    parser.add_argument("--cache-key", type=str, default=None)
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=1e-4,
+        help="Largest difference to the booster's predictions, relative to max(1, |prediction|)",
+    )
+    parser.add_argument("--latency-samples", type=int, default=1000)
+    parser.add_argument("--benchmark-rows", type=int, default=1000)
+    parser.add_argument("--batch-sizes", type=str, default="1,10,100,1000")
+    args = parser.parse_args()
+
+    booster = load_model_artifact("/opt/ml/processing/model/model.tar.gz", use_cache=False)
+    forest = CompiledForest.from_booster(booster)
+    logger.info(f"Compiled {forest.num_trees} trees of depth up to {forest.depth}")
+
+    test_dir = "/opt/ml/processing/test"
+    rows, max_abs, max_rel = check_parity(booster, forest, iter_features(test_dir, args.data_format, 10000))
+    logger.info(f"Parity on {rows} test rows: max absolute difference {max_abs:.3g}, relative {max_rel:.3g}")
+    if max_rel > args.tolerance:
+        raise ValueError(f"Compiled predictions differ by {max_rel:.3g}, above the tolerance {args.tolerance}")
+
+    sample = next(iter_features(test_dir, args.data_format, args.benchmark_rows))
+    report = {
+        "trees": forest.num_trees,
+        "depth": forest.depth,
+        "parity": {
+            "rows": rows,
+            "max_absolute_difference": max_abs,
+            "max_relative_difference": max_rel,
+            "tolerance": args.tolerance,
+        },
+        **compare_latency(
+            booster, forest, sample, [int(size) for size in args.batch_sizes.split(",")], args.latency_samples
+        ),
+    }
+    latency = report["single_row_latency"]
+    logger.info(f"Single-row p50 speedup {latency['p50_speedup']:.2f}x, p99 {latency['p99_speedup']:.2f}x")
+
+    output_dir = pathlib.Path("/opt/ml/processing/compiled")
+    output_dir.mkdir(parents=True, exist_ok=True)
+    forest.save(output_dir / ARTIFACT_NAME)
+    with open(output_dir / REPORT_NAME, "w") as f:
+        json.dump(report, f, indent=2)
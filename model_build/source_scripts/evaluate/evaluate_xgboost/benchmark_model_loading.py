@@ -0,0 +1,81 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# SPDX-License-Identifier: MIT-0
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Compares extracting a model.tar.gz to disk and loading the file with streaming it into memory.
+
+Run it against a local or S3 artifact, for example::
+
+    python benchmark_model_loading.py --model-artifact model.tar.gz --repeat 5
+"""
+import argparse
+import json
+import os
+import pathlib
+import sys
+import tarfile
+import tempfile
+import time
+
+import xgboost
+
+sys.path.append(os.environ.get("HELPERS_DIR", "/opt/ml/processing/input/helpers"))
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[2] / "helpers"))
+from model_io import MODEL_FILE, load_model_artifact, open_artifact
+
+
+def extract_then_load(artifact):
+    """What evaluation used to do: download, extract the archive to disk and load the file."""
+    with tempfile.TemporaryDirectory() as tmp:
+        tar_path = os.path.join(tmp, "model.tar.gz")
+        with open_artifact(artifact) as source, open(tar_path, "wb") as target:
+            for block in iter(lambda: source.read(1 << 20), b""):
+                target.write(block)
+        with tarfile.open(tar_path) as tar:
+            tar.extractall(path=tmp)
+        booster = xgboost.Booster()
+        booster.load_model(os.path.join(tmp, MODEL_FILE))
+        return booster
+
+
+def stream_into_memory(artifact):
+    return load_model_artifact(artifact, use_cache=False)
+
+
+def timed(load, artifact):
+    start = time.perf_counter()
+    load(artifact)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model-artifact", type=str, required=True, help="Local path or S3 URI of a model.tar.gz")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = {"extract_then_load": [], "stream_into_memory": []}
+    for _ in range(args.repeat):
+        results["extract_then_load"].append(timed(extract_then_load, args.model_artifact))
+        results["stream_into_memory"].append(timed(stream_into_memory, args.model_artifact))
+
+    summary = {name: {"min_s": min(times), "mean_s": sum(times) / len(times)} for name, times in results.items()}
+    summary["speedup"] = summary["extract_then_load"]["mean_s"] / summary["stream_into_memory"]["mean_s"]
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
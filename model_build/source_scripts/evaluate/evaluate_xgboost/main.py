@@ -15,53 +15,408 @@
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
 # SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
-"""Evaluation script for measuring mean squared error."""
+"""Evaluation script for measuring the regression metrics of the model on the test split."""
+import argparse
 import json
 import logging
+import os
 import pathlib
-import pickle
-import tarfile
+import sys
 
 import numpy as np
 import pandas as pd
+import pyarrow.parquet as pq
 import xgboost
 
-from sklearn.metrics import mean_squared_error
-
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 logger.addHandler(logging.StreamHandler())
 
+# Shared helpers are mounted as a processing input; fall back to the repo layout for local runs
+sys.path.append(os.environ.get("HELPERS_DIR", "/opt/ml/processing/input/helpers"))
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[2] / "helpers"))
+from benchmark import profile_booster
+from model_io import PREPROCESSOR_FILE, load_model_artifact, read_member_bytes
+from model_registry import get_approved_model_data
+from preprocessor import Preprocessor
+from regression_metrics import (
+    StreamingRegressionMetrics,
+    compare_metrics,
+    paired_comparison,
+    regression_report,
+    squared_error_improvement,
+)
+from streaming_stats import RunningMoments
 
-if __name__ == "__main__":
-    logger.debug("Starting evaluation.")
-    model_path = "/opt/ml/processing/model/model.tar.gz"
-    with tarfile.open(model_path) as tar:
-        tar.extractall(path=".")
 
-    logger.debug("Loading xgboost model.")
-    model = pickle.load(open("xgboost-model", "rb"))
+def read_test_data(test_dir, data_format):
+    """Reads the test split written by preprocessing, label in the first column.
 
-    logger.debug("Reading test data.")
-    test_path = "/opt/ml/processing/test/test.csv"
-    df = pd.read_csv(test_path, header=None)
+    Incremental preprocessing writes one part per run, so every file of the format is read.
+    """
+    paths = sorted(pathlib.Path(test_dir).glob(f"*.{data_format}"))
+    if data_format == "parquet":
+        return pd.concat([pd.read_parquet(path) for path in paths], ignore_index=True)
+    return pd.concat([pd.read_csv(path, header=None) for path in paths], ignore_index=True)
+
+
+def iter_test_batches(test_dir, data_format, chunk_size):
+    """Yields ``(labels, features)`` arrays of at most ``chunk_size`` rows from every test part."""
+    for path in sorted(pathlib.Path(test_dir).glob(f"*.{data_format}")):
+        if data_format == "parquet":
+            batches = (
+                batch.to_pandas().to_numpy() for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size)
+            )
+        else:
+            batches = (chunk.to_numpy() for chunk in pd.read_csv(path, header=None, chunksize=chunk_size))
+        for batch in batches:
+            yield batch[:, 0], batch[:, 1:]
+
+
+def raw_test_columns(raw_dir, test_dir, data_format):
+    """Columns of the raw copy of the test split, after checking it has a file for every test part.
+
+    Raises:
+        ValueError: there is no raw copy, or its files do not match those of the test split
+    """
+    raw_paths = sorted(pathlib.Path(raw_dir).glob("*.csv"))
+    test_paths = sorted(pathlib.Path(test_dir).glob(f"*.{data_format}"))
+    if [path.stem for path in raw_paths] != [path.stem for path in test_paths]:
+        raise ValueError(f"The raw test files in {raw_dir} do not match the test split")
+    return list(pd.read_csv(raw_paths[0], nrows=0).columns) if raw_paths else []
+
+
+def iter_raw_batches(raw_dir, chunk_size):
+    """Yields the raw test rows as DataFrames, batched like ``iter_test_batches``."""
+    for path in sorted(pathlib.Path(raw_dir).glob("*.csv")):
+        yield from pd.read_csv(path, chunksize=chunk_size)
+
+
+def load_champion(artifact, raw_columns, boto3_session=None):
+    """Loads the booster and the preprocessor packaged in the champion's model.tar.gz.
+
+    The champion is scored on the raw test rows transformed with its own preprocessor, so it is
+    compared on the features it was trained with even when the new model's differ.
+
+    Returns:
+        (booster, ``Preprocessor``)
+
+    Raises:
+        ValueError: the champion cannot be scored on the raw test split, with the reason
+    """
+    try:
+        stored = read_member_bytes(artifact, PREPROCESSOR_FILE, boto3_session)
+    except KeyError:
+        raise ValueError(f"{artifact} has no {PREPROCESSOR_FILE} to transform the test rows with")
+    preprocessor = Preprocessor.from_dict(json.loads(stored))
+    missing = [
+        name for name in preprocessor.numeric_features + preprocessor.categorical_features if name not in raw_columns
+    ]
+    if missing:
+        raise ValueError(f"The raw test split lacks the champion's feature columns {missing}")
+    try:
+        booster = load_model_artifact(artifact, boto3_session=boto3_session, use_cache=False)
+    except xgboost.core.XGBoostError:
+        raise ValueError(f"{artifact} is not a native XGBoost model file")
+    if booster.num_features() != len(preprocessor.output_columns):
+        raise ValueError(
+            f"The champion has {booster.num_features()} features, its preprocessor {len(preprocessor.output_columns)}"
+        )
+    return booster, preprocessor
+
+
+def champion_predict(champion, raw):
+    """Predictions of the champion for raw test rows."""
+    booster, preprocessor = champion
+    return booster.predict(xgboost.DMatrix(preprocessor.transform(raw)))
+
+
+def iter_predictions(model, test_dir, data_format, chunk_size, champion=None, raw_dir=None):
+    """Yields ``(labels, features, predictions)`` for every batch of the test split.
+
+    The predictions are those of the new model and, with a champion, of the champion on the
+    same rows read from the raw copy of the split.
+    """
+    raw_batches = iter_raw_batches(raw_dir, chunk_size) if champion else None
+    for y, X in iter_test_batches(test_dir, data_format, chunk_size):
+        predictions = [model.predict(xgboost.DMatrix(X))]
+        if champion:
+            raw = next(raw_batches)
+            if len(raw) != len(y):
+                raise ValueError(f"The raw test split is not aligned with the test split in {raw_dir}")
+            predictions.append(champion_predict(champion, raw))
+        yield y, X, predictions
+
+
+def load_segments(preprocessor_path, feature="sex"):
+    """Finds the one-hot columns of a categorical feature in the transformed test split.
+
+    Returns:
+        (segment names, feature column indices, number of feature columns), or None without the
+        fitted preprocessor or when the feature was not selected
+    """
+    if not pathlib.Path(preprocessor_path).exists():
+        logger.info("No fitted preprocessor, skipping the segment metrics")
+        return None
+    preprocessor = Preprocessor.load(preprocessor_path)
+    if feature not in preprocessor.categorical_features:
+        return None
+    columns = preprocessor.output_columns
+    names = [str(category) for category in preprocessor.categories]
+    return names, [columns.index(f"{feature}_{name}") for name in names], len(columns)
+
+
+def segment_codes(features, segments):
+    """Segment code of every row from its one-hot columns, -1 where none is set.
 
+    Returns:
+        int array, or None if the features do not have the columns of the preprocessor
+    """
+    if segments is None:
+        return None
+    _, columns, width = segments
+    if features.shape[1] != width:
+        logger.warning(f"Test split has {features.shape[1]} features, preprocessor {width}; skipping segments")
+        return None
+    block = features[:, columns]
+    codes = np.argmax(block, axis=1)
+    codes[block.max(axis=1) <= 0] = -1
+    return codes
+
+
+def evaluate_in_memory(model, test_dir, data_format, segments=None, champion=None, raw_dir=None):
+    """Predicts the whole test split at once with the model and the optional champion.
+
+    Returns:
+        (labels, list of the predictions of the model and the champion, segment codes or None)
+    """
     logger.debug("Reading test data.")
+    df = read_test_data(test_dir, data_format)
+
     y_test = df.iloc[:, 0].to_numpy()
     df.drop(df.columns[0], axis=1, inplace=True)
     X_test = xgboost.DMatrix(df.values)
 
     logger.info("Performing predictions against test data.")
-    predictions = model.predict(X_test)
-
-    logger.debug("Calculating mean squared error.")
-    mse = mean_squared_error(y_test, predictions)
-    std = np.std(y_test - predictions)
-    report_dict = {
-        "regression_metrics": {
-            "mse": {"value": mse, "standard_deviation": std},
-        },
-    }
+    predictions = [model.predict(X_test)]
+    if champion:
+        raw = pd.concat([pd.read_csv(path) for path in sorted(pathlib.Path(raw_dir).glob("*.csv"))], ignore_index=True)
+        if len(raw) != len(y_test):
+            raise ValueError(f"The raw test split is not aligned with the test split in {raw_dir}")
+        predictions.append(champion_predict(champion, raw))
+    return y_test, predictions, segment_codes(df.values, segments)
+
+
+def collect_streaming(model, test_dir, data_format, chunk_size, segments=None, champion=None, raw_dir=None):
+    """Predicts the test split in batches of ``chunk_size`` rows, keeping the rows.
+
+    Each batch is read once and scored by the model and the optional champion. Only the labels,
+    predictions and segment codes are kept, not the features, so memory grows by 4 bytes per row
+    and model plus 5 bytes per row, which the bootstrap needs.
+
+    Returns:
+        (labels, list of the predictions of the model and the champion, segment codes or None)
+    """
+    labels, predictions, codes = [], [[], []] if champion else [[]], []
+    for y, X, batch_predictions in iter_predictions(model, test_dir, data_format, chunk_size, champion, raw_dir):
+        labels.append(y.astype(np.float32))
+        for model_predictions, values in zip(predictions, batch_predictions):
+            model_predictions.append(values)
+        codes.append(segment_codes(X, segments))
+    logger.info(f"Evaluated {sum(map(len, labels))} rows in batches of {chunk_size}")
+    codes = None if any(code is None for code in codes) else np.concatenate(codes).astype(np.int8)
+    return np.concatenate(labels), [np.concatenate(parts) for parts in predictions], codes
+
+
+def evaluate_streaming(model, test_dir, data_format, chunk_size, segments=None, champion=None, raw_dir=None):
+    """Predicts the test split in batches of ``chunk_size`` rows and accumulates the metrics.
+
+    Memory stays bounded by the batch size whatever the size of the split: every batch is folded
+    into a ``StreamingRegressionMetrics`` per model and, with a champion, the moments of the
+    paired squared error improvement, then dropped.
+
+    Returns:
+        (list of the ``StreamingRegressionMetrics`` of the model and the champion,
+        ``RunningMoments`` of the improvement over the champion, or None without one)
+    """
+    names = segments[0] if segments else None
+    accumulators = [StreamingRegressionMetrics(names) for _ in range(2 if champion else 1)]
+    improvement = RunningMoments() if champion else None
+    for y, X, predictions in iter_predictions(model, test_dir, data_format, chunk_size, champion, raw_dir):
+        codes = segment_codes(X, segments)
+        for accumulator, model_predictions in zip(accumulators, predictions):
+            accumulator.update(y, model_predictions, codes)
+        if improvement is not None:
+            improvement.update(squared_error_improvement(y.astype(np.float64), predictions[0], predictions[1]))
+    logger.info(f"Evaluated {accumulators[0].residuals.count} rows in batches of {chunk_size}")
+    return accumulators, improvement
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data-format", type=str, default="csv", choices=["csv", "parquet"])
+    # Content hash of the step inputs, only used to key the SageMaker step cache
+    parser.add_argument("--cache-key", type=str, default=None)
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=0,
+        help="Rows per prediction batch with streaming metrics; 0 predicts the whole test split at once",
+    )
+    parser.add_argument(
+        "--keep-rows",
+        action="store_true",
+        help="With --chunk-size, keep the label and predictions of every row for the bootstrap and exact quantiles",
+    )
+    parser.add_argument(
+        "--bootstrap-samples",
+        type=int,
+        default=1000,
+        help="Bootstrap resamples for the confidence intervals of the metrics; 0 skips them",
+    )
+    parser.add_argument("--bootstrap-workers", type=int, default=0, help="Bootstrap processes; 0 uses every core")
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--model-package-group-name",
+        type=str,
+        default=None,
+        help="Compare with the latest approved model package of this group, looked up when the job runs",
+    )
+    parser.add_argument(
+        "--champion-model-data",
+        type=str,
+        default=None,
+        help="Local path or S3 URI of a model.tar.gz to compare with instead of the latest approved package",
+    )
+    parser.add_argument("--region", type=str, default=None, help="Region of the model registry and artifacts")
+    parser.add_argument(
+        "--significance",
+        type=float,
+        default=0.05,
+        help="Significance level of the paired test a challenger must pass to replace the champion",
+    )
+    parser.add_argument(
+        "--latency-samples",
+        type=int,
+        default=1000,
+        help="Single-row predictions timed for the performance metrics; 0 skips the benchmark",
+    )
+    parser.add_argument("--benchmark-rows", type=int, default=1000, help="Test rows scored by the benchmark")
+    parser.add_argument("--batch-sizes", type=str, default="1,10,100,1000")
+    parser.add_argument(
+        "--thread-counts", type=str, default="", help="Comma separated nthread values, 1 and every core by default"
+    )
+    args = parser.parse_args()
+
+    logger.debug("Starting evaluation.")
+    model_path = "/opt/ml/processing/model/model.tar.gz"
+
+    logger.debug("Loading xgboost model.")
+    # Streamed into memory, a processing job loads each artifact once so the disk cache would not pay off
+    model = load_model_artifact(model_path, use_cache=False)
+
+    test_dir = "/opt/ml/processing/test"
+    raw_dir = "/opt/ml/processing/raw_test"
+    # The current champion, scored in the same pass as the new model on the raw test rows
+    champion, champion_model, skipped = None, args.champion_model_data, None
+    if args.champion_model_data or args.model_package_group_name:
+        import boto3
+
+        boto3_session = boto3.Session(region_name=args.region)
+        if not champion_model:
+            # Looked up when the evaluation runs, so every execution compares with the current champion
+            champion_model = get_approved_model_data(args.model_package_group_name, boto3_session)
+        if champion_model:
+            try:
+                champion = load_champion(
+                    champion_model, raw_test_columns(raw_dir, test_dir, args.data_format), boto3_session
+                )
+                logger.info(f"Comparing with the champion model {champion_model}")
+            except ValueError as e:
+                skipped = str(e)
+                logger.warning(f"Skipping the comparison with the champion model {champion_model}: {skipped}")
+
+    segments = load_segments("/opt/ml/processing/preprocessor/preprocessor.json")
+    if args.chunk_size > 0 and not args.keep_rows:
+        if args.bootstrap_samples:
+            logger.info("Streaming metrics keep no rows, skipping the bootstrap (see --keep-rows)")
+        accumulators, improvement = evaluate_streaming(
+            model, test_dir, args.data_format, args.chunk_size, segments, champion, raw_dir
+        )
+        report_dict = accumulators[0].report()
+        comparison = None
+        if champion:
+            comparison = compare_metrics(
+                accumulators[0].metrics(), accumulators[1].metrics(), improvement, args.significance
+            )
+    else:
+        if args.chunk_size > 0:
+            y, predictions, codes = collect_streaming(
+                model, test_dir, args.data_format, args.chunk_size, segments, champion, raw_dir
+            )
+        else:
+            y, predictions, codes = evaluate_in_memory(model, test_dir, args.data_format, segments, champion, raw_dir)
+
+        logger.debug("Calculating regression metrics.")
+        report_dict = regression_report(
+            y,
+            predictions[0],
+            codes,
+            segments[0] if segments else None,
+            resamples=args.bootstrap_samples,
+            confidence=args.confidence,
+            seed=args.seed,
+            workers=args.bootstrap_workers or None,
+        )
+        comparison = paired_comparison(y, predictions[0], predictions[1], args.significance) if champion else None
+    mse = report_dict["regression_metrics"]["mse"]["value"]
+
+    if comparison is not None:
+        comparison["champion_model"] = champion_model
+        logger.info(
+            f"Champion mse {comparison['champion']['mse']:f}, delta {comparison['deltas']['mse']:+f}, "
+            f"p-value {comparison['paired_test']['p_value']:.4g}"
+        )
+    else:
+        # Without an approved model, or one that cannot be scored on this test split, the
+        # challenger is promoted on the absolute threshold alone
+        comparison = {"champion_model": champion_model, "significant": False, "promote": 1}
+        if skipped:
+            comparison["skipped"] = skipped
+    report_dict["champion_challenger"] = comparison
+
+    if args.latency_samples > 0:
+        logger.info("Benchmarking prediction latency and throughput.")
+        _, sample = next(iter_test_batches(test_dir, args.data_format, args.benchmark_rows))
+        report_dict["performance_metrics"] = profile_booster(
+            model,
+            sample,
+            batch_sizes=[int(size) for size in args.batch_sizes.split(",")],
+            thread_counts=[int(count) for count in args.thread_counts.split(",") if count],
+            latency_samples=args.latency_samples,
+        )
+        latency = report_dict["performance_metrics"]["single_row_latency"]
+        logger.info(f"Single-row latency p50 {latency['p50_ms']:.3f} ms, p99 {latency['p99_ms']:.3f} ms")
+
+    # Parity and latency gain of the optional compilation step
+    compile_report_path = pathlib.Path("/opt/ml/processing/compiled/compile_report.json")
+    if compile_report_path.exists():
+        compiled = json.loads(compile_report_path.read_text())
+        report_dict.setdefault("performance_metrics", {})["compiled"] = compiled
+        logger.info(f"Compiled predictor single-row p50 speedup {compiled['single_row_latency']['p50_speedup']:.2f}x")
+
+    # Mean and spread over the folds of the optional cross-validation step
+    cv_path = pathlib.Path("/opt/ml/processing/cv/cv.json")
+    if cv_path.exists():
+        cv = json.loads(cv_path.read_text())
+        for metric in ["mse", "rmse", "mae"]:
+            report_dict["regression_metrics"][f"cv_{metric}"] = {
+                "value": cv[metric]["mean"],
+                "standard_deviation": cv[metric]["standard_deviation"],
+            }
+        report_dict["cross_validation"] = cv
+        logger.info("Cross-validation mse over %d folds: %f", cv["k"], cv["mse"]["mean"])
 
     output_dir = "/opt/ml/processing/evaluation"
     pathlib.Path(output_dir).mkdir(parents=True, exist_ok=True)
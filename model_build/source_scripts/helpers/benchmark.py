@@ -0,0 +1,118 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# SPDX-License-Identifier: MIT-0
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Latency and throughput measurements of a model's predict function."""
+import os
+import time
+
+import numpy as np
+
+LATENCY_PERCENTILES = (50, 95, 99)
+
+
+def single_row_latency(predict, features, samples=1000, warmup=20):
+    """Times ``predict`` on one row at a time, cycling through the rows of ``features``.
+
+    Returns:
+        dict with the mean and the p50/p95/p99 latencies in milliseconds
+    """
+    rows = len(features)
+    for index in range(min(warmup, samples)):
+        predict(features[index % rows:index % rows + 1])
+    timings = np.empty(samples)
+    for index in range(samples):
+        row = features[index % rows:index % rows + 1]
+        start = time.perf_counter()
+        predict(row)
+        timings[index] = time.perf_counter() - start
+    timings *= 1000
+    percentiles = np.percentile(timings, LATENCY_PERCENTILES)
+    latency = {f"p{q}_ms": float(value) for q, value in zip(LATENCY_PERCENTILES, percentiles)}
+    latency["mean_ms"] = float(timings.mean())
+    latency["samples"] = samples
+    return latency
+
+
+def batch_throughput(predict, features, batch_size, min_seconds=0.2, min_calls=3):
+    """Scores consecutive batches of ``batch_size`` rows for at least ``min_seconds``.
+
+    Returns:
+        dict with the rows per second and the mean batch latency in milliseconds
+    """
+    rows = len(features)
+    batch_size = min(batch_size, rows)
+    predict(features[:batch_size])
+    calls, scored, offset = 0, 0, 0
+    start = time.perf_counter()
+    while calls < min_calls or time.perf_counter() - start < min_seconds:
+        if offset + batch_size > rows:
+            offset = 0
+        predict(features[offset:offset + batch_size])
+        offset += batch_size
+        scored += batch_size
+        calls += 1
+    elapsed = time.perf_counter() - start
+    return {
+        "batch_size": batch_size,
+        "rows_per_second": scored / elapsed,
+        "batch_latency_ms": 1000 * elapsed / calls,
+    }
+
+
+def profile_booster(booster, features, batch_sizes=(1, 10, 100, 1000), thread_counts=None, latency_samples=1000):
+    """Latency and throughput profile of an ``xgb.Booster``, scored through a ``DMatrix`` as a
+    serving container does.
+
+    Args:
+        booster: the model
+        features: float array of representative rows
+        batch_sizes: batch sizes of the throughput runs
+        thread_counts: ``nthread`` values of the throughput runs, 1 and every core by default
+        latency_samples: single-row predictions timed for the latency percentiles
+
+    Returns:
+        dict with the ``model`` size and tree count, the ``single_row_latency`` (one thread) and
+        the ``throughput`` of every batch size and thread count
+    """
+    import xgboost as xgb
+
+    features = np.ascontiguousarray(features, dtype=np.float32)
+    cores = os.cpu_count() or 1
+    thread_counts = sorted(set(thread_counts or (1, cores)))
+
+    def predict(batch):
+        return booster.predict(xgb.DMatrix(batch, nthread=threads), validate_features=False)
+
+    profile = {
+        "model": {
+            "size_bytes": len(booster.save_raw(raw_format="ubj")),
+            "trees": len(booster.get_dump()),
+            "rounds": booster.num_boosted_rounds(),
+            "features": booster.num_features(),
+        },
+        "benchmark_rows": len(features),
+        "cores": cores,
+    }
+    threads = 1
+    booster.set_param({"nthread": threads})
+    profile["single_row_latency"] = single_row_latency(predict, features, latency_samples)
+    profile["throughput"] = []
+    for threads in thread_counts:
+        booster.set_param({"nthread": threads})
+        for batch_size in batch_sizes:
+            profile["throughput"].append({"threads": threads, **batch_throughput(predict, features, batch_size)})
+    return profile
@@ -0,0 +1,160 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# SPDX-License-Identifier: MIT-0
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Array-backed tree ensemble that predicts with numpy alone, for low-latency scoring of small batches."""
+import json
+
+import numpy as np
+
+ARTIFACT_NAME = "compiled-model.npz"
+# Objectives whose prediction is the raw margin, the only ones the flattened forest reproduces
+IDENTITY_OBJECTIVES = {
+    "reg:squarederror",
+    "reg:squaredlogerror",
+    "reg:pseudohubererror",
+    "reg:absoluteerror",
+    "reg:quantileerror",
+}
+
+
+class CompiledForest:
+    """All trees of a gradient boosted ensemble flattened into shared node arrays.
+
+    Node ``i`` of the concatenated trees splits on ``feature[i]`` at ``threshold[i]`` and sends
+    rows left when the value is below it (missing values follow ``default_left[i]``), as XGBoost
+    does. Leaves point back to themselves with their value in ``value``, so a batch is predicted
+    by advancing every (row, tree) pair ``depth`` times with array gathers, with no per-tree or
+    per-row Python loop and no ``DMatrix``.
+    """
+
+    def __init__(self, feature, threshold, left, right, default_left, value, roots, depth, base_score, num_feature):
+        self.feature = np.asarray(feature, dtype=np.int32)
+        self.threshold = np.asarray(threshold, dtype=np.float32)
+        self.left = np.asarray(left, dtype=np.int32)
+        self.right = np.asarray(right, dtype=np.int32)
+        self.default_left = np.asarray(default_left, dtype=bool)
+        self.value = np.asarray(value, dtype=np.float32)
+        self.roots = np.asarray(roots, dtype=np.int32)
+        self.depth = int(depth)
+        self.base_score = float(base_score)
+        self.num_feature = int(num_feature)
+
+    @classmethod
+    def from_booster(cls, booster):
+        """Flattens an ``xgb.Booster`` of regression trees, through its JSON model."""
+        model = json.loads(booster.save_raw(raw_format="json"))
+        learner = model["learner"]
+        objective = learner["objective"]["name"]
+        if objective not in IDENTITY_OBJECTIVES:
+            raise ValueError(f"Objective {objective} is not supported, its link function is not the identity")
+        if learner["gradient_booster"]["name"] != "gbtree":
+            raise ValueError(f"Booster {learner['gradient_booster']['name']} is not supported, only gbtree")
+        params = learner["learner_model_param"]
+        if int(params.get("num_target", 1)) != 1 or int(params.get("num_class", 0)) > 1:
+            raise ValueError("Only single output models are supported")
+
+        features, thresholds, lefts, rights, default_lefts, values, roots = [], [], [], [], [], [], []
+        depth, offset = 0, 0
+        for tree in learner["gradient_booster"]["model"]["trees"]:
+            if any(tree["split_type"]):
+                raise ValueError("Categorical splits are not supported")
+            left = np.asarray(tree["left_children"])
+            right = np.asarray(tree["right_children"])
+            conditions = np.asarray(tree["split_conditions"], dtype=np.float32)
+            leaf = left == -1
+            nodes = np.arange(len(left))
+            # Leaves loop onto themselves, their split condition holds the leaf value
+            features.append(np.where(leaf, 0, tree["split_indices"]))
+            thresholds.append(np.where(leaf, 0, conditions))
+            lefts.append(np.where(leaf, nodes, left) + offset)
+            rights.append(np.where(leaf, nodes, right) + offset)
+            default_lefts.append(np.asarray(tree["default_left"], dtype=bool))
+            values.append(np.where(leaf, conditions, 0))
+            roots.append(offset)
+            depth = max(depth, _tree_depth(left, right))
+            offset += len(left)
+        # 1.7 stores the base score as "5E-1", later releases as "[5E-1]"
+        base_score = float(params["base_score"].strip("[]"))
+        return cls(
+            np.concatenate(features),
+            np.concatenate(thresholds),
+            np.concatenate(lefts),
+            np.concatenate(rights),
+            np.concatenate(default_lefts),
+            np.concatenate(values),
+            roots,
+            depth,
+            base_score,
+            params["num_feature"],
+        )
+
+    @property
+    def num_trees(self):
+        return len(self.roots)
+
+    def predict(self, features):
+        """Predicts a float array of shape (rows, num_feature), NaN for missing values."""
+        features = np.asarray(features, dtype=np.float32)
+        if features.ndim == 1:
+            features = features[None, :]
+        rows = np.arange(len(features))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(features), self.num_trees))
+        for _ in range(self.depth):
+            values = features[rows, self.feature[nodes]]
+            go_left = np.where(np.isnan(values), self.default_left[nodes], values < self.threshold[nodes])
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return self.value[nodes].sum(axis=1, dtype=np.float32) + np.float32(self.base_score)
+
+    def save(self, path):
+        np.savez(
+            path,
+            feature=self.feature,
+            threshold=self.threshold,
+            left=self.left,
+            right=self.right,
+            default_left=self.default_left,
+            value=self.value,
+            roots=self.roots,
+            meta=np.asarray([self.depth, self.base_score, self.num_feature], dtype=np.float64),
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            depth, base_score, num_feature = data["meta"]
+            return cls(
+                data["feature"],
+                data["threshold"],
+                data["left"],
+                data["right"],
+                data["default_left"],
+                data["value"],
+                data["roots"],
+                depth,
+                base_score,
+                num_feature,
+            )
+
+
+def _tree_depth(left, right):
+    """Number of splits on the longest root to leaf path."""
+    depth, level = 0, [0]
+    while True:
+        level = [child for node in level if left[node] != -1 for child in (left[node], right[node])]
+        if not level:
+            return depth
+        depth += 1
@@ -0,0 +1,185 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# SPDX-License-Identifier: MIT-0
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Native XGBoost model files, read from model artifacts in memory or through a local cache."""
+import hashlib
+import logging
+import os
+import pathlib
+import pickle
+import tarfile
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+MODEL_FILE = "xgboost-model"
+# Under a directory, which the container's model loader does not read as a model file
+PREPROCESSOR_FILE = "preprocessor/preprocessor.json"
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "abalone-model-cache")
+
+
+def save_booster(booster, model_dir, raw_format="ubj"):
+    """Writes the booster as ``xgboost-model`` in XGBoost's native UBJSON or JSON format.
+
+    The file name keeps the convention of the XGBoost container, whose loader falls back to
+    ``Booster.load_model`` for native files.
+    """
+    pathlib.Path(model_dir).mkdir(parents=True, exist_ok=True)
+    path = os.path.join(model_dir, MODEL_FILE)
+    with open(path, "wb") as f:
+        f.write(booster.save_raw(raw_format=raw_format))
+    return path
+
+
+def load_booster_bytes(raw, allow_pickle=False, source="buffer"):
+    """Loads a model from the bytes of a native model file.
+
+    Args:
+        raw: file contents
+        allow_pickle: also accept pickled boosters of models trained before the native format,
+            only for trusted artifacts
+        source: where the bytes come from, for the log
+
+    Returns:
+        the ``xgb.Booster``
+    """
+    # Imported here, so that the preprocessing image without XGBoost can read packaged members
+    import xgboost as xgb
+
+    booster = xgb.Booster()
+    try:
+        # From the raw buffer, the format is detected from its header rather than a file extension
+        booster.load_model(bytearray(raw))
+        return booster
+    except xgb.core.XGBoostError:
+        if not allow_pickle:
+            raise
+    logger.warning(f"{source} is not a native model file, loading it as a legacy pickle")
+    return pickle.loads(raw)
+
+
+def load_booster(path, allow_pickle=False):
+    """Loads a native model file, see ``load_booster_bytes``."""
+    with open(path, "rb") as f:
+        return load_booster_bytes(f.read(), allow_pickle, path)
+
+
+def open_artifact(artifact, boto3_session=None):
+    """Opens a local ``model.tar.gz`` or the body of an S3 object as a forward-only byte stream."""
+    if artifact.startswith("s3://"):
+        import boto3
+
+        bucket, _, key = artifact.replace("s3://", "", 1).partition("/")
+        s3_client = (boto3_session or boto3.Session()).client("s3")
+        return s3_client.get_object(Bucket=bucket, Key=key)["Body"]
+    return open(artifact, "rb")
+
+
+def read_member_bytes(artifact, name, boto3_session=None):
+    """Reads one member of a ``model.tar.gz`` into memory without touching disk.
+
+    The archive is decompressed as a stream (``r|*`` mode) while it is read from the file or the
+    S3 response, and reading stops at the member, so nothing is downloaded or extracted to a
+    temporary file and members after it are never fetched.
+
+    Args:
+        artifact: local path or S3 URI of the model.tar.gz
+        name: path of the member in the archive, e.g. ``MODEL_FILE`` or ``PREPROCESSOR_FILE``
+
+    Returns:
+        bytes of the member
+
+    Raises:
+        KeyError: the archive has no such member
+    """
+    stream = open_artifact(artifact, boto3_session)
+    try:
+        with tarfile.open(fileobj=stream, mode="r|*") as tar:
+            for member in tar:
+                # Archives made with `tar -C model_dir .` prefix every member with "./"
+                member_name = member.name[2:] if member.name.startswith("./") else member.name
+                if member.isfile() and member_name == name:
+                    return tar.extractfile(member).read()
+    finally:
+        stream.close()
+    raise KeyError(f"No {name} in {artifact}")
+
+
+def read_model_bytes(artifact, boto3_session=None):
+    """Reads the ``xgboost-model`` member of a ``model.tar.gz``, see ``read_member_bytes``."""
+    return read_member_bytes(artifact, MODEL_FILE, boto3_session)
+
+
+def artifact_key(artifact, boto3_session=None):
+    """Cache key of a model artifact: the ETag of an S3 object, the SHA-256 of a local file."""
+    if artifact.startswith("s3://"):
+        import boto3
+
+        bucket, _, key = artifact.replace("s3://", "", 1).partition("/")
+        s3_client = (boto3_session or boto3.Session()).client("s3")
+        etag = s3_client.head_object(Bucket=bucket, Key=key)["ETag"].strip('"')
+        return hashlib.sha256(f"{artifact}:{etag}".encode()).hexdigest()
+    digest = hashlib.sha256()
+    with open(artifact, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cached_model_file(artifact, cache_dir=None, boto3_session=None):
+    """Local path of the ``xgboost-model`` inside a ``model.tar.gz``, extracting it on a cache miss.
+
+    Args:
+        artifact: local path or S3 URI of the model.tar.gz
+        cache_dir: cache directory, ``MODEL_CACHE_DIR`` or a temporary directory by default
+
+    Returns:
+        path of the extracted model file
+    """
+    cache_dir = pathlib.Path(cache_dir or os.environ.get("MODEL_CACHE_DIR", DEFAULT_CACHE_DIR))
+    entry = cache_dir / artifact_key(artifact, boto3_session)
+    path = entry / MODEL_FILE
+    if path.exists():
+        logger.info(f"Model cache hit for {artifact}")
+        return path
+
+    logger.info(f"Model cache miss for {artifact}, extracting into {entry}")
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=cache_dir) as tmp:
+        staging = pathlib.Path(tmp) / "entry"
+        staging.mkdir()
+        # Only the model member is written, never paths chosen by the archive
+        (staging / MODEL_FILE).write_bytes(read_model_bytes(artifact, boto3_session))
+        try:
+            os.rename(staging, entry)
+        except OSError:
+            # Another process filled the entry first
+            if not path.exists():
+                raise
+    return path
+
+
+def load_model_artifact(artifact, cache_dir=None, boto3_session=None, allow_pickle=False, use_cache=True):
+    """Loads the booster of a ``model.tar.gz``.
+
+    Args:
+        use_cache: go through the extracted-model cache, which pays off when the same artifact
+            is loaded again; otherwise the model is streamed into memory without touching disk
+    """
+    if use_cache:
+        return load_booster(cached_model_file(artifact, cache_dir, boto3_session), allow_pickle)
+    return load_booster_bytes(read_model_bytes(artifact, boto3_session), allow_pickle, artifact)
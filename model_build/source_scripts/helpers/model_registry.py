@@ -0,0 +1,57 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# SPDX-License-Identifier: MIT-0
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Lookups in the SageMaker model registry, made when a pipeline step runs."""
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Written by preprocessing next to preprocessor.json: the approved model a warm start continues,
+# whose packaged preprocessor transformed the data
+WARM_START_FILE = "warm_start.json"
+
+
+def get_approved_model_data(model_package_group_name, boto3_session):
+    """S3 URI of the model.tar.gz of the latest approved package of a group.
+
+    Called by the steps themselves rather than when the pipeline definition is built, so every
+    execution uses the package approved at that time. Errors of the SageMaker API are raised, the
+    callers decide whether a missing lookup is fatal.
+
+    Args:
+        model_package_group_name: name of the model package group
+        boto3_session: boto3 session used for the SageMaker client
+
+    Returns:
+        S3 URI of the model.tar.gz, or None if no package is approved yet
+    """
+    sm_client = boto3_session.client("sagemaker")
+    summaries = sm_client.list_model_packages(
+        ModelPackageGroupName=model_package_group_name,
+        ModelApprovalStatus="Approved",
+        SortBy="CreationTime",
+        SortOrder="Descending",
+        MaxResults=1,
+    )["ModelPackageSummaryList"]
+    if not summaries:
+        logger.info(f"No approved model package in {model_package_group_name}")
+        return None
+    package_arn = summaries[0]["ModelPackageArn"]
+    package = sm_client.describe_model_package(ModelPackageName=package_arn)
+    model_data = package["InferenceSpecification"]["Containers"][0]["ModelDataUrl"]
+    logger.info(f"Latest approved model package: {package_arn} ({model_data})")
+    return model_data
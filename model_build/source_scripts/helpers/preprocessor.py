@@ -0,0 +1,112 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# SPDX-License-Identifier: MIT-0
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Fitted abalone feature transformer stored as plain JSON and applied with numpy only."""
+import json
+
+import numpy as np
+
+ARTIFACT_NAME = "preprocessor.json"
+MISSING_CATEGORY = "missing"
+
+
+def _to_float(values):
+    """Converts a column to float, non-numeric entries become NaN."""
+    try:
+        return np.asarray(values, dtype=float)
+    except (TypeError, ValueError):
+        converted = np.full(len(values), np.nan)
+        for index, value in enumerate(values):
+            try:
+                converted[index] = float(value)
+            except (TypeError, ValueError):
+                pass
+        return converted
+
+
+class Preprocessor:
+    """Median imputation and standard scaling of the numeric features, one-hot encoding of the
+    categorical feature with unknown categories ignored, as fitted by the preprocessing step.
+    """
+
+    def __init__(self, numeric_features, categorical_features, medians, means, scales, categories, label_column=None):
+        self.numeric_features = list(numeric_features)
+        self.categorical_features = list(categorical_features)
+        self.medians = np.asarray(medians, dtype=float)
+        self.means = np.asarray(means, dtype=float)
+        self.scales = np.asarray(scales, dtype=float)
+        self.categories = np.asarray([str(category) for category in categories])
+        self.label_column = label_column
+
+    @property
+    def output_columns(self):
+        """Names of the transformed feature columns."""
+        return self.numeric_features + [
+            f"{name}_{category}" for name in self.categorical_features for category in self.categories
+        ]
+
+    def transform(self, data):
+        """Transforms raw rows into the model's feature matrix.
+
+        Args:
+            data: DataFrame or mapping of column name to array-like holding the raw features
+
+        Returns:
+            float array of shape (rows, len(output_columns))
+        """
+        numeric = np.column_stack([_to_float(data[name]) for name in self.numeric_features])
+        numeric = np.where(np.isnan(numeric), self.medians, numeric)
+        numeric = (numeric - self.means) / self.scales
+        blocks = [numeric]
+        for name in self.categorical_features:
+            values = np.asarray(data[name], dtype=object)
+            missing = (values == None) | (values != values)  # noqa: E711, None and NaN
+            values = np.where(missing, MISSING_CATEGORY, values).astype(str)
+            blocks.append((values[:, None] == self.categories[None, :]).astype(float))
+        return np.concatenate(blocks, axis=1)
+
+    def to_dict(self):
+        return {
+            "numeric_features": self.numeric_features,
+            "categorical_features": self.categorical_features,
+            "medians": self.medians.tolist(),
+            "means": self.means.tolist(),
+            "scales": self.scales.tolist(),
+            "categories": self.categories.tolist(),
+            "label_column": self.label_column,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data["numeric_features"],
+            data["categorical_features"],
+            data["medians"],
+            data["means"],
+            data["scales"],
+            data["categories"],
+            data.get("label_column"),
+        )
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
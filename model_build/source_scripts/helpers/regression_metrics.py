@@ -0,0 +1,337 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# SPDX-License-Identifier: MIT-0
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Vectorized regression metrics with bootstrap confidence intervals computed over shared memory."""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+from streaming_stats import QuantileSketch, RunningMoments
+
+METRICS = ("mse", "rmse", "mae", "r2", "mape")
+RESIDUAL_QUANTILES = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+# Resamples drawn from one child seed, the unit of work handed to the pool
+BOOTSTRAP_TASK_RESAMPLES = 50
+# Elements of the resampled (resamples, rows) matrices held at once by a bootstrap worker
+BOOTSTRAP_BLOCK_ELEMENTS = 1 << 22
+
+# Labels and predictions attached by each bootstrap worker
+_shared = None
+
+
+def batch_metrics(y, predictions):
+    """Computes every metric along the last axis, for one sample or a matrix of resamples.
+
+    Args:
+        y: labels, shape (rows,) or (resamples, rows)
+        predictions: predictions of the same shape
+
+    Returns:
+        dict of metric name to float or array of shape (resamples,)
+    """
+    residuals = y - predictions
+    squared = residuals * residuals
+    mse = squared.mean(axis=-1)
+    total = ((y - y.mean(axis=-1, keepdims=True)) ** 2).sum(axis=-1)
+    nonzero = y != 0
+    # Rows with a zero label are left out of the percentage error
+    ape = np.abs(residuals, where=nonzero, out=np.zeros_like(residuals)) / np.where(nonzero, np.abs(y), 1.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return {
+            "mse": mse,
+            "rmse": np.sqrt(mse),
+            "mae": np.abs(residuals).mean(axis=-1),
+            "r2": 1.0 - squared.sum(axis=-1) / total,
+            "mape": ape.sum(axis=-1) / nonzero.sum(axis=-1),
+        }
+
+
+def segment_metrics(y, predictions, codes, names):
+    """Count, MSE, RMSE, MAE and mean residual per segment, accumulated in one pass with bincount.
+
+    Args:
+        codes: integer segment of each row, -1 for rows in no segment
+        names: segment names indexed by code
+    """
+    return _segment_report(_segment_sums(y - predictions, codes, len(names)), names)
+
+
+def _segment_sums(residuals, codes, size):
+    """Count, squared, absolute and plain residual sums per segment code, shape (4, size)."""
+    labelled = codes >= 0
+    codes, residuals = codes[labelled], residuals[labelled]
+    return np.stack(
+        [
+            np.bincount(codes, minlength=size).astype(np.float64),
+            np.bincount(codes, weights=residuals * residuals, minlength=size),
+            np.bincount(codes, weights=np.abs(residuals), minlength=size),
+            np.bincount(codes, weights=residuals, minlength=size),
+        ]
+    )
+
+
+def _segment_report(sums, names):
+    count, sse, sae, total = sums
+    segments = {}
+    for code, name in enumerate(names):
+        if count[code]:
+            segments[name] = {
+                "count": int(count[code]),
+                "mse": float(sse[code] / count[code]),
+                "rmse": float(np.sqrt(sse[code] / count[code])),
+                "mae": float(sae[code] / count[code]),
+                "mean_residual": float(total[code] / count[code]),
+            }
+    return segments
+
+
+def _attach(name, rows):
+    global _shared
+    # Workers share the resource tracker of the creating process, which unlinks the block
+    memory = shared_memory.SharedMemory(name=name)
+    _shared = (memory, np.ndarray((2, rows), dtype=np.float64, buffer=memory.buf))
+
+
+def _bootstrap(seed, resamples, data=None):
+    """Metrics of ``resamples`` bootstrap resamples of the shared (or given) labels and predictions."""
+    y, predictions = data if data is not None else _shared[1]
+    rows = len(y)
+    rng = np.random.default_rng(seed)
+    block = max(1, BOOTSTRAP_BLOCK_ELEMENTS // rows)
+    results = {name: [] for name in METRICS}
+    for start in range(0, resamples, block):
+        indices = rng.integers(0, rows, size=(min(block, resamples - start), rows))
+        for name, values in batch_metrics(y[indices], predictions[indices]).items():
+            results[name].append(values)
+    return {name: np.concatenate(values) for name, values in results.items()}
+
+
+def bootstrap_metrics(y, predictions, resamples=1000, confidence=0.95, seed=0, workers=None):
+    """Bootstrap standard errors and percentile confidence intervals of every metric.
+
+    The labels and predictions are copied once into a shared memory block that the pool workers
+    map, so only seeds and resample counts are pickled. Every task of ``BOOTSTRAP_TASK_RESAMPLES``
+    resamples draws from its own child of ``seed``, so results do not depend on the worker count.
+
+    Returns:
+        dict of metric name to ``{"standard_error", "lower", "upper", "confidence"}``
+    """
+    task = BOOTSTRAP_TASK_RESAMPLES
+    shares = [min(task, resamples - start) for start in range(0, resamples, task)]
+    seeds = np.random.SeedSequence(seed).spawn(len(shares))
+    workers = min(workers or os.cpu_count() or 1, len(shares))
+    rows = len(y)
+    if workers == 1:
+        data = (np.asarray(y, dtype=np.float64), np.asarray(predictions, dtype=np.float64))
+        parts = [_bootstrap(task_seed, share, data) for task_seed, share in zip(seeds, shares)]
+    else:
+        memory = shared_memory.SharedMemory(create=True, size=2 * rows * np.dtype(np.float64).itemsize)
+        try:
+            data = np.ndarray((2, rows), dtype=np.float64, buffer=memory.buf)
+            data[0], data[1] = y, predictions
+            with ProcessPoolExecutor(
+                max_workers=workers, initializer=_attach, initargs=(memory.name, rows)
+            ) as pool:
+                parts = list(pool.map(_bootstrap, seeds, shares))
+            del data
+        finally:
+            memory.close()
+            memory.unlink()
+    alpha = (1.0 - confidence) / 2
+    intervals = {}
+    for name in METRICS:
+        values = np.concatenate([part[name] for part in parts])
+        values = values[np.isfinite(values)]
+        lower, upper = np.quantile(values, [alpha, 1.0 - alpha])
+        intervals[name] = {
+            "standard_error": float(np.std(values, ddof=1)),
+            "lower": float(lower),
+            "upper": float(upper),
+            "confidence": confidence,
+        }
+    return intervals
+
+
+def regression_report(
+    y, predictions, codes=None, segment_names=None, resamples=0, confidence=0.95, seed=0, workers=None
+):
+    """Builds the ``regression_metrics``, ``residuals`` and ``segments`` sections of the evaluation report.
+
+    Every metric has a ``value``. ``standard_deviation`` is always the (population) standard
+    deviation of the residuals, kept on ``mse`` as before, in this report and in
+    ``StreamingRegressionMetrics.report``. When ``resamples`` is set, every metric also gets a
+    ``confidence_interval`` holding its bootstrap ``standard_error``.
+
+    Args:
+        y: labels
+        predictions: predictions
+        codes: optional segment code of every row, see ``segment_metrics``
+        segment_names: names of the segment codes
+        resamples: bootstrap resamples, 0 to skip the confidence intervals
+    """
+    y = np.asarray(y, dtype=np.float64)
+    predictions = np.asarray(predictions, dtype=np.float64)
+    residuals = y - predictions
+    values = batch_metrics(y, predictions)
+    intervals = bootstrap_metrics(y, predictions, resamples, confidence, seed, workers) if resamples else {}
+
+    metrics = {name: {"value": float(values[name])} for name in METRICS}
+    metrics["mse"]["standard_deviation"] = float(np.std(residuals))
+    for name, interval in intervals.items():
+        metrics[name]["confidence_interval"] = interval
+    report = {
+        "regression_metrics": metrics,
+        "residuals": {
+            "count": len(residuals),
+            "mean": float(residuals.mean()),
+            "standard_deviation": float(np.std(residuals)),
+            "quantiles": {
+                str(q): float(value) for q, value in zip(RESIDUAL_QUANTILES, np.quantile(residuals, RESIDUAL_QUANTILES))
+            },
+        },
+    }
+    if codes is not None:
+        report["segments"] = segment_metrics(y, predictions, np.asarray(codes), segment_names)
+    return report
+
+
+class StreamingRegressionMetrics:
+    """Regression metrics of a model accumulated batch by batch in constant memory.
+
+    The metrics, residual mean and standard deviation and segment metrics are exact, computed
+    from running moments and sums. The residual quantiles come from a ``QuantileSketch`` and are
+    approximate. No rows are kept, so there is no bootstrap.
+    """
+
+    def __init__(self, segment_names=None, sketch_size=512):
+        self.segment_names = segment_names
+        self.residuals = RunningMoments()
+        self.labels = RunningMoments()
+        self.absolute_error = 0.0
+        self.percentage_error = 0.0
+        self.nonzero_labels = 0
+        self.sketch = QuantileSketch(sketch_size)
+        self.segment_sums = np.zeros((4, len(segment_names))) if segment_names else None
+
+    def update(self, y, predictions, codes=None):
+        """Adds a batch of labels, predictions and optional segment codes."""
+        y = np.asarray(y, dtype=np.float64)
+        residuals = y - np.asarray(predictions, dtype=np.float64)
+        self.residuals.update(residuals)
+        self.labels.update(y)
+        self.absolute_error += float(np.abs(residuals).sum())
+        nonzero = y != 0
+        self.percentage_error += float((np.abs(residuals[nonzero]) / np.abs(y[nonzero])).sum())
+        self.nonzero_labels += int(nonzero.sum())
+        self.sketch.update(residuals)
+        if self.segment_sums is not None and codes is not None:
+            self.segment_sums += _segment_sums(residuals, np.asarray(codes), len(self.segment_names))
+
+    def metrics(self):
+        """Every metric of ``METRICS`` as a float, like ``batch_metrics`` on all the rows."""
+        count = self.residuals.count
+        mse = self.residuals.m2 / count + self.residuals.mean ** 2
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return {
+                "mse": mse,
+                "rmse": float(np.sqrt(mse)),
+                "mae": self.absolute_error / count,
+                "r2": float(1.0 - np.float64(mse * count) / self.labels.m2),
+                "mape": float(np.float64(self.percentage_error) / self.nonzero_labels),
+            }
+
+    def report(self):
+        """The sections of ``regression_report`` without bootstrap, with approximate quantiles."""
+        values = self.metrics()
+        metrics = {name: {"value": float(values[name])} for name in METRICS}
+        std = float(np.sqrt(self.residuals.variance))
+        metrics["mse"]["standard_deviation"] = std
+        report = {
+            "regression_metrics": metrics,
+            "residuals": {
+                "count": self.residuals.count,
+                "mean": self.residuals.mean,
+                "standard_deviation": std,
+                "quantiles": {str(q): self.sketch.quantile(q) for q in RESIDUAL_QUANTILES},
+                "approximate_quantiles": True,
+            },
+        }
+        if self.segment_sums is not None:
+            report["segments"] = _segment_report(self.segment_sums, self.segment_names)
+        return report
+
+
+def paired_comparison(y, challenger, champion, alpha=0.05):
+    """Compares two models scored on the same rows.
+
+    The per-row squared errors are paired, and a one-sided paired t-test checks whether the
+    challenger's are lower on average than the champion's.
+
+    Args:
+        y: labels
+        challenger: predictions of the new model
+        champion: predictions of the current model on the same rows
+        alpha: significance level of the test
+
+    Returns:
+        dict with the champion metrics, the challenger minus champion ``deltas`` of every metric,
+        the test statistic and p-value, ``significant`` and ``promote`` (1 when significant)
+    """
+    y = np.asarray(y, dtype=np.float64)
+    challenger = np.asarray(challenger, dtype=np.float64)
+    champion = np.asarray(champion, dtype=np.float64)
+    improvement = RunningMoments()
+    improvement.update(squared_error_improvement(y, challenger, champion))
+    return compare_metrics(batch_metrics(y, challenger), batch_metrics(y, champion), improvement, alpha)
+
+
+def squared_error_improvement(y, challenger, champion):
+    """Per-row champion minus challenger squared error, positive where the challenger is closer."""
+    return (y - champion) ** 2 - (y - challenger) ** 2
+
+
+def compare_metrics(challenger_metrics, champion_metrics, improvement, alpha=0.05):
+    """``paired_comparison`` from the metrics of both models and the moments of the improvement.
+
+    Args:
+        improvement: ``RunningMoments`` of ``squared_error_improvement`` over the rows, which the
+            streaming evaluation accumulates batch by batch
+    """
+    from scipy import stats
+
+    if improvement.minimum == improvement.maximum:
+        # No variance: identical models, or a constant shift in the errors
+        statistic, p_value = float("nan"), 0.0 if improvement.mean > 0 else 1.0
+    else:
+        count = improvement.count
+        statistic = improvement.mean / np.sqrt(improvement.m2 / (count - 1) / count)
+        p_value = stats.t.sf(statistic, count - 1)
+    significant = bool(p_value < alpha)
+    return {
+        "champion": {name: float(champion_metrics[name]) for name in METRICS},
+        "deltas": {name: float(challenger_metrics[name] - champion_metrics[name]) for name in METRICS},
+        "paired_test": {
+            "test": "one-sided paired t-test on squared errors",
+            "mean_improvement": float(improvement.mean),
+            "statistic": float(statistic),
+            "p_value": float(p_value),
+            "alpha": alpha,
+        },
+        "significant": significant,
+        "promote": int(significant),
+    }
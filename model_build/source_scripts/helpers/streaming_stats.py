@@ -0,0 +1,152 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# SPDX-License-Identifier: MIT-0
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Mergeable single-pass statistics used by the streaming preprocessing mode."""
+import numpy as np
+
+
+class QuantileSketch:
+    """Approximate quantile sketch with bounded memory.
+
+    Values are buffered in levels where an item at level ``i`` stands for ``2**i``
+    original values. When a level grows past ``k`` items it is sorted and every other
+    item is promoted to the next level, so memory grows with ``log(n)`` rather than ``n``.
+    Two sketches can be merged level by level.
+    """
+
+    def __init__(self, k=512):
+        self.k = k
+        self.count = 0
+        self.levels = [np.empty(0)]
+        self._compactions = 0
+
+    def update(self, values):
+        """Adds the non-null values of an array to the sketch."""
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        self.count += len(values)
+        self.levels[0] = np.concatenate((self.levels[0], values))
+        self._compress()
+
+    def merge(self, other):
+        """Folds another sketch into this one."""
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate((self.levels[level], items))
+        self.count += other.count
+        self._compress()
+        return self
+
+    def quantile(self, q):
+        """Returns the approximate ``q`` quantile, or NaN if the sketch is empty."""
+        if self.count == 0:
+            return float("nan")
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(buf), 2 ** level) for level, buf in enumerate(self.levels)])
+        order = np.argsort(items, kind="mergesort")
+        cumulative = np.cumsum(weights[order])
+        index = np.searchsorted(cumulative, q * cumulative[-1], side="left")
+        return float(items[order][min(index, len(items) - 1)])
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            buf = self.levels[level]
+            if len(buf) > self.k:
+                buf = np.sort(buf)
+                keep = buf[len(buf) - len(buf) % 2:]
+                pairs = buf[:len(buf) - len(buf) % 2]
+                # Alternate the offset so that promotions are not biased towards either end.
+                promoted = pairs[self._compactions % 2::2]
+                self._compactions += 1
+                self.levels[level] = keep
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                self.levels[level + 1] = np.concatenate((self.levels[level + 1], promoted))
+            level += 1
+
+    def to_dict(self):
+        return {"k": self.k, "count": self.count, "levels": [buf.tolist() for buf in self.levels]}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(k=data["k"])
+        sketch.count = data["count"]
+        sketch.levels = [np.asarray(buf, dtype=float) for buf in data["levels"]] or [np.empty(0)]
+        return sketch
+
+
+class RunningMoments:
+    """Count, mean, sum of squared deviations and range kept with Welford/Chan updates."""
+
+    def __init__(self, count=0, mean=0.0, m2=0.0, minimum=float("inf"), maximum=float("-inf")):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def update(self, values):
+        """Adds the non-null values of an array to the running moments."""
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        mean = float(values.mean())
+        self.merge(
+            RunningMoments(
+                len(values), mean, float(((values - mean) ** 2).sum()), float(values.min()), float(values.max())
+            )
+        )
+
+    def merge(self, other):
+        """Combines two sets of moments with Chan's parallel update."""
+        if other.count == 0:
+            return self
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / total
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / total
+        self.count = total
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        return self
+
+    @property
+    def variance(self):
+        """Population variance, matching ``StandardScaler``."""
+        return self.m2 / self.count if self.count else 0.0
+
+    @property
+    def sample_std(self):
+        """Standard deviation with one degree of freedom, matching ``DataFrame.describe``."""
+        return float(np.sqrt(self.m2 / (self.count - 1))) if self.count > 1 else float("nan")
+
+    def to_dict(self):
+        data = {"count": self.count, "mean": self.mean, "m2": self.m2}
+        if self.count:
+            data.update(minimum=self.minimum, maximum=self.maximum)
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data["count"], data["mean"], data["m2"], data.get("minimum", float("inf")), data.get("maximum", float("-inf"))
+        )
@@ -0,0 +1,54 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# SPDX-License-Identifier: MIT-0
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import numpy as np
+import pytest
+import xgboost as xgb
+
+from compiled_predictor import CompiledForest
+
+
+def train(objective="reg:squarederror", rounds=20):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(500, 6))
+    X[rng.random(X.shape) < 0.1] = np.nan
+    y = np.nan_to_num(X[:, 0]) * 3 + np.nan_to_num(X[:, 1]) ** 2 + rng.normal(size=500)
+    params = {"objective": objective, "max_depth": 4, "eta": 0.3, "nthread": 1}
+    return xgb.train(params, xgb.DMatrix(X, label=y), num_boost_round=rounds)
+
+
+def test_predictions_match_the_booster_including_missing_values():
+    booster = train()
+    forest = CompiledForest.from_booster(booster)
+    X = np.random.default_rng(1).normal(size=(300, 6))
+    # Missing values must follow the default direction of every split
+    X[np.random.default_rng(2).random(X.shape) < 0.2] = np.nan
+    assert forest.num_trees == booster.num_boosted_rounds()
+    assert np.allclose(forest.predict(X), booster.predict(xgb.DMatrix(X)), atol=1e-5)
+
+
+def test_save_and_load_keep_the_predictions(tmp_path):
+    forest = CompiledForest.from_booster(train())
+    X = np.random.default_rng(3).normal(size=(10, 6))
+    path = tmp_path / "compiled-model.npz"
+    forest.save(path)
+    assert np.allclose(CompiledForest.load(path).predict(X), forest.predict(X))
+
+
+def test_non_identity_objectives_are_rejected():
+    with pytest.raises(ValueError):
+        CompiledForest.from_booster(train("count:poisson", rounds=2))
@@ -0,0 +1,94 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# SPDX-License-Identifier: MIT-0
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import io
+import pickle
+import tarfile
+
+import numpy as np
+import pytest
+import xgboost as xgb
+
+from model_io import (
+    MODEL_FILE,
+    PREPROCESSOR_FILE,
+    cached_model_file,
+    load_model_artifact,
+    read_member_bytes,
+    read_model_bytes,
+    save_booster,
+)
+
+
+@pytest.fixture(scope="module")
+def booster():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(200, 4))
+    return xgb.train({"max_depth": 3, "nthread": 1}, xgb.DMatrix(X, label=X[:, 0] * 2), num_boost_round=5)
+
+
+def make_artifact(path, members):
+    with tarfile.open(path, "w:gz") as tar:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return str(path)
+
+
+def test_native_model_round_trip(tmp_path, booster):
+    model_file = save_booster(booster, tmp_path / "model")
+    artifact = make_artifact(
+        tmp_path / "model.tar.gz", {PREPROCESSOR_FILE: b"{}", MODEL_FILE: open(model_file, "rb").read()}
+    )
+    X = xgb.DMatrix(np.random.default_rng(1).normal(size=(20, 4)))
+    for loaded in [
+        load_model_artifact(artifact, use_cache=False),
+        load_model_artifact(artifact, cache_dir=tmp_path / "cache"),
+    ]:
+        assert np.allclose(loaded.predict(X), booster.predict(X))
+    assert read_member_bytes(artifact, PREPROCESSOR_FILE) == b"{}"
+
+
+def test_cache_reuses_the_extracted_model(tmp_path, booster):
+    artifact = make_artifact(tmp_path / "model.tar.gz", {MODEL_FILE: bytes(booster.save_raw("ubj"))})
+    first = cached_model_file(artifact, tmp_path / "cache")
+    assert cached_model_file(artifact, tmp_path / "cache") == first
+    assert len(list((tmp_path / "cache").iterdir())) == 1
+
+
+def test_missing_member_raises_key_error(tmp_path, booster):
+    artifact = make_artifact(tmp_path / "model.tar.gz", {MODEL_FILE: bytes(booster.save_raw("ubj"))})
+    with pytest.raises(KeyError):
+        read_member_bytes(artifact, PREPROCESSOR_FILE)
+
+
+def test_member_names_only_lose_a_leading_dot_slash(tmp_path, booster):
+    artifact = make_artifact(
+        tmp_path / "model.tar.gz", {"./" + MODEL_FILE: bytes(booster.save_raw("ubj")), ".hidden/model": b"other"}
+    )
+    assert read_model_bytes(artifact) == bytes(booster.save_raw("ubj"))
+    assert read_member_bytes(artifact, ".hidden/model") == b"other"
+    with pytest.raises(KeyError):
+        read_member_bytes(artifact, "hidden/model")
+
+
+def test_pickled_models_need_allow_pickle(tmp_path, booster):
+    artifact = make_artifact(tmp_path / "model.tar.gz", {MODEL_FILE: pickle.dumps(booster)})
+    with pytest.raises(xgb.core.XGBoostError):
+        load_model_artifact(artifact, use_cache=False)
+    assert load_model_artifact(artifact, use_cache=False, allow_pickle=True).num_boosted_rounds() == 5
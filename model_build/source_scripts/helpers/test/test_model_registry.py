@@ -0,0 +1,49 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# SPDX-License-Identifier: MIT-0
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import types
+
+from model_registry import get_approved_model_data
+
+
+class Client:
+    def __init__(self, packages):
+        self.packages = packages
+        self.requests = []
+
+    def list_model_packages(self, **request):
+        self.requests.append(request)
+        return {"ModelPackageSummaryList": [{"ModelPackageArn": arn} for arn in self.packages][: request["MaxResults"]]}
+
+    def describe_model_package(self, ModelPackageName):
+        model_data = self.packages[ModelPackageName]
+        return {"InferenceSpecification": {"Containers": [{"ModelDataUrl": model_data}]}}
+
+
+def session(client):
+    return types.SimpleNamespace(client=lambda service: client)
+
+
+def test_latest_approved_package_is_returned():
+    client = Client({"arn:package/2": "s3://bucket/2/model.tar.gz", "arn:package/1": "s3://bucket/1/model.tar.gz"})
+    assert get_approved_model_data("AbalonePackageGroup", session(client)) == "s3://bucket/2/model.tar.gz"
+    assert client.requests[0]["ModelApprovalStatus"] == "Approved"
+    assert client.requests[0]["SortOrder"] == "Descending"
+
+
+def test_no_approved_package():
+    assert get_approved_model_data("AbalonePackageGroup", session(Client({}))) is None
@@ -0,0 +1,62 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# SPDX-License-Identifier: MIT-0
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import json
+
+import numpy as np
+import pandas as pd
+
+from preprocessor import Preprocessor
+
+
+def make_preprocessor():
+    return Preprocessor(
+        ["length", "diameter"],
+        ["sex"],
+        medians=[0.5, 0.4],
+        means=[0.52, 0.41],
+        scales=[0.12, 0.1],
+        categories=["F", "I", "M"],
+        label_column="rings",
+    )
+
+
+def test_round_trip_through_json(tmp_path):
+    preprocessor = make_preprocessor()
+    preprocessor.save(tmp_path / "preprocessor.json")
+    loaded = Preprocessor.load(tmp_path / "preprocessor.json")
+    assert loaded.to_dict() == preprocessor.to_dict()
+    assert json.loads(json.dumps(loaded.to_dict())) == preprocessor.to_dict()
+    assert loaded.output_columns == ["length", "diameter", "sex_F", "sex_I", "sex_M"]
+
+
+def test_transform_imputes_scales_and_one_hot_encodes():
+    raw = pd.DataFrame({"length": [0.64, None], "diameter": ["0.5", "bad"], "sex": ["M", "X"]})
+    features = make_preprocessor().transform(raw)
+    expected = np.array(
+        [
+            [(0.64 - 0.52) / 0.12, (0.5 - 0.41) / 0.1, 0.0, 0.0, 1.0],
+            # Missing and non-numeric values take the median, unknown categories no column
+            [(0.5 - 0.52) / 0.12, (0.4 - 0.41) / 0.1, 0.0, 0.0, 0.0],
+        ]
+    )
+    assert np.allclose(features, expected)
+
+
+def test_transform_accepts_column_arrays():
+    columns = {"length": np.array([0.52]), "diameter": np.array([0.41]), "sex": np.array(["F"])}
+    assert np.allclose(make_preprocessor().transform(columns), [[0.0, 0.0, 1.0, 0.0, 0.0]])
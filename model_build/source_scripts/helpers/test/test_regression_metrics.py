@@ -0,0 +1,102 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# SPDX-License-Identifier: MIT-0
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import numpy as np
+from scipy import stats
+
+from regression_metrics import (
+    METRICS,
+    StreamingRegressionMetrics,
+    batch_metrics,
+    bootstrap_metrics,
+    paired_comparison,
+    regression_report,
+)
+
+
+def sample(rows=2_000, seed=0):
+    rng = np.random.default_rng(seed)
+    y = rng.integers(1, 25, size=rows).astype(float)
+    return y, y + rng.normal(0.0, 2.0, size=rows), rng.integers(-1, 3, size=rows)
+
+
+def test_batch_metrics_of_resamples_match_single_samples():
+    y, predictions, _ = sample()
+    matrix = batch_metrics(np.stack([y, y[::-1]]), np.stack([predictions, predictions[::-1]]))
+    single = batch_metrics(y, predictions)
+    for name in METRICS:
+        assert np.allclose(matrix[name], single[name])
+    assert np.isclose(single["mse"], np.mean((y - predictions) ** 2))
+
+
+def test_streaming_metrics_match_the_in_memory_report():
+    y, predictions, codes = sample()
+    names = ["F", "I", "M"]
+    streaming = StreamingRegressionMetrics(names)
+    for chunk in np.array_split(np.arange(len(y)), 9):
+        streaming.update(y[chunk], predictions[chunk], codes[chunk])
+    expected = regression_report(y, predictions, codes, names)
+    report = streaming.report()
+    for name in METRICS:
+        assert np.isclose(report["regression_metrics"][name]["value"], expected["regression_metrics"][name]["value"])
+    assert np.isclose(report["residuals"]["standard_deviation"], expected["residuals"]["standard_deviation"])
+    assert np.isclose(
+        report["regression_metrics"]["mse"]["standard_deviation"], report["residuals"]["standard_deviation"]
+    )
+    assert report["segments"].keys() == expected["segments"].keys()
+    for name, segment in expected["segments"].items():
+        assert report["segments"][name]["count"] == segment["count"]
+        assert np.isclose(report["segments"][name]["mse"], segment["mse"])
+    assert abs(report["residuals"]["quantiles"]["0.5"] - expected["residuals"]["quantiles"]["0.5"]) < 0.1
+
+
+def test_standard_deviation_means_the_same_with_and_without_bootstrap():
+    y, predictions, _ = sample(rows=300)
+    streaming = StreamingRegressionMetrics()
+    streaming.update(y, predictions)
+    report = streaming.report()["regression_metrics"]
+    expected = regression_report(y, predictions, resamples=100, workers=1)["regression_metrics"]
+    for name in METRICS:
+        assert report[name].keys() == expected[name].keys() - {"confidence_interval"}
+    assert np.isclose(report["mse"]["standard_deviation"], expected["mse"]["standard_deviation"])
+    assert np.isclose(expected["mse"]["standard_deviation"], np.std(y - predictions))
+
+
+def test_bootstrap_does_not_depend_on_the_worker_count():
+    y, predictions, _ = sample(rows=300)
+    one = bootstrap_metrics(y, predictions, resamples=120, seed=7, workers=1)
+    two = bootstrap_metrics(y, predictions, resamples=120, seed=7, workers=2)
+    for name in METRICS:
+        assert np.isclose(one[name]["lower"], two[name]["lower"])
+        assert np.isclose(one[name]["upper"], two[name]["upper"])
+
+
+def test_paired_comparison_matches_a_paired_t_test():
+    y, challenger, _ = sample(seed=1)
+    champion = y + np.random.default_rng(2).normal(0.0, 2.2, size=len(y))
+    comparison = paired_comparison(y, challenger, champion, alpha=0.05)
+    expected = stats.ttest_1samp((y - champion) ** 2 - (y - challenger) ** 2, 0.0, alternative="greater")
+    assert np.isclose(comparison["paired_test"]["p_value"], expected.pvalue)
+    assert comparison["promote"] == int(expected.pvalue < 0.05)
+    assert np.isclose(comparison["deltas"]["mse"], np.mean((y - challenger) ** 2) - np.mean((y - champion) ** 2))
+
+
+def test_paired_comparison_of_identical_models_does_not_promote():
+    y, predictions, _ = sample()
+    comparison = paired_comparison(y, predictions, predictions)
+    assert comparison["promote"] == 0
+    assert comparison["paired_test"]["p_value"] == 1.0
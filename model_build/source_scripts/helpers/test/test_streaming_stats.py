@@ -0,0 +1,67 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# SPDX-License-Identifier: MIT-0
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import numpy as np
+
+from streaming_stats import QuantileSketch, RunningMoments
+
+
+def test_running_moments_match_numpy_over_chunks():
+    values = np.random.default_rng(0).normal(3.0, 2.0, size=10_000)
+    values[::97] = np.nan
+    moments = RunningMoments()
+    for chunk in np.array_split(values, 7):
+        moments.update(chunk)
+    present = values[~np.isnan(values)]
+    assert moments.count == len(present)
+    assert np.isclose(moments.mean, present.mean())
+    assert np.isclose(moments.variance, present.var())
+    assert np.isclose(moments.sample_std, present.std(ddof=1))
+    assert (moments.minimum, moments.maximum) == (present.min(), present.max())
+
+
+def test_running_moments_merge_and_round_trip():
+    values = np.random.default_rng(1).exponential(size=1_000)
+    left, right = RunningMoments(), RunningMoments()
+    left.update(values[:300])
+    right.update(values[300:])
+    merged = RunningMoments.from_dict(left.to_dict()).merge(right)
+    assert np.isclose(merged.mean, values.mean())
+    assert np.isclose(merged.variance, values.var())
+
+
+def test_quantile_sketch_is_close_and_bounded():
+    values = np.random.default_rng(2).uniform(size=100_000)
+    sketch = QuantileSketch(k=256)
+    for chunk in np.array_split(values, 50):
+        sketch.update(chunk)
+    for q in [0.01, 0.25, 0.5, 0.75, 0.99]:
+        assert abs(sketch.quantile(q) - np.quantile(values, q)) < 0.02
+    # Memory grows with the number of levels, not with the values
+    assert sum(len(level) for level in sketch.levels) <= 256 * len(sketch.levels)
+    assert len(sketch.levels) < 10
+
+
+def test_quantile_sketch_merge_matches_single_sketch():
+    values = np.random.default_rng(3).normal(size=20_000)
+    whole, left, right = QuantileSketch(), QuantileSketch(), QuantileSketch()
+    whole.update(values)
+    left.update(values[:5_000])
+    right.update(values[5_000:])
+    merged = QuantileSketch.from_dict(left.to_dict()).merge(right)
+    assert merged.count == whole.count
+    assert abs(merged.quantile(0.5) - whole.quantile(0.5)) < 0.05
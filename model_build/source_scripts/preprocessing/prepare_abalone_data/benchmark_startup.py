@@ -0,0 +1,94 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# SPDX-License-Identifier: MIT-0
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Compares preprocessing start-up time with a runtime pip install against the prebuilt bundle.
+
+Run it inside the processing image (or an equivalent environment), for example::
+
+    python benchmark_startup.py --requirements-dir requirements
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+IMPORT_SNIPPET = "import awswrangler, pymysql, pandas"
+
+
+def timed(command, env=None):
+    """Runs a command and returns its wall-clock time in seconds."""
+    start = time.perf_counter()
+    subprocess.check_call(command, env=env, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def import_with_path(path):
+    """Times a fresh interpreter importing the dependencies from ``path``."""
+    env = dict(os.environ, PYTHONPATH=path)
+    return timed([sys.executable, "-c", IMPORT_SNIPPET], env=env)
+
+
+def install_like_bundle(requirements, target):
+    """Installs the requirements into ``target`` the way the job used to at start-up.
+
+    As in ``build_dependency_bundle.sh``, everything but the pinned pandas is resolved first
+    and pandas is then swapped in without its dependencies, since awswrangler 2.16.1 declares a
+    newer one.
+    """
+    with open(requirements) as f:
+        lines = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    pandas_pins = [line for line in lines if line.startswith("pandas")]
+    others = os.path.join(target, "requirements-without-pandas.txt")
+    with open(others, "w") as f:
+        f.write("\n".join(line for line in lines if line not in pandas_pins))
+    pip = [sys.executable, "-m", "pip", "install", "--quiet", "--target", target]
+    seconds = timed(pip + ["-r", others])
+    if pandas_pins:
+        seconds += timed(pip + ["--upgrade", "--no-deps", *pandas_pins])
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requirements-dir", type=str, default="requirements")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    requirements = os.path.join(args.requirements_dir, "requirements.txt")
+    bundle_dir = os.path.join(args.requirements_dir, "site-packages")
+    if not os.path.isdir(bundle_dir):
+        sys.exit(f"No bundle found at {bundle_dir}, run build_dependency_bundle.sh first")
+
+    results = {"before": [], "after": []}
+    for _ in range(args.repeat):
+        # Before: what every job used to do at start-up, install then import
+        with tempfile.TemporaryDirectory() as target:
+            install = install_like_bundle(requirements, target)
+            results["before"].append(install + import_with_path(target))
+        # After: import straight from the mounted bundle
+        results["after"].append(import_with_path(bundle_dir))
+
+    summary = {name: {"min_s": min(times), "mean_s": sum(times) / len(times)} for name, times in results.items()}
+    summary["speedup"] = summary["before"]["mean_s"] / summary["after"]["mean_s"]
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+#!/bin/bash
+# build_dependency_bundle.sh
+#
+# Builds a site-packages bundle of the preprocessing dependencies for the SageMaker scikit-learn
+# container, so that the processing job can import them without running pip at start-up.
+# The bundle is written next to requirements.txt and uploaded with it to the
+# requirements-preprocess/input/dependencies/ prefix that the pipeline mounts.
+
+set -euo pipefail
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+REQUIREMENTS_DIR="${SCRIPT_DIR}/requirements"
+TARGET="${REQUIREMENTS_DIR}/site-packages"
+# Must match the python version of the sklearn 1.0-1 processing image
+PYTHON_VERSION="${PYTHON_VERSION:-3.8}"
+PLATFORM="${PLATFORM:-manylinux2014_x86_64}"
+
+WHEELHOUSE="$(mktemp -d)"
+trap 'rm -rf "${WHEELHOUSE}"' EXIT
+
+PLATFORM_ARGS=(
+  --platform "${PLATFORM}"
+  --python-version "${PYTHON_VERSION}"
+  --implementation cp
+  --only-binary=:all:
+  --quiet
+)
+DOWNLOAD_ARGS=(--dest "${WHEELHOUSE}" "${PLATFORM_ARGS[@]}")
+
+# awswrangler 2.16.1 declares a newer pandas than the one the container needs, so resolve
+# everything else first and then swap in the pinned pandas without its dependencies.
+grep -v '^pandas' "${REQUIREMENTS_DIR}/requirements.txt" > "${WHEELHOUSE}/requirements.txt"
+python3 -m pip download "${DOWNLOAD_ARGS[@]}" --requirement "${WHEELHOUSE}/requirements.txt"
+
+PANDAS_PIN="$(grep '^pandas' "${REQUIREMENTS_DIR}/requirements.txt" || true)"
+if [ -n "${PANDAS_PIN}" ]; then
+  rm -f "${WHEELHOUSE}"/pandas-*.whl
+  python3 -m pip download "${DOWNLOAD_ARGS[@]}" --no-deps "${PANDAS_PIN}"
+fi
+
+# numpy stays with the container so that its scikit-learn build keeps a matching ABI
+rm -f "${WHEELHOUSE}"/numpy-*.whl
+
+# The wheels are already resolved for the target python, install them as they are
+rm -rf "${TARGET}"
+python3 -m pip install \
+  "${PLATFORM_ARGS[@]}" \
+  --target "${TARGET}" \
+  --no-index \
+  --no-deps \
+  --ignore-requires-python \
+  --no-compile \
+  "${WHEELHOUSE}"/*.whl
+rm -rf "${TARGET}"/bin
+
+echo "Built dependency bundle in ${TARGET} ($(du -sh "${TARGET}" | cut -f1))"
@@ -17,39 +17,48 @@
 
 """Feature engineers the abalone dataset using AWS Data Wrangler for Glue integration."""
 import argparse
+import hashlib
+import json
 import logging
+import operator
 import os
 import pathlib
+import re
 import sys
-import subprocess
-import boto3
-import numpy as np
-import pandas as pd
+import time
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 logger.addHandler(logging.StreamHandler())
 
-# Install dependencies with specific order to handle version conflicts
-logger.info("Installing dependencies with specific order")
-try:
-    # First install AWS Data Wrangler and PyMySQL
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "awswrangler==2.16.1", "pymysql"])
-    logger.info("Successfully installed AWS Data Wrangler and PyMySQL")
-    
-    # Then force reinstall pandas 1.1.3 to ensure compatibility with SageMaker container
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "pandas==1.1.3", "--force-reinstall"])
-    logger.info("Successfully downgraded pandas to 1.1.3")
-except subprocess.CalledProcessError as e:
-    logger.error(f"Error installing dependencies: {e}")
+
+# Dependencies are prebuilt into a site-packages bundle (see build_dependency_bundle.sh) that is
+# mounted with the requirements input, so nothing has to be downloaded when the job starts.
+requirements_dir = os.environ.get("REQUIREMENTS_DIR", "/opt/ml/processing/input/requirements")
+bundle_dir = os.path.join(requirements_dir, "site-packages")
+if not os.path.isdir(bundle_dir):
+    logger.error(
+        f"No dependency bundle found at {bundle_dir}. Build it with build_dependency_bundle.sh and upload it "
+        "with requirements.txt to the requirements-preprocess/input/dependencies/ prefix."
+    )
     sys.exit(1)
+sys.path.insert(0, bundle_dir)
+logger.info(f"Using prebuilt dependency bundle: {bundle_dir}")
+
+import boto3
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
 
 # Set up region and boto3 session before importing AWS Data Wrangler
 region = os.environ.get('AWS_REGION', 'us-east-1')
 boto3_session = boto3.Session(region_name=region)
 logger.info(f"Created boto3 session with region: {region}")
 
-# Import AWS Data Wrangler after installing dependencies
+# Import AWS Data Wrangler from the dependency bundle
 try:
     import awswrangler as wr
     # Set the region explicitly for AWS Data Wrangler
@@ -60,6 +69,14 @@ except ImportError as e:
     logger.error(f"Error importing AWS Data Wrangler: {e}")
     sys.exit(1)
 
+# Shared helpers are mounted as a processing input; fall back to the repo layout for local runs
+sys.path.append(os.environ.get("HELPERS_DIR", "/opt/ml/processing/input/helpers"))
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[2] / "helpers"))
+from model_io import PREPROCESSOR_FILE, read_member_bytes
+from model_registry import WARM_START_FILE, get_approved_model_data
+from preprocessor import ARTIFACT_NAME, Preprocessor
+from streaming_stats import QuantileSketch, RunningMoments
+
 from sklearn.compose import ColumnTransformer
 from sklearn.impute import SimpleImputer
 from sklearn.pipeline import Pipeline
@@ -77,67 +94,339 @@ feature_columns_names = [
     "shell_weight",
 ]
 label_column = "rings"
+numeric_features = [name for name in feature_columns_names if name != "sex"]
+categorical_features = ["sex"]
+split_names = ["train", "validation", "test"]
+# Cumulative fractions of rows in the train and validation splits, the remainder is test
+split_boundaries = [0.7, 0.85]
+write_batch_rows = 100000
+default_chunk_size = 100000
+profile_quantiles = [0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99]
+output_formats = ["csv", "parquet"]
+filter_pattern = re.compile(r"^\s*(\w+)\s*(>=|<=|!=|=|>|<)\s*(.+?)\s*$")
+filter_operators = {
+    ">=": operator.ge,
+    "<=": operator.le,
+    "!=": operator.ne,
+    "=": operator.eq,
+    ">": operator.gt,
+    "<": operator.lt,
+}
 
-if __name__ == "__main__":
-    logger.info("Starting preprocessing with AWS Data Wrangler")
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--database-name", type=str, required=True)
-    parser.add_argument("--table-name", type=str, required=True)
-    args = parser.parse_args()
 
-    base_dir = "/opt/ml/processing"
-    pathlib.Path(f"{base_dir}/train").mkdir(parents=True, exist_ok=True)
-    pathlib.Path(f"{base_dir}/validation").mkdir(parents=True, exist_ok=True)
-    pathlib.Path(f"{base_dir}/test").mkdir(parents=True, exist_ok=True)
-    
-    # Try to read from Glue Data Catalog
+def select_features(columns=None):
+    """Restricts the features read and transformed to a subset of ``feature_columns_names``.
+
+    Args:
+        columns: names of the features to keep, None keeps all of them
+
+    Returns:
+        (feature, numeric feature, categorical feature) names in table order
+    """
+    columns = feature_columns_names if columns is None else columns
+    unknown = set(columns) - set(feature_columns_names)
+    if unknown:
+        raise ValueError(f"Unknown feature columns: {sorted(unknown)}")
+    features = [name for name in feature_columns_names if name in columns]
+    numeric = [name for name in features if name in numeric_features]
+    categorical = [name for name in features if name in categorical_features]
+    return features, numeric, categorical
+
+
+def normalise_columns(df, features=None):
+    """Assigns the abalone column names to data that was read without headers.
+
+    The names of all the raw columns are assigned first, then only the selected ``features``
+    and the label are kept.
+    """
+    if df.columns[0] in ['M', 'F', 'I']:
+        logger.info("Data has no headers, assigning column names")
+        df.columns = feature_columns_names + [label_column]
+    features, _, _ = select_features(features)
+    return df[features + [label_column]]
+
+
+def save_preprocessor(preprocessor, base_dir):
+    """Writes the fitted transformer to the ``preprocessor`` output."""
+    path = f"{base_dir}/preprocessor/{ARTIFACT_NAME}"
+    preprocessor.save(path)
+    logger.info(f"Saved fitted preprocessor to {path}")
+
+
+def load_warm_start_preprocessor(model_package_group_name):
+    """Gets the preprocessor packaged with the latest approved model, for warm-started training.
+
+    The approved trees split on features scaled by that preprocessor, so a warm-started run
+    transforms its data with it rather than fitting a new one. The package is looked up when the
+    job runs, so every execution continues the model approved at that time.
+
+    Returns:
+        (``Preprocessor``, S3 URI of the model.tar.gz), or None, with a warning, when there is no
+        approved model or it has no packaged preprocessor; a new one is then fitted and training
+        starts from scratch
+    """
+    from botocore.exceptions import BotoCoreError, ClientError
+
     try:
-        # Get table location using the correct function with explicit boto3 session
-        logger.info(f"Getting table location for {args.database_name}.{args.table_name}")
-        s3_location = wr.catalog.get_table_location(
-            database=args.database_name,
-            table=args.table_name,
-            boto3_session=boto3_session
-        )
-        logger.info(f"Found table S3 location: {s3_location}")
-        
-        # Read data directly from S3 with explicit boto3 session
-        logger.info("Reading data from S3 location")
-        df = wr.s3.read_csv(
-            path=s3_location,
-            boto3_session=boto3_session
+        model_data = get_approved_model_data(model_package_group_name, boto3_session)
+    except (BotoCoreError, ClientError) as e:
+        logger.warning(f"Could not look up the approved model of {model_package_group_name}, not warm starting: {e}")
+        return None
+    if model_data is None:
+        logger.warning(f"No approved model in {model_package_group_name} to warm start from, training from scratch")
+        return None
+    try:
+        stored = read_member_bytes(model_data, PREPROCESSOR_FILE, boto3_session)
+    except KeyError:
+        logger.warning(f"{model_data} has no {PREPROCESSOR_FILE} to transform the data with, training from scratch")
+        return None
+    logger.info(f"Transforming the data with the preprocessor of {model_data} to warm start from it")
+    return Preprocessor.from_dict(json.loads(stored)), model_data
+
+
+def save_warm_start(model_data, base_dir):
+    """Records the model whose preprocessor transformed the data, which training continues."""
+    path = f"{base_dir}/preprocessor/{WARM_START_FILE}"
+    with open(path, "w") as f:
+        json.dump({"model_data": model_data}, f)
+    logger.info(f"Saved the warm start model {model_data} to {path}")
+
+
+def parse_filter(text, schema):
+    """Parses comma separated (AND) clauses such as ``dt>=2024-01-01,dt<2024-02-01``.
+
+    Values are cast to the type of their column in ``schema``, so partition keys and regular
+    columns can both be compared.
+
+    Returns:
+        a pyarrow dataset expression, or None for an empty filter or ``*``
+    """
+    if not text or text.strip() == "*":
+        return None
+    expression = None
+    for clause in text.split(","):
+        match = filter_pattern.match(clause)
+        if not match:
+            raise ValueError(f"Invalid filter clause: {clause}")
+        name, op, value = match.groups()
+        term = filter_operators[op](ds.field(name), pa.scalar(value).cast(schema.field(name).type))
+        expression = term if expression is None else expression & term
+    return expression
+
+
+class PushdownSource:
+    """Directory-partitioned Parquet table read with partition pruning and column projection.
+
+    Partitions that cannot match the filter are dropped from their paths, a fraction of the
+    remaining files can be sampled, and only the selected columns are read, so excluded data
+    is never downloaded. Other predicates of the filter are pushed down to the row groups.
+    """
+
+    def __init__(self, path, partition_filter=None, sample_fraction=1.0, seed=0, features=None):
+        if path.startswith("s3://"):
+            filesystem, root = pafs.S3FileSystem(region=region), path.replace("s3://", "", 1).rstrip("/")
+        else:
+            filesystem, root = pafs.LocalFileSystem(), path.rstrip("/")
+        dataset = ds.dataset(root, filesystem=filesystem, format="parquet", partitioning="hive")
+        self.filter = parse_filter(partition_filter, dataset.schema)
+        paths = [fragment.path for fragment in dataset.get_fragments(filter=self.filter)]
+        logger.info(f"{len(paths)} files of {path} left after partition pruning")
+        if sample_fraction < 1.0:
+            paths = [p for p in paths if self._sampled(p, sample_fraction, seed)]
+            logger.info(f"{len(paths)} files kept by sampling a fraction of {sample_fraction}")
+        if not paths:
+            raise ValueError(f"No data of {path} matches the filter and sample fraction")
+        self.filesystem = filesystem
+        self.root = root
+        self.paths = paths
+        self.columns = select_features(features)[0] + [label_column]
+
+    def shard(self, index, count):
+        """Keeps every ``count``-th file starting at ``index``, like ``ShardedByS3Key``."""
+        self.paths = self.paths[index::count]
+        logger.info(f"Reading {len(self.paths)} files as shard {index + 1} of {count}")
+        return self
+
+    @property
+    def dataset(self):
+        return ds.dataset(
+            self.paths, filesystem=self.filesystem, format="parquet", partitioning="hive", partition_base_dir=self.root
         )
-        logger.info(f"Successfully read {len(df)} rows from S3 location")
-        
-        # Check if the data has headers
-        if df.columns[0] in ['M', 'F', 'I']:
-            # No headers, assign column names
-            logger.info("Data has no headers, assigning column names")
-            df.columns = feature_columns_names + [label_column]
-            
-    except Exception as e:
-        logger.error(f"Error reading from Glue catalog: {e}")
-        sys.exit(1)
-    
+
+    @staticmethod
+    def _sampled(path, fraction, seed):
+        digest = hashlib.sha256(f"{seed}:{path}".encode()).hexdigest()
+        return int(digest[:8], 16) / 2 ** 32 < fraction
+
+    def read(self):
+        return self.dataset.to_table(columns=self.columns, filter=self.filter).to_pandas()
+
+    def chunks(self, chunk_size):
+        if not self.paths:
+            return
+        for batch in self.dataset.to_batches(columns=self.columns, filter=self.filter, batch_size=chunk_size):
+            if batch.num_rows:
+                yield batch.to_pandas()
+
+
+class CsvSplitWriter:
+    """Appends rows to a headerless CSV split."""
+
+    def __init__(self, path, columns):
+        self.handle = open(path, "w")
+
+    def write(self, rows):
+        pd.DataFrame(rows).to_csv(self.handle, header=False, index=False)
+
+    def close(self):
+        self.handle.close()
+
+
+class ParquetSplitWriter:
+    """Appends rows as float32 row groups to a Parquet split."""
+
+    def __init__(self, path, columns):
+        self.schema = pa.schema([(name, pa.float32()) for name in columns])
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, rows):
+        rows = np.asarray(rows, dtype=np.float32)
+        arrays = [pa.array(rows[:, index]) for index in range(rows.shape[1])]
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+class RawSplitWriter:
+    """Appends rows with their raw feature values to a CSV with a header.
+
+    The raw copy of the test split lets evaluation score a champion model with its own
+    preprocessor, row for row with the transformed split.
+    """
+
+    def __init__(self, path, columns):
+        self.columns = columns
+        self.handle = open(path, "w")
+        pd.DataFrame(columns=columns).to_csv(self.handle, index=False)
+
+    def write(self, rows):
+        rows[self.columns].to_csv(self.handle, header=False, index=False)
+
+    def close(self):
+        self.handle.close()
+
+
+class ShardedSplitWriter:
+    """Spreads every batch of rows evenly over several files of a split.
+
+    ``ShardedByS3Key`` hands whole files to the training instances, so the train split needs at
+    least one file per instance for all of them to get data.
+    """
+
+    def __init__(self, writers):
+        self.writers = writers
+
+    def write(self, rows):
+        for writer, block in zip(self.writers, np.array_split(np.asarray(rows), len(self.writers))):
+            if len(block):
+                writer.write(block)
+
+    def close(self):
+        for writer in self.writers:
+            writer.close()
+
+
+def open_split_writers(base_dir, output_format, columns, part=None, train_parts=1, raw_columns=None):
+    """Opens one writer per split, e.g. ``{base_dir}/train/train.parquet``.
+
+    Args:
+        train_parts: number of files the train split is spread over, ``train-shard<i>``
+        raw_columns: also open ``raw_test``, the untransformed test rows with these columns
+    """
+    writer_class = ParquetSplitWriter if output_format == "parquet" else CsvSplitWriter
+    suffix = f"-{part}" if part else ""
+    writers = {}
+    for name in split_names:
+        if name == "train" and train_parts > 1:
+            writers[name] = ShardedSplitWriter([
+                writer_class(f"{base_dir}/{name}/{name}{suffix}-shard{index}.{output_format}", columns)
+                for index in range(train_parts)
+            ])
+        else:
+            writers[name] = writer_class(f"{base_dir}/{name}/{name}{suffix}.{output_format}", columns)
+    if raw_columns:
+        writers["raw_test"] = RawSplitWriter(f"{base_dir}/raw_test/test{suffix}.csv", raw_columns)
+    return writers
+
+
+def split_indices(n_rows, seed):
+    """Assigns rows to the splits through a seeded permutation of their indices.
+
+    Returns:
+        one index array per split in permuted order, so the rows of every split are written
+        shuffled, and the same seed always yields the same splits
+    """
+    permutation = np.random.default_rng(seed).permutation(n_rows)
+    bounds = [int(boundary * n_rows) for boundary in split_boundaries]
+    return np.split(permutation, bounds)
+
+
+def hash_split(chunk, seed, numeric, categorical):
+    """Assigns each row of a chunk to a split from a seeded hash of its raw values.
+
+    The assignment depends only on the row itself, so it is identical however the table is
+    chunked, ordered or re-read.
+
+    Args:
+        numeric: numeric feature columns hashed with the label
+        categorical: categorical feature columns hashed as strings
+    """
+    normalised = chunk[numeric + [label_column]].apply(pd.to_numeric, errors="coerce").astype(float)
+    for name in categorical:
+        normalised[name] = chunk[name].astype(str)
+    hashes = pd.util.hash_pandas_object(normalised, index=False, hash_key=f"{seed:016d}"[-16:]).to_numpy()
+    # The top 53 bits of the hash as a uniform float in [0, 1)
+    uniform = (hashes >> np.uint64(11)).astype(float) / float(2 ** 53)
+    return np.searchsorted(split_boundaries, uniform, side="right")
+
+
+def read_table(source, features=None):
+    """Reads the whole table from an S3 location or a ``PushdownSource``."""
+    if isinstance(source, PushdownSource):
+        return source.read()
+    # Read data directly from S3 with explicit boto3 session
+    df = wr.s3.read_csv(
+        path=source,
+        boto3_session=boto3_session
+    )
+    return normalise_columns(df, features)
+
+
+def run_in_memory(source, base_dir, output_format="csv", seed=0, features=None, train_parts=1):
+    """Reads the whole table into memory, fits the transformer and writes the splits."""
+    features, numeric_columns, categorical_columns = select_features(features)
+    logger.info("Reading data from S3 location")
+    df = read_table(source, features)
+    logger.info(f"Successfully read {len(df)} rows from S3 location")
+    save_profile(StreamingStats(numeric_columns, categorical_columns).update(df), base_dir)
+
     # Data preprocessing
     logger.info("Defining transformers")
-    numeric_features = list(feature_columns_names)
-    numeric_features.remove("sex")
     numeric_transformer = Pipeline(steps=[
         ("imputer", SimpleImputer(strategy="median")),
         ("scaler", StandardScaler())
     ])
 
-    categorical_features = ["sex"]
     categorical_transformer = Pipeline(steps=[
         ("imputer", SimpleImputer(strategy="constant", fill_value="missing")),
         ("onehot", OneHotEncoder(handle_unknown="ignore"))
     ])
 
-    preprocess = ColumnTransformer(transformers=[
-        ("num", numeric_transformer, numeric_features),
-        ("cat", categorical_transformer, categorical_features)
-    ])
+    transformers = [("num", numeric_transformer, numeric_columns)]
+    if categorical_columns:
+        transformers.append(("cat", categorical_transformer, categorical_columns))
+    preprocess = ColumnTransformer(transformers=transformers)
 
     # Apply transformations
     logger.info("Applying transforms")
@@ -146,17 +435,713 @@ if __name__ == "__main__":
     X_pre = preprocess.fit_transform(X)
     y_pre = y.to_numpy().reshape(len(y), 1)
 
-    X = np.concatenate((y_pre, X_pre), axis=1)
+    # Split data on row indices rather than shuffling a concatenated copy of the matrix
+    logger.info(f"Splitting {len(X_pre)} rows into train, validation, test datasets with seed {seed}")
+    splits = split_indices(len(X_pre), seed)
+
+    categories = []
+    if categorical_columns:
+        categories = preprocess.named_transformers_["cat"].named_steps["onehot"].categories_[0]
+    numeric = preprocess.named_transformers_["num"]
+    preprocessor = Preprocessor(
+        numeric_columns,
+        categorical_columns,
+        numeric.named_steps["imputer"].statistics_,
+        numeric.named_steps["scaler"].mean_,
+        numeric.named_steps["scaler"].scale_,
+        categories,
+        label_column,
+    )
+
+    # Write output datasets, gathering label and features for one batch of rows at a time
+    logger.info(f"Writing out {output_format} datasets to {base_dir}")
+    columns = [label_column] + preprocessor.output_columns
+    raw_columns = [label_column] + numeric_columns + categorical_columns
+    writers = open_split_writers(base_dir, output_format, columns, None, train_parts, raw_columns)
+    for name, indices in zip(split_names, splits):
+        for start in range(0, len(indices), write_batch_rows):
+            batch = indices[start:start + write_batch_rows]
+            writers[name].write(np.concatenate((y_pre[batch], X_pre[batch]), axis=1))
+            if name == "test":
+                writers["raw_test"].write(df.iloc[batch])
+    for writer in writers.values():
+        writer.close()
+
+    save_preprocessor(preprocessor, base_dir)
+
+
+def read_chunks(source, chunk_size, features=None):
+    """Yields the table, a list of its objects or a ``PushdownSource`` as DataFrames of at most ``chunk_size`` rows."""
+    if isinstance(source, PushdownSource):
+        yield from source.chunks(chunk_size)
+        return
+    for chunk in wr.s3.read_csv(path=source, chunksize=chunk_size, boto3_session=boto3_session):
+        yield normalise_columns(chunk, features)
+
+
+class StreamingStats:
+    """Mergeable sufficient statistics of the transformer.
+
+    Holds a quantile sketch and Welford moments per numeric feature and the label, null counts
+    and the category frequencies of ``sex``. Instances can be updated chunk by chunk, merged and
+    serialised, so a fit can be resumed or combined without revisiting the data. The same
+    statistics also give the data profile of the rows seen.
+    """
+
+    def __init__(self, numeric=None, categorical=None):
+        self.numeric_features = list(numeric_features if numeric is None else numeric)
+        self.categorical_features = list(categorical_features if categorical is None else categorical)
+        self.rows = 0
+        columns = self.numeric_features + [label_column]
+        self.sketches = {name: QuantileSketch() for name in columns}
+        self.moments = {name: RunningMoments() for name in columns}
+        self.nulls = {name: 0 for name in columns}
+        self.categories = {}
+
+    def update(self, chunk):
+        """Adds a chunk of raw rows to the statistics."""
+        self.rows += len(chunk)
+        for name in self.sketches:
+            values = pd.to_numeric(chunk[name], errors="coerce").to_numpy(dtype=float)
+            self.sketches[name].update(values)
+            self.moments[name].update(values)
+            self.nulls[name] += int(np.isnan(values).sum())
+        for name in self.categorical_features:
+            for category, count in chunk[name].fillna("missing").astype(str).value_counts().items():
+                self.categories[category] = self.categories.get(category, 0) + int(count)
+        return self
+
+    def merge(self, other):
+        """Folds the statistics of another set of rows into these."""
+        self.rows += other.rows
+        for name in other.sketches:
+            # States written before the label was tracked only hold the features
+            self.sketches.setdefault(name, QuantileSketch()).merge(other.sketches[name])
+            self.moments.setdefault(name, RunningMoments()).merge(other.moments[name])
+            self.nulls[name] = self.nulls.get(name, 0) + other.nulls[name]
+        for category, count in other.categories.items():
+            self.categories[category] = self.categories.get(category, 0) + count
+        return self
+
+    def finalize(self):
+        """Derives the fitted transformer parameters.
+
+        Returns:
+            ``Preprocessor`` with the imputer medians, scaler means/scales and the category vocabulary
+        """
+        medians, means, scales = [], [], []
+        for name in self.numeric_features:
+            median = self.sketches[name].quantile(0.5)
+            # The scaler runs after imputation, so fold the imputed medians into the moments.
+            moments = RunningMoments(self.moments[name].count, self.moments[name].mean, self.moments[name].m2)
+            moments.merge(RunningMoments(self.nulls[name], median, 0.0))
+            scale = float(np.sqrt(moments.variance))
+            medians.append(median)
+            means.append(moments.mean)
+            scales.append(scale if scale > 0 else 1.0)
+        return Preprocessor(
+            self.numeric_features,
+            self.categorical_features,
+            medians,
+            means,
+            scales,
+            sorted(self.categories),
+            label_column,
+        )
+
+    def profile(self):
+        """Per-column counts, nulls, range, mean/std, quantiles and category frequencies.
+
+        Returns:
+            JSON serialisable dict, the statistics of empty columns are None
+        """
+        columns = {}
+        for name in self.sketches:
+            moments = self.moments[name]
+            summary = {"type": "numeric", "count": moments.count, "nulls": self.nulls[name]}
+            if moments.count:
+                summary.update(
+                    min=moments.minimum,
+                    max=moments.maximum,
+                    mean=moments.mean,
+                    std=moments.sample_std if moments.count > 1 else None,
+                    quantiles={str(q): self.sketches[name].quantile(q) for q in profile_quantiles},
+                )
+            else:
+                summary.update(min=None, max=None, mean=None, std=None, quantiles=None)
+            columns[name] = summary
+        for name in self.categorical_features:
+            nulls = self.categories.get("missing", 0)
+            columns[name] = {
+                "type": "categorical",
+                "count": self.rows - nulls,
+                "nulls": nulls,
+                "frequencies": dict(sorted(self.categories.items())),
+            }
+        return {"rows": self.rows, "columns": columns}
+
+    def to_dict(self):
+        return {
+            "numeric_features": self.numeric_features,
+            "categorical_features": self.categorical_features,
+            "rows": self.rows,
+            "sketches": {name: sketch.to_dict() for name, sketch in self.sketches.items()},
+            "moments": {name: moments.to_dict() for name, moments in self.moments.items()},
+            "nulls": self.nulls,
+            "categories": self.categories,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        # States written before the feature selection was stored hold every feature
+        stats = cls(data.get("numeric_features"), data.get("categorical_features"))
+        stats.rows = data["rows"]
+        stats.sketches = {name: QuantileSketch.from_dict(sketch) for name, sketch in data["sketches"].items()}
+        stats.moments = {name: RunningMoments.from_dict(moments) for name, moments in data["moments"].items()}
+        stats.nulls = dict(data["nulls"])
+        stats.categories = dict(data["categories"])
+        return stats
+
+
+def save_profile(stats, base_dir):
+    """Writes the data profile of ``stats`` to the ``profile`` output."""
+    path = f"{base_dir}/profile/profile.json"
+    with open(path, "w") as f:
+        json.dump(stats.profile(), f, indent=2)
+    logger.info(f"Saved data profile of {stats.rows} rows to {path}")
+
+
+def fit_streaming(chunks, stats):
+    """Computes the transformer statistics in a single pass over the chunks.
+
+    Medians come from a quantile sketch and the scaler moments from Welford updates, so
+    memory stays bounded by the chunk size rather than the table size.
+
+    Args:
+        chunks: iterable of raw DataFrames
+        stats: ``StreamingStats`` of the selected features to update, empty or holding the
+            previously seen rows
+
+    Returns:
+        the updated ``StreamingStats``
+    """
+    for chunk in chunks:
+        stats.update(chunk)
+    logger.info(f"Fitted streaming statistics over {stats.rows} rows")
+    return stats
+
+
+def transform_chunk(chunk, preprocessor):
+    """Applies the fitted ``Preprocessor`` to a chunk and returns ``[label, features...]`` rows."""
+    label = chunk[label_column].to_numpy(dtype=float).reshape(-1, 1)
+    return np.concatenate((label, preprocessor.transform(chunk)), axis=1)
+
+
+def write_splits(chunks, preprocessor, base_dir, output_format, seed, part=None, train_parts=1):
+    """Transforms every chunk and appends its rows to the split chosen by ``hash_split``.
+
+    Args:
+        part: optional suffix of the output files, e.g. ``train/train-<part>.csv``
+        train_parts: number of files the train split is spread over
+    """
+    columns = [label_column] + preprocessor.output_columns
+    raw_columns = [label_column] + preprocessor.numeric_features + preprocessor.categorical_features
+    writers = open_split_writers(base_dir, output_format, columns, part, train_parts, raw_columns)
+    try:
+        for chunk in chunks:
+            rows = transform_chunk(chunk, preprocessor)
+            assignment = hash_split(chunk, seed, preprocessor.numeric_features, preprocessor.categorical_features)
+            for index, name in enumerate(split_names):
+                writers[name].write(rows[assignment == index])
+            writers["raw_test"].write(chunk[assignment == split_names.index("test")])
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+
+def profiled_chunks(chunks, stats):
+    """Yields the chunks unchanged, adding each of them to ``stats`` on the way."""
+    for chunk in chunks:
+        stats.update(chunk)
+        yield chunk
+
+
+def run_streaming(
+    source, base_dir, chunk_size, output_format="csv", seed=0, features=None, train_parts=1, preprocessor=None
+):
+    """Two-pass, bounded-memory variant of ``run_in_memory``.
+
+    The first pass fits the transformer statistics, the second transforms every chunk and
+    appends each row to the train/validation/test output chosen by ``hash_split``. A given
+    ``preprocessor`` is applied as it is, in a single pass that also profiles the chunks.
+    """
+    features, numeric, categorical = select_features(features)
+    if preprocessor is not None:
+        stats = StreamingStats(numeric, categorical)
+        logger.info(f"Transforming and writing out {output_format} datasets to {base_dir} with the given preprocessor")
+        write_splits(
+            profiled_chunks(read_chunks(source, chunk_size, features), stats),
+            preprocessor,
+            base_dir,
+            output_format,
+            seed,
+            None,
+            train_parts,
+        )
+        save_profile(stats, base_dir)
+        save_preprocessor(preprocessor, base_dir)
+        return
+
+    logger.info(f"Fitting transformer statistics in chunks of {chunk_size} rows")
+    stats = fit_streaming(read_chunks(source, chunk_size, features), StreamingStats(numeric, categorical))
+    save_profile(stats, base_dir)
+    preprocessor = stats.finalize()
+
+    logger.info(f"Transforming and writing out {output_format} datasets to {base_dir}")
+    write_splits(
+        read_chunks(source, chunk_size, features), preprocessor, base_dir, output_format, seed, None, train_parts
+    )
+    save_preprocessor(preprocessor, base_dir)
+
+
+def list_table_objects(s3_location):
+    """Lists the data objects under the table location.
+
+    Returns:
+        dict of object path to ETag
+    """
+    bucket, _, prefix = s3_location.replace("s3://", "", 1).partition("/")
+    objects = {}
+    paginator = boto3_session.client("s3").get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            if not obj["Key"].endswith("/") and obj["Size"] > 0:
+                objects[f"s3://{bucket}/{obj['Key']}"] = obj["ETag"]
+    return objects
+
+
+def read_json(uri):
+    """Reads a JSON document from S3 or a local path, None if it does not exist."""
+    body = None
+    if uri.startswith("s3://"):
+        s3_client = boto3_session.client("s3")
+        bucket, _, key = uri.replace("s3://", "", 1).partition("/")
+        try:
+            body = s3_client.get_object(Bucket=bucket, Key=key)["Body"].read()
+        except s3_client.exceptions.NoSuchKey:
+            pass
+    elif os.path.exists(uri):
+        body = pathlib.Path(uri).read_bytes()
+    return json.loads(body) if body is not None else None
+
+
+def write_json(uri, data):
+    """Writes a JSON document to S3 or a local path."""
+    body = json.dumps(data)
+    if uri.startswith("s3://"):
+        bucket, _, key = uri.replace("s3://", "", 1).partition("/")
+        boto3_session.client("s3").put_object(Bucket=bucket, Key=key, Body=body.encode())
+    else:
+        pathlib.Path(uri).parent.mkdir(parents=True, exist_ok=True)
+        with open(uri, "w") as f:
+            f.write(body)
+
+
+def preprocessor_version(preprocessor):
+    """Content hash of the ``Preprocessor`` parameters, recorded for every part it wrote."""
+    return hashlib.sha256(json.dumps(preprocessor.to_dict(), sort_keys=True).encode()).hexdigest()[:16]
+
+
+def load_state(state_uri):
+    """Reads the incremental state, empty if it does not exist yet."""
+    state = read_json(state_uri)
+    if state is None:
+        logger.info(f"No incremental state at {state_uri}, starting from scratch")
+        return {"objects": {}, "parts": {}, "stats": None, "preprocessor": None, "versions": {}}
+    state.setdefault("parts", {})
+    if "preprocessor" not in state:
+        # States written before the preprocessor was stored had every part written with the
+        # finalized statistics
+        preprocessor = StreamingStats.from_dict(state["stats"]).finalize() if state["stats"] else None
+        state["preprocessor"] = preprocessor.to_dict() if preprocessor else None
+        state["versions"] = {part: preprocessor_version(preprocessor) for part in state["parts"]}
+    return state
+
+
+def run_incremental(
+    s3_location,
+    base_dir,
+    chunk_size,
+    state_uri,
+    output_format="csv",
+    seed=0,
+    features=None,
+    train_parts=1,
+    refit=False,
+):
+    """Reads and transforms only the objects that arrived since the last run.
+
+    The state at ``state_uri`` holds the ETags of the objects already processed, the objects of
+    every part written so far, the accumulated ``StreamingStats``, the preprocessor the parts are
+    written with and the version of it each part was written with. New objects update the
+    statistics and become a new part of each split, transformed with the stored preprocessor so
+    that every part under the prefix stays consistent with the saved one.
+
+    The stored preprocessor only follows the accumulated statistics on a ``refit``, which
+    finalizes them into a new version and transforms every part again, reading the whole table.
+    """
+    features, numeric, categorical = select_features(features)
+    state = load_state(state_uri)
+    previous = StreamingStats.from_dict(state["stats"]) if state["stats"] else None
+    if previous and (previous.numeric_features, previous.categorical_features) != (numeric, categorical):
+        stored = previous.numeric_features + previous.categorical_features
+        raise ValueError(
+            f"The state at {state_uri} holds the statistics of {stored}, not of the selected features "
+            f"{features}; use a new state to change the feature columns"
+        )
+    objects = list_table_objects(s3_location)
+    new_objects = {path: etag for path, etag in objects.items() if state["objects"].get(path) != etag}
+    changed = [path for path in new_objects if path in state["objects"]]
+    if changed:
+        # Statistics cannot be retracted, rewritten objects are counted again
+        logger.warning(f"{len(changed)} previously processed objects changed and will be processed again")
+    if not new_objects and not (refit and previous):
+        logger.info(f"No new objects under {s3_location} since the last run")
+        if previous:
+            save_profile(previous, base_dir)
+            save_preprocessor(Preprocessor.from_dict(state["preprocessor"]), base_dir)
+        return
+
+    paths = sorted(new_objects)
+    stats = previous or StreamingStats(numeric, categorical)
+    if paths:
+        logger.info(f"Processing {len(paths)} new of {len(objects)} objects in chunks of {chunk_size} rows")
+        stats = fit_streaming(read_chunks(paths, chunk_size, features), stats)
+    save_profile(stats, base_dir)
+    if refit or state["preprocessor"] is None:
+        preprocessor = stats.finalize()
+    else:
+        preprocessor = Preprocessor.from_dict(state["preprocessor"])
+    version = preprocessor_version(preprocessor)
+
+    # Changed objects are rewritten within their part, the others form a new part named after
+    # their content so that reruns overwrite rather than duplicate it
+    assigned = {path for part_paths in state["parts"].values() for path in part_paths}
+    unassigned = sorted((set(state["objects"]) | set(paths)) - assigned)
+    if unassigned:
+        content = {path: objects.get(path, state["objects"].get(path)) for path in unassigned}
+        state["parts"][hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()[:16]] = unassigned
+
+    for part, part_paths in sorted(state["parts"].items()):
+        if not refit and not set(part_paths) & set(new_objects):
+            if state["versions"].get(part) != version:
+                logger.warning(f"Part {part} was written with another preprocessor, refit to rewrite it")
+            continue
+        present = [path for path in part_paths if path in objects]
+        if not present:
+            logger.warning(f"The objects of part {part} no longer exist, its files are left as they are")
+            continue
+        logger.info(f"Transforming and writing out {output_format} part {part} of {len(present)} objects")
+        chunks = read_chunks(present, chunk_size, features)
+        write_splits(chunks, preprocessor, base_dir, output_format, seed, part, train_parts)
+        state["versions"][part] = version
+    save_preprocessor(preprocessor, base_dir)
+
+    state["objects"].update(new_objects)
+    state["stats"] = stats.to_dict()
+    state["preprocessor"] = preprocessor.to_dict()
+    write_json(state_uri, state)
+
+
+def get_host_info():
+    """Current host and sorted list of hosts of the processing job.
+
+    Returns:
+        (current_host, hosts), a single ``algo-1`` host outside of SageMaker
+    """
+    config_path = "/opt/ml/config/resourceconfig.json"
+    if not os.path.exists(config_path):
+        return "algo-1", ["algo-1"]
+    with open(config_path) as f:
+        config = json.load(f)
+    return config["current_host"], sorted(config["hosts"])
+
+
+def get_job_name():
+    """Name of the processing job, unique per run, used to scope coordination files."""
+    config_path = "/opt/ml/config/processingjobconfig.json"
+    if not os.path.exists(config_path):
+        return "local"
+    with open(config_path) as f:
+        return json.load(f)["ProcessingJobName"]
+
+
+def reduce_stats(stats, coordination_uri, current_host, hosts, timeout=3600, poll_interval=5):
+    """Exchanges partial statistics between hosts through coordination files.
+
+    Every host publishes its partial ``StreamingStats`` and merges those of all hosts in the
+    same order, so all of them end up with identical fitted parameters.
+    """
+    write_json(f"{coordination_uri}/partial-{current_host}.json", stats.to_dict())
+    merged = StreamingStats(stats.numeric_features, stats.categorical_features)
+    deadline = time.time() + timeout
+    for host in hosts:
+        partial = read_json(f"{coordination_uri}/partial-{host}.json")
+        while partial is None:
+            if time.time() > deadline:
+                raise TimeoutError(f"Timed out waiting for the statistics of {host}")
+            time.sleep(poll_interval)
+            partial = read_json(f"{coordination_uri}/partial-{host}.json")
+        merged.merge(StreamingStats.from_dict(partial))
+    logger.info(f"Merged statistics of {len(hosts)} hosts")
+    return merged
+
+
+def run_distributed(
+    source,
+    s3_location,
+    base_dir,
+    chunk_size,
+    coordination_uri,
+    current_host,
+    hosts,
+    output_format="csv",
+    seed=0,
+    features=None,
+    train_parts=1,
+    preprocessor=None,
+):
+    """Sharded variant of ``run_streaming`` for multi-instance processing jobs.
+
+    Each host reads its share of the table objects, computes partial statistics, merges them
+    with the other hosts through ``reduce_stats`` and transforms and writes only its own
+    shard, with the host name in the output file names. A given ``preprocessor`` replaces the
+    one fitted from the merged statistics, which then only feed the profile.
+    """
+    features, numeric, categorical = select_features(features)
+    index = hosts.index(current_host)
+    if isinstance(source, PushdownSource):
+        shard = source.shard(index, len(hosts))
+    else:
+        shard = sorted(list_table_objects(s3_location))[index::len(hosts)]
+        logger.info(f"Reading {len(shard)} objects as shard {index + 1} of {len(hosts)}")
+
+    def shard_chunks():
+        return read_chunks(shard, chunk_size, features) if shard else iter(())
+
+    partial = fit_streaming(shard_chunks(), StreamingStats(numeric, categorical))
+    merged = reduce_stats(partial, coordination_uri, current_host, hosts)
+    preprocessor = preprocessor or merged.finalize()
+
+    logger.info(f"Transforming and writing out {output_format} shard {current_host} to {base_dir}")
+    write_splits(shard_chunks(), preprocessor, base_dir, output_format, seed, current_host, train_parts)
+    # Every host holds the same merged statistics, the first one publishes them
+    if current_host == hosts[0]:
+        save_profile(merged, base_dir)
+        save_preprocessor(preprocessor, base_dir)
+
+
+if __name__ == "__main__":
+    logger.info("Starting preprocessing with AWS Data Wrangler")
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--database-name", type=str, default=None)
+    parser.add_argument("--table-name", type=str, default=None)
+    parser.add_argument(
+        "--data-path",
+        type=str,
+        default=None,
+        help="Local or S3 path of a directory-partitioned Parquet dataset read instead of the Glue table",
+    )
+    parser.add_argument(
+        "--input-format",
+        type=str,
+        default="auto",
+        choices=["auto", "csv", "parquet"],
+        help="Format of the table, auto uses the Glue table classification (parquet for --data-path)",
+    )
+    parser.add_argument(
+        "--partition-filter",
+        type=str,
+        default="*",
+        help="Comma separated clauses such as 'dt>=2024-01-01,dt<2024-02-01' applied before reading Parquet data",
+    )
+    parser.add_argument(
+        "--sample-fraction",
+        type=float,
+        default=1.0,
+        help="Fraction of the Parquet files to read, sampled per file with the split seed",
+    )
+    parser.add_argument(
+        "--feature-columns",
+        type=str,
+        default="*",
+        help="Comma separated subset of the feature columns to read and transform",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=0,
+        help="Rows per chunk for the out-of-core streaming mode; 0 reads the whole table into memory",
+    )
+    parser.add_argument(
+        "--output-format",
+        type=str,
+        default="csv",
+        choices=output_formats,
+        help="Format of the train/validation/test splits; parquet writes float32 columns",
+    )
+    parser.add_argument(
+        "--split-seed",
+        type=int,
+        default=0,
+        help="Seed of the train/validation/test split, reruns with the same seed give the same splits",
+    )
+    parser.add_argument(
+        "--cache-key",
+        type=str,
+        default=None,
+        help="Content hash of the step inputs, only used to key the SageMaker step cache",
+    )
+    parser.add_argument(
+        "--train-parts",
+        type=int,
+        default=1,
+        help="Files the train split is spread over, at least the training instance count for ShardedByS3Key",
+    )
+    parser.add_argument(
+        "--state-uri",
+        type=str,
+        default=None,
+        help="S3 or local JSON file of processed objects and accumulated statistics for incremental runs",
+    )
+    parser.add_argument(
+        "--refit",
+        action="store_true",
+        help="Refit the preprocessor of an incremental run on all data seen so far and rewrite every part",
+    )
+    parser.add_argument(
+        "--coordination-uri",
+        type=str,
+        default=None,
+        help="S3 or local prefix used to exchange partial statistics when running on several instances",
+    )
+    parser.add_argument(
+        "--warm-start-model-package-group-name",
+        type=str,
+        default=None,
+        help="Transform the data with the preprocessor of the latest approved model of this group, to warm start it",
+    )
+    parser.add_argument("--base-dir", type=str, default="/opt/ml/processing")
+    args = parser.parse_args()
+    if args.data_path is None and not (args.database_name and args.table_name):
+        parser.error("--database-name and --table-name are required unless --data-path is given")
+    if args.warm_start_model_package_group_name and args.state_uri:
+        parser.error("--warm-start-model-package-group-name does not support --state-uri")
+    if args.refit and not args.state_uri:
+        parser.error("--refit needs --state-uri")
+
+    base_dir = args.base_dir
+    for name in split_names + ["raw_test", "preprocessor", "profile"]:
+        pathlib.Path(f"{base_dir}/{name}").mkdir(parents=True, exist_ok=True)
+
+    features = None
+    if args.feature_columns.strip() != "*":
+        features = [name.strip() for name in args.feature_columns.split(",")]
+    warm_start = None
+    if args.warm_start_model_package_group_name:
+        warm_start = load_warm_start_preprocessor(args.warm_start_model_package_group_name)
+    if warm_start is not None:
+        # The continued model reads the features it was trained with
+        warm_start_features = warm_start[0].numeric_features + warm_start[0].categorical_features
+        if set(warm_start_features) != set(select_features(features)[0]):
+            logger.warning("Using the features of the warm start model instead of --feature-columns")
+        features = warm_start_features
+    logger.info(f"Using feature columns: {select_features(features)[0]}")
+
+    input_format = args.input_format
+    if args.data_path is not None:
+        s3_location = args.data_path
+        input_format = "parquet" if input_format == "auto" else input_format
+    else:
+        # Try to read from Glue Data Catalog
+        try:
+            # Get table location using the correct function with explicit boto3 session
+            logger.info(f"Getting table location for {args.database_name}.{args.table_name}")
+            s3_location = wr.catalog.get_table_location(
+                database=args.database_name,
+                table=args.table_name,
+                boto3_session=boto3_session
+            )
+            logger.info(f"Found table S3 location: {s3_location}")
+            if input_format == "auto":
+                parameters = wr.catalog.get_table_parameters(
+                    database=args.database_name,
+                    table=args.table_name,
+                    boto3_session=boto3_session
+                )
+                input_format = "parquet" if parameters.get("classification") == "parquet" else "csv"
+        except Exception as e:
+            logger.error(f"Error reading from Glue catalog: {e}")
+            sys.exit(1)
+
+    source = s3_location
+    if input_format == "parquet":
+        if args.state_uri:
+            parser.error("--state-uri only supports csv tables")
+        source = PushdownSource(s3_location, args.partition_filter, args.sample_fraction, args.split_seed, features)
+    elif args.partition_filter.strip() != "*" or args.sample_fraction < 1.0:
+        parser.error("--partition-filter and --sample-fraction need a parquet table")
+
+    current_host, hosts = get_host_info()
+    if len(hosts) > 1:
+        if args.state_uri or not args.coordination_uri:
+            logger.error("Running on several instances needs --coordination-uri and no --state-uri")
+            sys.exit(1)
+        run_distributed(
+            source,
+            s3_location,
+            base_dir,
+            args.chunk_size or default_chunk_size,
+            f"{args.coordination_uri.rstrip('/')}/{get_job_name()}",
+            current_host,
+            hosts,
+            args.output_format,
+            args.split_seed,
+            features,
+            args.train_parts,
+            warm_start[0] if warm_start else None,
+        )
+    elif warm_start is not None:
+        run_streaming(
+            source,
+            base_dir,
+            args.chunk_size or default_chunk_size,
+            args.output_format,
+            args.split_seed,
+            features,
+            args.train_parts,
+            warm_start[0],
+        )
+    elif args.state_uri:
+        run_incremental(
+            s3_location,
+            base_dir,
+            args.chunk_size or default_chunk_size,
+            args.state_uri,
+            args.output_format,
+            args.split_seed,
+            features,
+            args.train_parts,
+            args.refit,
+        )
+    elif args.chunk_size > 0:
+        run_streaming(
+            source, base_dir, args.chunk_size, args.output_format, args.split_seed, features, args.train_parts
+        )
+    else:
+        run_in_memory(source, base_dir, args.output_format, args.split_seed, features, args.train_parts)
 
-    # Split data
-    logger.info(f"Splitting {len(X)} rows into train, validation, test datasets")
-    np.random.shuffle(X)
-    train, validation, test = np.split(X, [int(0.7 * len(X)), int(0.85 * len(X))])
+    if warm_start is not None and current_host == hosts[0]:
+        save_warm_start(warm_start[1], base_dir)
 
-    # Write output datasets
-    logger.info(f"Writing out datasets to {base_dir}")
-    pd.DataFrame(train).to_csv(f"{base_dir}/train/train.csv", header=False, index=False)
-    pd.DataFrame(validation).to_csv(f"{base_dir}/validation/validation.csv", header=False, index=False)
-    pd.DataFrame(test).to_csv(f"{base_dir}/test/test.csv", header=False, index=False)
-    
-    logger.info("Data preprocessing completed successfully")
\ No newline at end of file
+    logger.info("Data preprocessing completed successfully")
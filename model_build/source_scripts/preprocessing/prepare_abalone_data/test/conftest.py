@@ -0,0 +1,37 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# SPDX-License-Identifier: MIT-0
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import importlib.util
+import pathlib
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def prepare(tmp_path_factory):
+    """The preprocessing script, imported with an empty dependency bundle so nothing is installed."""
+    pytest.importorskip("awswrangler")
+    requirements_dir = tmp_path_factory.mktemp("requirements")
+    (requirements_dir / "site-packages").mkdir()
+    path = pathlib.Path(__file__).resolve().parents[1] / "main.py"
+    spec = importlib.util.spec_from_file_location("prepare_abalone_data", path)
+    module = importlib.util.module_from_spec(spec)
+    # monkeypatch is function scoped, so restore the environment once the module is imported
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("REQUIREMENTS_DIR", str(requirements_dir))
+        spec.loader.exec_module(module)
+    return module
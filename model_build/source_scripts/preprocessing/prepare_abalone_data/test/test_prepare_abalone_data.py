@@ -0,0 +1,181 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# SPDX-License-Identifier: MIT-0
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import io
+import json
+import tarfile
+
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.impute import SimpleImputer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+
+def abalone(prepare, rows=401, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({name: rng.uniform(0.1, 1.0, size=rows) for name in prepare.numeric_features})
+    df["sex"] = rng.choice(["F", "I", "M"], size=rows)
+    df[prepare.label_column] = rng.integers(1, 25, size=rows)
+    df.loc[df.sample(frac=0.05, random_state=seed).index, "length"] = np.nan
+    return df
+
+
+def test_streaming_fit_matches_the_in_memory_transformer(prepare):
+    df = abalone(prepare)
+    stats = prepare.StreamingStats()
+    for start in range(0, len(df), 70):
+        stats.update(df.iloc[start:start + 70])
+    preprocessor = stats.finalize()
+
+    numeric = Pipeline([("imputer", SimpleImputer(strategy="median")), ("scaler", StandardScaler())])
+    transformer = ColumnTransformer(
+        [
+            ("num", numeric, prepare.numeric_features),
+            ("cat", OneHotEncoder(handle_unknown="ignore"), prepare.categorical_features),
+        ]
+    )
+    expected = transformer.fit_transform(df.drop(columns=[prepare.label_column]))
+    # With fewer rows than the sketch size the streaming medians are exact
+    assert np.allclose(preprocessor.medians, transformer.named_transformers_["num"]["imputer"].statistics_)
+    assert np.allclose(preprocessor.transform(df), expected)
+
+
+def test_merged_statistics_equal_a_single_pass(prepare):
+    df = abalone(prepare, seed=1)
+    whole = prepare.StreamingStats().update(df)
+    left = prepare.StreamingStats().update(df.iloc[:150])
+    right = prepare.StreamingStats.from_dict(prepare.StreamingStats().update(df.iloc[150:]).to_dict())
+    merged = left.merge(right)
+    assert merged.rows == whole.rows
+    assert merged.categories == whole.categories
+    assert np.allclose(merged.finalize().means, whole.finalize().means)
+    assert np.allclose(merged.finalize().scales, whole.finalize().scales)
+
+
+def test_feature_selection_keeps_the_listed_columns(prepare):
+    # In the order of the table columns, whatever the order of the list
+    features, numeric, categorical = prepare.select_features(["length", "sex"])
+    assert (features, numeric, categorical) == (["sex", "length"], ["length"], ["sex"])
+    # A headerless CSV as the table reader returns it, with its first row taken for the header
+    headerless = pd.read_csv(io.StringIO("M,0.45,0.3,0.1,0.5,0.2,0.1,0.15,15\nF,0.4,0.3,0.1,0.5,0.2,0.1,0.15,9\n"))
+    selected = prepare.normalise_columns(headerless, features)
+    assert list(selected.columns) == ["sex", "length", prepare.label_column]
+    assert selected.iloc[0].tolist() == ["F", 0.4, 9]
+
+
+def write_model(path, preprocessor=None):
+    with tarfile.open(path, "w:gz") as tar:
+        if preprocessor is not None:
+            data = json.dumps(preprocessor.to_dict()).encode()
+            info = tarfile.TarInfo("preprocessor/preprocessor.json")
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return str(path)
+
+
+def test_warm_start_applies_the_approved_model_preprocessor(prepare, tmp_path, monkeypatch):
+    df = abalone(prepare)
+    champion = prepare.StreamingStats(["length", "diameter"], ["sex"]).update(df.iloc[:100]).finalize()
+    model_data = write_model(tmp_path / "model.tar.gz", champion)
+    monkeypatch.setattr(prepare, "get_approved_model_data", lambda group, session: model_data)
+    preprocessor, found = prepare.load_warm_start_preprocessor("AbalonePackageGroup")
+    assert found == model_data
+    assert preprocessor.to_dict() == champion.to_dict()
+
+    # Applied as it is, not refitted on the new rows
+    features = preprocessor.numeric_features + preprocessor.categorical_features
+    table = df[features + [prepare.label_column]]
+
+    def read_chunks(source, chunk_size, features=None):
+        return (table.iloc[start:start + chunk_size] for start in range(0, len(table), chunk_size))
+
+    monkeypatch.setattr(prepare, "read_chunks", read_chunks)
+    for name in prepare.split_names + ["raw_test", "preprocessor", "profile"]:
+        (tmp_path / name).mkdir()
+    prepare.run_streaming("s3://table", str(tmp_path), 90, features=features, preprocessor=preprocessor)
+    assert json.loads((tmp_path / "preprocessor" / "preprocessor.json").read_text()) == champion.to_dict()
+    assert json.loads((tmp_path / "profile" / "profile.json").read_text())["rows"] == len(df)
+
+
+def test_no_warm_start_without_an_approved_preprocessor(prepare, tmp_path, monkeypatch, caplog):
+    monkeypatch.setattr(prepare, "get_approved_model_data", lambda group, session: None)
+    assert prepare.load_warm_start_preprocessor("AbalonePackageGroup") is None
+    model_data = write_model(tmp_path / "model.tar.gz")
+    monkeypatch.setattr(prepare, "get_approved_model_data", lambda group, session: model_data)
+    assert prepare.load_warm_start_preprocessor("AbalonePackageGroup") is None
+    assert [record.levelname for record in caplog.records].count("WARNING") == 2
+
+
+def incremental_table(prepare, tmp_path, monkeypatch, objects):
+    """Serves ``objects`` (path to DataFrame) as the table and records the paths read."""
+    read = []
+
+    def read_chunks(paths, chunk_size, features=None):
+        read.extend(paths)
+        return (objects[path] for path in paths)
+
+    monkeypatch.setattr(prepare, "list_table_objects", lambda location: {path: f'"{path}"' for path in objects})
+    monkeypatch.setattr(prepare, "read_chunks", read_chunks)
+    for name in prepare.split_names + ["raw_test", "preprocessor", "profile"]:
+        (tmp_path / name).mkdir(exist_ok=True)
+    return read
+
+
+def test_incremental_runs_read_only_the_new_objects(prepare, tmp_path, monkeypatch):
+    df = abalone(prepare, rows=300)
+    objects = {"s3://table/a.csv": df.iloc[:100], "s3://table/b.csv": df.iloc[100:200]}
+    read = incremental_table(prepare, tmp_path, monkeypatch, objects)
+    state_uri = str(tmp_path / "state.json")
+    prepare.run_incremental("s3://table", str(tmp_path), 50, state_uri)
+    first = json.loads((tmp_path / "preprocessor" / "preprocessor.json").read_text())
+
+    read.clear()
+    objects["s3://table/c.csv"] = df.iloc[200:]
+    prepare.run_incremental("s3://table", str(tmp_path), 50, state_uri)
+    # Fitted and written from the new object alone, with the preprocessor of the earlier part
+    assert read == ["s3://table/c.csv", "s3://table/c.csv"]
+    assert json.loads((tmp_path / "preprocessor" / "preprocessor.json").read_text()) == first
+    state = json.loads((tmp_path / "state.json").read_text())
+    assert state["stats"]["rows"] == len(df)
+    assert len(set(state["versions"].values())) == 1
+    assert len(list((tmp_path / "train").glob("train-*.csv"))) == 2
+
+    read.clear()
+    prepare.run_incremental("s3://table", str(tmp_path), 50, state_uri)
+    assert read == []
+
+
+def test_incremental_refit_rewrites_every_part(prepare, tmp_path, monkeypatch):
+    df = abalone(prepare, rows=300, seed=2)
+    objects = {"s3://table/a.csv": df.iloc[:100]}
+    read = incremental_table(prepare, tmp_path, monkeypatch, objects)
+    state_uri = str(tmp_path / "state.json")
+    prepare.run_incremental("s3://table", str(tmp_path), 50, state_uri)
+    objects["s3://table/b.csv"] = df.iloc[100:]
+    prepare.run_incremental("s3://table", str(tmp_path), 50, state_uri)
+
+    read.clear()
+    prepare.run_incremental("s3://table", str(tmp_path), 50, state_uri, refit=True)
+    assert sorted(read) == ["s3://table/a.csv", "s3://table/b.csv"]
+    refitted = prepare.StreamingStats().update(df).finalize()
+    saved = json.loads((tmp_path / "preprocessor" / "preprocessor.json").read_text())
+    assert np.allclose(saved["means"], refitted.means)
+    state = json.loads((tmp_path / "state.json").read_text())
+    assert state["stats"]["rows"] == len(df)
+    assert set(state["versions"].values()) == {prepare.preprocessor_version(prepare.Preprocessor.from_dict(saved))}
@@ -0,0 +1,63 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# SPDX-License-Identifier: MIT-0
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Serving functions of the batch transform model, for the SageMaker XGBoost framework container.
+
+Requests are raw abalone records as CSV, with or without a header row (see ``RAW_COLUMNS`` in
+``main.py``). The fitted preprocessor is read from ``PREPROCESSOR_URI`` (S3 URI or local path)
+when the model is loaded, and applied to every request before predicting.
+"""
+import io
+import os
+import tempfile
+
+from main import parse_csv, predict
+from model_io import MODEL_FILE, load_booster
+from preprocessor import ARTIFACT_NAME, Preprocessor
+
+
+def load_preprocessor(uri):
+    if not uri.startswith("s3://"):
+        return Preprocessor.load(uri)
+    import boto3
+
+    bucket, _, key = uri.replace("s3://", "", 1).partition("/")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, ARTIFACT_NAME)
+        boto3.client("s3").download_file(bucket, key, path)
+        return Preprocessor.load(path)
+
+
+def model_fn(model_dir):
+    return load_booster(os.path.join(model_dir, MODEL_FILE)), load_preprocessor(os.environ["PREPROCESSOR_URI"])
+
+
+def input_fn(request_body, content_type):
+    if content_type != "text/csv":
+        raise ValueError(f"Unsupported content type {content_type}, expected text/csv")
+    if isinstance(request_body, bytes):
+        request_body = request_body.decode()
+    return request_body
+
+
+def predict_fn(input_data, model):
+    booster, preprocessor = model
+    return predict(parse_csv(io.StringIO(input_data), preprocessor), booster, preprocessor)
+
+
+def output_fn(predictions, accept):
+    return "\n".join(f"{value:.9g}" for value in predictions) + "\n", "text/csv"
@@ -0,0 +1,251 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# SPDX-License-Identifier: MIT-0
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Offline batch scoring of raw abalone records.
+
+Reads CSV or Parquet files in chunks, applies the fitted preprocessor and predicts with the
+trained booster across a process pool. The booster and preprocessor are loaded before the pool
+is created, so forked workers share them instead of loading their own copies. At most
+``2 * workers`` chunks are in flight and predictions are written in input order, so memory is
+bounded by the chunk size whatever the size of the input. Run it locally with::
+
+    python main.py --model model.tar.gz --preprocessor preprocessor.json --input data/ --output-dir out
+"""
+import argparse
+import collections
+import json
+import logging
+import os
+import pathlib
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Shared helpers: packaged next to the script in the serving container, mounted in processing jobs
+sys.path.append(str(pathlib.Path(__file__).resolve().parent / "helpers"))
+sys.path.append(os.environ.get("HELPERS_DIR", "/opt/ml/processing/input/helpers"))
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[2] / "helpers"))
+from model_io import load_model_artifact
+from preprocessor import Preprocessor
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+logger.addHandler(logging.StreamHandler())
+
+# Column layout of headerless CSV input, as in the abalone table; a trailing label is ignored
+RAW_COLUMNS = [
+    "sex",
+    "length",
+    "diameter",
+    "height",
+    "whole_weight",
+    "shucked_weight",
+    "viscera_weight",
+    "shell_weight",
+    "rings",
+]
+
+# Booster and preprocessor, loaded before the pool is created so that forked workers share them
+_model = {}
+
+
+def parse_csv(source, preprocessor, **kwargs):
+    """Reads CSV with or without a header row into a DataFrame of the raw feature columns.
+
+    Args:
+        source: path or file-like object
+        kwargs: passed on to ``pd.read_csv``, ``chunksize`` returns an iterator of DataFrames
+    """
+    features = preprocessor.numeric_features + preprocessor.categorical_features
+    if hasattr(source, "read"):
+        first = source.readline()
+        source.seek(0)
+    else:
+        with open(source) as f:
+            first = f.readline()
+    first = first.decode() if isinstance(first, bytes) else first
+    if set(features) <= {name.strip() for name in first.split(",")}:
+        return pd.read_csv(source, usecols=features, **kwargs)
+    return pd.read_csv(
+        source, header=None, names=RAW_COLUMNS[:first.count(",") + 1], usecols=features, **kwargs
+    )
+
+
+def iter_chunks(path, preprocessor, chunk_size):
+    """Yields DataFrames of at most ``chunk_size`` rows holding the raw features of a file."""
+    if path.suffix == ".parquet":
+        columns = preprocessor.numeric_features + preprocessor.categorical_features
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from parse_csv(path, preprocessor, chunksize=chunk_size)
+
+
+def predict(chunk, booster=None, preprocessor=None):
+    """Transforms raw rows and predicts them without building a ``DMatrix``."""
+    booster = booster or _model["booster"]
+    preprocessor = preprocessor or _model["preprocessor"]
+    return booster.inplace_predict(preprocessor.transform(chunk).astype(np.float32))
+
+
+class PredictionWriter:
+    """Writes one prediction per input row, as lines of text or a Parquet ``prediction`` column."""
+
+    def __init__(self, path, output_format):
+        self.output_format = output_format
+        if output_format == "parquet":
+            self.writer = pq.ParquetWriter(path, pa.schema([("prediction", pa.float32())]))
+        else:
+            self.writer = open(path, "w")
+
+    def write(self, predictions):
+        if self.output_format == "parquet":
+            self.writer.write_table(pa.table({"prediction": np.asarray(predictions, dtype=np.float32)}))
+        else:
+            np.savetxt(self.writer, predictions, fmt="%.9g")
+
+    def close(self):
+        self.writer.close()
+
+
+def input_files(input_path, input_format):
+    path = pathlib.Path(input_path)
+    if path.is_file():
+        return [path]
+    return sorted(path.glob(f"*.{input_format}"))
+
+
+def score_file(path, writer, pool, chunk_size, max_in_flight):
+    """Scores one file, keeping at most ``max_in_flight`` chunks queued in the pool.
+
+    Returns:
+        number of rows scored
+    """
+    chunks = iter_chunks(path, _model["preprocessor"], chunk_size)
+    if pool is None:
+        results = (predict(chunk) for chunk in chunks)
+    else:
+        results = ordered_results(pool, chunks, max_in_flight)
+    rows = 0
+    for predictions in results:
+        writer.write(predictions)
+        rows += len(predictions)
+    return rows
+
+
+def ordered_results(pool, chunks, max_in_flight):
+    """Yields the predictions of each chunk in input order, submitting ahead up to ``max_in_flight``."""
+    pending = collections.deque()
+    for chunk in chunks:
+        pending.append(pool.submit(predict, chunk))
+        if len(pending) >= max_in_flight:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def score(
+    model,
+    preprocessor_path,
+    input_path,
+    output_dir,
+    input_format="csv",
+    output_format="csv",
+    chunk_size=10000,
+    workers=None,
+):
+    """Scores every input file into ``output_dir``, see the module docstring.
+
+    Args:
+        model: local path or S3 URI of the model.tar.gz
+        preprocessor_path: the ``preprocessor.json`` written by the preprocessing step
+        input_path: file, or directory of ``*.{input_format}`` files
+        workers: scoring processes, every core by default
+
+    Returns:
+        dict with the row count, the seconds and the rows per second
+    """
+    workers = workers or os.cpu_count() or 1
+    booster = load_model_artifact(model)
+    # One thread per process, the pool provides the parallelism
+    booster.set_param({"nthread": 1 if workers > 1 else os.cpu_count() or 1})
+    _model["booster"], _model["preprocessor"] = booster, Preprocessor.load(preprocessor_path)
+
+    pathlib.Path(output_dir).mkdir(parents=True, exist_ok=True)
+    paths = input_files(input_path, input_format)
+    logger.info(f"Scoring {len(paths)} files with {workers} processes in chunks of {chunk_size} rows")
+    start = time.perf_counter()
+    rows = 0
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        for path in paths:
+            suffix = ".parquet" if output_format == "parquet" else ".out"
+            writer = PredictionWriter(pathlib.Path(output_dir) / f"{path.name}{suffix}", output_format)
+            try:
+                rows += score_file(path, writer, pool, chunk_size, 2 * workers)
+            finally:
+                writer.close()
+    finally:
+        if pool:
+            pool.shutdown()
+    seconds = time.perf_counter() - start
+    stats = {
+        "files": len(paths),
+        "rows": rows,
+        "workers": workers,
+        "chunk_size": chunk_size,
+        "seconds": seconds,
+        "rows_per_second": rows / seconds if seconds else 0.0,
+    }
+    logger.info(f"Scored {rows} rows in {seconds:.2f}s ({stats['rows_per_second']:.0f} rows/s)")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--model",
+        type=str,
+        default="/opt/ml/processing/model/model.tar.gz",
+        help="Local path or S3 URI of the model.tar.gz",
+    )
+    parser.add_argument("--preprocessor", type=str, default="/opt/ml/processing/preprocessor/preprocessor.json")
+    parser.add_argument("--input", type=str, default="/opt/ml/processing/input/data")
+    parser.add_argument("--input-format", type=str, default="csv", choices=["csv", "parquet"])
+    parser.add_argument("--output-dir", type=str, default="/opt/ml/processing/output")
+    parser.add_argument("--output-format", type=str, default="csv", choices=["csv", "parquet"])
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--workers", type=int, default=0, help="Scoring processes; 0 uses every core")
+    args = parser.parse_args()
+
+    stats = score(
+        args.model,
+        args.preprocessor,
+        args.input,
+        args.output_dir,
+        args.input_format,
+        args.output_format,
+        args.chunk_size,
+        args.workers or None,
+    )
+    with open(pathlib.Path(args.output_dir) / "scoring_stats.json", "w") as f:
+        json.dump(stats, f, indent=2)
@@ -14,3 +14,419 @@
 # HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
 # SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Script-mode XGBoost training of the abalone model with early stopping and throughput stats."""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import pathlib
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from xgboost.tracker import RabitTracker
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+logger.addHandler(logging.StreamHandler())
+
+# Shared helpers are packaged with the code (or mounted in processing jobs); fall back to the
+# repo layout for local runs
+sys.path.append(str(pathlib.Path(__file__).resolve().parent / "helpers"))
+sys.path.append(os.environ.get("HELPERS_DIR", "/opt/ml/processing/input/helpers"))
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[2] / "helpers"))
+from model_io import PREPROCESSOR_FILE, load_model_artifact, read_member_bytes, save_booster
+from model_registry import WARM_START_FILE
+
+CHECKPOINT_PREFIX = "xgboost-checkpoint-"
+
+
+def detect_cores():
+    """Number of cores available to this process, as seen by SageMaker or the OS."""
+    if os.environ.get("SM_NUM_CPUS"):
+        return int(os.environ["SM_NUM_CPUS"])
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def current_rss_mb():
+    """Resident memory of the process in MiB, the peak if the current value is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10
+
+
+def channel_files(channel_dir):
+    """Sorted csv and parquet parts of a channel."""
+    return sorted(p for p in pathlib.Path(channel_dir).iterdir() if p.suffix in (".csv", ".parquet"))
+
+
+def read_channel(channel_dir, paths=None):
+    """Reads every csv or parquet part of a channel, or only ``paths``, label in the first column.
+
+    Returns:
+        (features, labels) as float32 arrays
+    """
+    paths = channel_files(channel_dir) if paths is None else paths
+    if not paths:
+        raise ValueError(f"No csv or parquet files in {channel_dir}")
+    frames = [
+        pd.read_parquet(path) if path.suffix == ".parquet" else pd.read_csv(path, header=None) for path in paths
+    ]
+    data = pd.concat(frames, ignore_index=True).to_numpy(dtype=np.float32)
+    return data[:, 1:], data[:, 0]
+
+
+def start_tracker(host_ip, port, n_workers):
+    """Starts the tracker that connects the workers of a distributed job."""
+    tracker = RabitTracker(n_workers=n_workers, host_ip=host_ip, port=port)
+    if hasattr(tracker, "worker_args"):  # XGBoost >= 2.0
+        tracker.start()
+    else:
+        tracker.start(n_workers)
+    return tracker
+
+
+def stop_tracker(tracker):
+    """Waits until every worker has disconnected from the tracker."""
+    if hasattr(tracker, "wait_for"):  # XGBoost >= 2.0
+        tracker.wait_for()
+    else:
+        tracker.join()
+
+
+def communicator_args(tracker_ip, port, n_workers, task_id):
+    """Arguments of ``xgb.collective.CommunicatorContext`` in the naming of the installed version."""
+    if hasattr(RabitTracker, "worker_args"):  # XGBoost >= 2.0
+        return {"dmlc_tracker_uri": tracker_ip, "dmlc_tracker_port": port, "dmlc_task_id": task_id}
+    return {
+        "DMLC_TRACKER_URI": tracker_ip,
+        "DMLC_TRACKER_PORT": port,
+        "DMLC_NUM_WORKER": n_workers,
+        "DMLC_TASK_ID": task_id,
+    }
+
+
+@contextlib.contextmanager
+def collective(hosts, current_host, tracker_host, port):
+    """Joins the workers of all hosts, the first host also running the tracker.
+
+    Yields nothing and does nothing for a single host.
+    """
+    if len(hosts) == 1:
+        yield
+        return
+    tracker_ip = socket.gethostbyname(tracker_host or hosts[0])
+    tracker = start_tracker(tracker_ip, port, len(hosts)) if current_host == hosts[0] else None
+    try:
+        with xgb.collective.CommunicatorContext(**communicator_args(tracker_ip, port, len(hosts), current_host)):
+            logger.info(f"Joined {len(hosts)} workers as rank {xgb.collective.get_rank()}")
+            yield
+    finally:
+        if tracker is not None:
+            stop_tracker(tracker)
+
+
+def launch_local_workers(count):
+    """Runs this script as ``count`` local worker processes joined through a local tracker.
+
+    Each worker reads every ``count``-th file of the train channel, like ``ShardedByS3Key``.
+    """
+    argv = []
+    skip = False
+    for arg in sys.argv[1:]:
+        if skip:
+            skip = False
+        elif arg == "--local-workers":
+            skip = True
+        elif not arg.startswith("--local-workers="):
+            argv.append(arg)
+    hosts = [f"local-{index}" for index in range(count)]
+    workers = [
+        subprocess.Popen(
+            [sys.executable, __file__, *argv, "--hosts", ",".join(hosts), "--current-host", host]
+            + ["--tracker-host", "127.0.0.1", "--shard-files"]
+        )
+        for host in hosts
+    ]
+    codes = [worker.wait() for worker in workers]
+    if any(codes):
+        raise RuntimeError(f"Local workers exited with {codes}")
+
+
+class Checkpoint(xgb.callback.TrainingCallback):
+    """Saves the booster every ``interval`` rounds, keeping only the latest checkpoint."""
+
+    def __init__(self, directory, interval):
+        super().__init__()
+        self.directory = pathlib.Path(directory)
+        self.interval = interval
+
+    def after_iteration(self, model, epoch, evals_log):
+        if (epoch + 1) % self.interval == 0:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path = self.directory / f"{CHECKPOINT_PREFIX}{epoch + 1:06d}.json"
+            # Write then rename, so an interruption never leaves a partial latest checkpoint
+            partial = self.directory / f".{path.name}"
+            model.save_model(str(partial))
+            os.replace(partial, path)
+            for old in self.directory.glob(f"{CHECKPOINT_PREFIX}*.json"):
+                if old != path:
+                    old.unlink()
+        return False
+
+
+def latest_checkpoint(directory):
+    """Loads the most recent checkpoint of ``directory``, None if there is none."""
+    paths = sorted(pathlib.Path(directory).glob(f"{CHECKPOINT_PREFIX}*.json")) if directory else []
+    if not paths:
+        return None
+    booster = xgb.Booster(model_file=str(paths[-1]))
+    logger.info(f"Resuming from checkpoint {paths[-1]} with {booster.num_boosted_rounds()} rounds")
+    return booster
+
+
+def load_warm_start(preprocessor_dir):
+    """Loads the booster that preprocessing transformed the data for, None without a warm start.
+
+    With a warm start, preprocessing applies the preprocessor packaged with the latest approved
+    model instead of fitting one, and names that model in ``warm_start.json`` next to
+    ``preprocessor.json``. The approved booster splits on features scaled by that preprocessor,
+    so it is still only continued when its artifact holds the same one, and training starts from
+    scratch otherwise.
+    """
+    reference = os.path.join(preprocessor_dir, WARM_START_FILE) if preprocessor_dir else None
+    if not reference or not os.path.isfile(reference):
+        return None
+    with open(reference) as f:
+        model_data = json.load(f)["model_data"]
+    try:
+        stored = json.loads(read_member_bytes(model_data, PREPROCESSOR_FILE))
+    except KeyError:
+        logger.warning(f"{model_data} has no {PREPROCESSOR_FILE}, training from scratch")
+        return None
+    with open(os.path.join(preprocessor_dir, "preprocessor.json")) as f:
+        current = json.load(f)
+    if stored != current:
+        logger.warning(f"{model_data} was trained with another preprocessor than the data, training from scratch")
+        return None
+    booster = load_model_artifact(model_data, use_cache=False)
+    logger.info(f"Warm starting from {model_data} with {booster.num_boosted_rounds()} rounds")
+    return booster
+
+
+class RoundStats(xgb.callback.TrainingCallback):
+    """Records the wall-clock time, resident memory and evaluation metrics of every round."""
+
+    def __init__(self):
+        super().__init__()
+        self.rounds = []
+        self._start = None
+
+    def before_iteration(self, model, epoch, evals_log):
+        self._start = time.perf_counter()
+        return False
+
+    def after_iteration(self, model, epoch, evals_log):
+        metrics = {
+            f"{data}-{metric}": float(values[-1]) for data, data_log in evals_log.items() for metric, values in data_log.items()
+        }
+        self.rounds.append(
+            {"round": epoch, "seconds": time.perf_counter() - self._start, "rss_mb": current_rss_mb(), **metrics}
+        )
+        # One line per round for the metric definitions of the training job
+        logger.info(" ".join([f"round={epoch}"] + [f"{name}={value:.6f}" for name, value in metrics.items()]))
+        return False
+
+
+def train(args):
+    """Trains the booster and writes the best-iteration model and the training stats.
+
+    With several hosts the workers train one model collectively, each on its shard of the
+    train channel, and the first host saves it.
+    """
+    with collective(args.hosts, args.current_host, args.tracker_host, args.tracker_port):
+        return _train(args)
+
+
+def _train(args):
+    nthread = args.nthread or detect_cores()
+    start = time.perf_counter()
+    validation = None
+    if args.validation and os.path.isdir(args.validation):
+        validation = read_channel(args.validation)
+    paths = channel_files(args.train)
+    if args.shard_files:
+        index = args.hosts.index(args.current_host)
+        paths = paths[index::len(args.hosts)]
+    if paths:
+        X_train, y_train = read_channel(args.train, paths)
+    elif len(args.hosts) > 1 and validation is not None:
+        # A host can get no file when there are fewer files than hosts, it still has to join
+        logger.warning(f"No training files for {args.current_host}, joining with an empty shard")
+        X_train, y_train = np.empty((0, validation[0].shape[1]), dtype=np.float32), np.empty(0, dtype=np.float32)
+    else:
+        raise ValueError(f"No csv or parquet files in {args.train}")
+    dtrain = xgb.DMatrix(X_train, label=y_train, nthread=nthread)
+    evals = [(dtrain, "train")]
+    if validation is not None:
+        evals.append((xgb.DMatrix(validation[0], label=validation[1], nthread=nthread), "validation"))
+    load_seconds = time.perf_counter() - start
+    logger.info(f"Loaded {dtrain.num_row()} training rows in {load_seconds:.2f}s, training with {nthread} threads")
+
+    params = {
+        "objective": args.objective,
+        "eval_metric": args.eval_metric,
+        "tree_method": args.tree_method,
+        "nthread": nthread,
+        "max_depth": args.max_depth,
+        "eta": args.eta,
+        "gamma": args.gamma,
+        "min_child_weight": args.min_child_weight,
+        "subsample": args.subsample,
+        "max_bin": args.max_bin,
+        "seed": args.seed,
+    }
+    # A warm start adds num_round rounds to the approved booster, a checkpoint of this job
+    # (e.g. after a spot interruption) resumes where it stopped
+    preprocessor_path = os.path.join(args.preprocessor, "preprocessor.json") if args.preprocessor else None
+    warm_start = load_warm_start(args.preprocessor)
+    initial_rounds = warm_start.num_boosted_rounds() if warm_start is not None else 0
+    booster = latest_checkpoint(args.checkpoint_dir) or warm_start
+    done = booster.num_boosted_rounds() if booster is not None else 0
+    if booster is not None and booster.num_features() != dtrain.num_col():
+        raise ValueError(f"The model to continue has {booster.num_features()} features, the data {dtrain.num_col()}")
+
+    stats = RoundStats()
+    callbacks = [stats]
+    # Every worker holds the same model, the first host checkpoints it
+    if args.checkpoint_dir and args.checkpoint_frequency > 0 and args.current_host == args.hosts[0]:
+        callbacks.append(Checkpoint(args.checkpoint_dir, args.checkpoint_frequency))
+    early_stopping = args.early_stopping_rounds if len(evals) > 1 and args.early_stopping_rounds > 0 else None
+    remaining = initial_rounds + args.num_round - done
+    start = time.perf_counter()
+    if remaining > 0:
+        booster = xgb.train(
+            params,
+            dtrain,
+            num_boost_round=remaining,
+            evals=evals,
+            early_stopping_rounds=early_stopping,
+            callbacks=callbacks,
+            verbose_eval=False,
+            xgb_model=booster,
+        )
+    else:
+        logger.info(f"The checkpoint already has all {done} rounds")
+        early_stopping = None
+    train_seconds = time.perf_counter() - start
+
+    # Keep only the trees up to the best validation round
+    best_iteration, best_score = None, None
+    if early_stopping:
+        best_iteration, best_score = booster.best_iteration, float(booster.best_score)
+        booster = booster[: best_iteration + 1]
+        logger.info(f"Best iteration {best_iteration} with validation-{args.eval_metric}={best_score}")
+
+    # Every worker holds the same model, the first host saves it
+    if args.current_host == args.hosts[0]:
+        save_booster(booster, args.model_dir, args.model_format)
+        # The preprocessor goes with the model, to check the features it is later applied to
+        if preprocessor_path and os.path.isfile(preprocessor_path):
+            destination = pathlib.Path(args.model_dir) / PREPROCESSOR_FILE
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(preprocessor_path, destination)
+
+    summary = {
+        "instance_type": os.environ.get("SM_CURRENT_INSTANCE_TYPE"),
+        "host": args.current_host,
+        "hosts": len(args.hosts),
+        "nthread": nthread,
+        "tree_method": args.tree_method,
+        "train_rows": dtrain.num_row(),
+        "load_seconds": load_seconds,
+        "train_seconds": train_seconds,
+        "initial_rounds": initial_rounds,
+        "resumed_rounds": done - initial_rounds,
+        "rounds": len(stats.rounds),
+        "rounds_per_second": len(stats.rounds) / train_seconds if train_seconds else None,
+        "rows_per_second": dtrain.num_row() * len(stats.rounds) / train_seconds if train_seconds else None,
+        "mean_round_seconds": float(np.mean([r["seconds"] for r in stats.rounds])) if stats.rounds else None,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10,
+        "best_iteration": best_iteration,
+        "best_score": best_score,
+    }
+    logger.info(f"Training stats: {json.dumps(summary)}")
+    pathlib.Path(args.output_data_dir).mkdir(parents=True, exist_ok=True)
+    stats_name = "training_stats.json" if len(args.hosts) == 1 else f"training_stats-{args.current_host}.json"
+    with open(os.path.join(args.output_data_dir, stats_name), "w") as f:
+        json.dump({"summary": summary, "rounds": stats.rounds}, f, indent=2)
+    return booster
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    # Hyperparameters, named like those of the built-in algorithm
+    parser.add_argument("--objective", type=str, default="reg:squarederror")
+    parser.add_argument("--eval_metric", type=str, default="rmse")
+    parser.add_argument("--num_round", type=int, default=50)
+    parser.add_argument("--early_stopping_rounds", type=int, default=10)
+    parser.add_argument("--tree_method", type=str, default="hist")
+    parser.add_argument("--nthread", type=int, default=0, help="0 uses every detected core")
+    parser.add_argument("--max_depth", type=int, default=5)
+    parser.add_argument("--eta", type=float, default=0.2)
+    parser.add_argument("--gamma", type=float, default=4)
+    parser.add_argument("--min_child_weight", type=float, default=6)
+    parser.add_argument("--subsample", type=float, default=0.7)
+    parser.add_argument("--max_bin", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--model_format", type=str, default="ubj", choices=["ubj", "json"])
+    # SageMaker locations
+    parser.add_argument("--model-dir", type=str, default=os.environ.get("SM_MODEL_DIR", "/opt/ml/model"))
+    parser.add_argument("--output-data-dir", type=str, default=os.environ.get("SM_OUTPUT_DATA_DIR", "/opt/ml/output/data"))
+    parser.add_argument("--train", type=str, default=os.environ.get("SM_CHANNEL_TRAIN", "/opt/ml/input/data/train"))
+    parser.add_argument(
+        "--validation", type=str, default=os.environ.get("SM_CHANNEL_VALIDATION", "/opt/ml/input/data/validation")
+    )
+    parser.add_argument("--checkpoint_frequency", type=int, default=10, help="Rounds between checkpoints, 0 disables them")
+    parser.add_argument(
+        "--checkpoint-dir",
+        type=str,
+        default="/opt/ml/checkpoints" if os.path.isdir("/opt/ml/checkpoints") else None,
+        help="Synced with checkpoint_s3_uri by SageMaker",
+    )
+    parser.add_argument(
+        "--preprocessor",
+        type=str,
+        default=os.environ.get("SM_CHANNEL_PREPROCESSOR"),
+        help="Directory with the preprocessor.json of the train and validation data, and warm_start.json",
+    )
+    # Distributed training, the hosts default to those of the SageMaker training job
+    parser.add_argument("--hosts", type=str, default=",".join(json.loads(os.environ.get("SM_HOSTS", '["algo-1"]'))))
+    parser.add_argument("--current-host", type=str, default=os.environ.get("SM_CURRENT_HOST", "algo-1"))
+    parser.add_argument("--tracker-host", type=str, default=None, help="Address of the tracker, the first host by default")
+    parser.add_argument("--tracker_port", type=int, default=9099)
+    parser.add_argument(
+        "--shard-files",
+        action="store_true",
+        help="Read every n-th train file per host, when the channel is not already sharded by S3 key",
+    )
+    parser.add_argument("--local-workers", type=int, default=0, help="Run as this many local worker processes")
+    args, _ = parser.parse_known_args()
+    args.hosts = args.hosts.split(",")
+    if args.local_workers > 1:
+        launch_local_workers(args.local_workers)
+    else:
+        train(args)
@@ -0,0 +1,181 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# SPDX-License-Identifier: MIT-0
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Parallel k-fold cross-validation of the abalone model.
+
+The train and validation splits are pooled and cut into ``k`` folds. Every fold is trained in
+its own process with ``cores / k`` threads, so all folds run at once and the wall-clock time
+stays close to that of a single training run. The mean and spread of the fold metrics are
+written to ``cv.json``, which evaluation merges into ``evaluation.json``.
+"""
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import pathlib
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import xgboost as xgb
+
+
+def load_training_module():
+    """Loads the training entry point, mounted at ``TRAINING_DIR`` in processing jobs."""
+    training_dir = pathlib.Path(os.environ.get("TRAINING_DIR", "/opt/ml/processing/input/training"))
+    if not (training_dir / "__main__.py").exists():
+        training_dir = pathlib.Path(__file__).resolve().parent
+    spec = importlib.util.spec_from_file_location("xgboost_training", training_dir / "__main__.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# Shares the data loading and core detection of the training job, and its logging setup
+training = load_training_module()
+logger = logging.getLogger()
+
+# Training arguments that are not booster parameters
+non_booster_keys = {"num_round", "early_stopping_rounds", "checkpoint_frequency", "tracker_port"}
+
+# Pooled rows, loaded before the pool is created so that forked workers share them
+_data = {}
+
+
+def fold_indices(n_rows, k, seed):
+    """Held-out row indices of each of ``k`` folds from a seeded permutation."""
+    return np.array_split(np.random.default_rng(seed).permutation(n_rows), k)
+
+
+def run_fold(fold, held_out, params, num_round, early_stopping_rounds, validation_fraction=0.2):
+    """Trains on every row outside ``held_out`` and scores the held-out rows.
+
+    Early stopping watches an inner validation split carved from the training rows, so the
+    held-out fold plays no part in training and its metrics are an unbiased estimate.
+
+    Args:
+        validation_fraction: share of the training rows held back for early stopping, unused
+            without early stopping
+
+    Returns:
+        dict with the fold number, its metrics, the rounds kept and the seconds spent
+    """
+    start = time.perf_counter()
+    X, y = _data["X"], _data["y"]
+    mask = np.ones(len(y), dtype=bool)
+    mask[held_out] = False
+    train_rows = np.flatnonzero(mask)
+    evals = []
+    if early_stopping_rounds:
+        train_rows = np.random.default_rng([params["seed"], fold]).permutation(train_rows)
+        n_validation = max(1, int(len(train_rows) * validation_fraction))
+        validation_rows, train_rows = train_rows[:n_validation], train_rows[n_validation:]
+        dvalidation = xgb.DMatrix(X[validation_rows], label=y[validation_rows], nthread=params["nthread"])
+        evals.append((dvalidation, "validation"))
+    dtrain = xgb.DMatrix(X[train_rows], label=y[train_rows], nthread=params["nthread"])
+    dtest = xgb.DMatrix(X[held_out], label=y[held_out], nthread=params["nthread"])
+    booster = xgb.train(
+        params,
+        dtrain,
+        num_boost_round=num_round,
+        evals=evals,
+        early_stopping_rounds=early_stopping_rounds or None,
+        verbose_eval=False,
+    )
+    rounds = booster.best_iteration + 1 if early_stopping_rounds else booster.num_boosted_rounds()
+    predictions = booster.predict(dtest, iteration_range=(0, rounds))
+    errors = y[held_out] - predictions
+    mse = float(np.mean(errors ** 2))
+    return {
+        "fold": fold,
+        "mse": mse,
+        "rmse": float(np.sqrt(mse)),
+        "mae": float(np.mean(np.abs(errors))),
+        "rounds": rounds,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def cross_validate(X, y, hyperparameters, k, seed=0, workers=None, validation_fraction=0.2):
+    """Runs the ``k`` folds concurrently.
+
+    Args:
+        hyperparameters: training hyperparameters, as passed to the training job
+        workers: number of fold processes, ``k`` by default
+        validation_fraction: share of each fold's training rows used for early stopping
+
+    Returns:
+        dict with the per-fold results and the mean and standard deviation of each metric
+    """
+    workers = min(workers or k, k)
+    nthread = max(1, training.detect_cores() // workers)
+    params = {
+        "objective": "reg:squarederror",
+        "eval_metric": "rmse",
+        "tree_method": "hist",
+        **{name: value for name, value in hyperparameters.items() if name not in non_booster_keys},
+        "nthread": nthread,
+        "seed": seed,
+    }
+    num_round = int(hyperparameters.get("num_round", 100))
+    early_stopping_rounds = int(hyperparameters.get("early_stopping_rounds", 0))
+
+    _data["X"], _data["y"] = X, y
+    logger.info(f"Cross-validating {len(y)} rows in {k} folds with {workers} processes of {nthread} threads")
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(run_fold, fold, held_out, params, num_round, early_stopping_rounds, validation_fraction)
+            for fold, held_out in enumerate(fold_indices(len(y), k, seed))
+        ]
+        folds = [future.result() for future in futures]
+
+    report = {"k": k, "seconds": time.perf_counter() - start, "folds": folds}
+    for metric in ["mse", "rmse", "mae"]:
+        values = [fold[metric] for fold in folds]
+        report[metric] = {"mean": float(np.mean(values)), "standard_deviation": float(np.std(values))}
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--hyperparameters", type=str, default="{}", help="JSON object of training hyperparameters")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=0, help="Fold processes, 0 runs every fold at once")
+    parser.add_argument(
+        "--validation-fraction", type=float, default=0.2, help="Share of each fold's training rows for early stopping"
+    )
+    parser.add_argument("--train", type=str, default="/opt/ml/processing/train")
+    parser.add_argument("--validation", type=str, default="/opt/ml/processing/validation")
+    parser.add_argument("--output-dir", type=str, default="/opt/ml/processing/cv")
+    # Content hash of the step inputs, only used to key the SageMaker step cache
+    parser.add_argument("--cache-key", type=str, default=None)
+    args = parser.parse_args()
+
+    X_train, y_train = training.read_channel(args.train)
+    X_validation, y_validation = training.read_channel(args.validation)
+    X, y = np.concatenate((X_train, X_validation)), np.concatenate((y_train, y_validation))
+    report = cross_validate(
+        X, y, json.loads(args.hyperparameters), args.folds, args.seed, args.workers, args.validation_fraction
+    )
+
+    pathlib.Path(args.output_dir).mkdir(parents=True, exist_ok=True)
+    with open(f"{args.output_dir}/cv.json", "w") as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Cross-validation mse {report['mse']['mean']:.4f} +/- {report['mse']['standard_deviation']:.4f}")
@@ -0,0 +1,45 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# SPDX-License-Identifier: MIT-0
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import numpy as np
+
+
+def test_folds_partition_the_rows(cross_validate):
+    folds = cross_validate.fold_indices(103, 5, seed=0)
+    assert len(folds) == 5
+    assert sorted(np.concatenate(folds).tolist()) == list(range(103))
+    assert all(np.array_equal(a, b) for a, b in zip(folds, cross_validate.fold_indices(103, 5, seed=0)))
+
+
+def test_early_stopping_does_not_see_the_held_out_fold(cross_validate):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(400, 3)).astype(np.float32)
+    y = (X[:, 0] * 2 + rng.normal(size=400)).astype(np.float32)
+    held_out = cross_validate.fold_indices(len(y), 4, seed=0)[0]
+    params = {"objective": "reg:squarederror", "eval_metric": "rmse", "nthread": 1, "seed": 0}
+    cross_validate._data["X"], cross_validate._data["y"] = X, y
+    result = cross_validate.run_fold(0, held_out, params, num_round=200, early_stopping_rounds=5)
+    assert 1 <= result["rounds"] < 200
+    assert np.isclose(result["rmse"], np.sqrt(result["mse"]))
+
+    # Other held-out labels change the score but not the rounds picked by early stopping
+    shifted = y.copy()
+    shifted[held_out] += 10
+    cross_validate._data["y"] = shifted
+    again = cross_validate.run_fold(0, held_out, params, num_round=200, early_stopping_rounds=5)
+    assert again["rounds"] == result["rounds"]
+    assert again["mse"] > result["mse"]
@@ -0,0 +1,76 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# SPDX-License-Identifier: MIT-0
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import io
+import json
+import tarfile
+
+import numpy as np
+import xgboost as xgb
+
+from model_io import MODEL_FILE, PREPROCESSOR_FILE
+from model_registry import WARM_START_FILE
+
+PREPROCESSOR = {"numeric_features": ["length"], "categorical_features": [], "means": [0.5], "scales": [0.1]}
+
+
+def write_model(path, preprocessor):
+    X = np.random.default_rng(0).normal(size=(100, 1))
+    booster = xgb.train({"nthread": 1}, xgb.DMatrix(X, label=X[:, 0]), num_boost_round=3)
+    members = {MODEL_FILE: bytes(booster.save_raw("ubj"))}
+    if preprocessor is not None:
+        members[PREPROCESSOR_FILE] = json.dumps(preprocessor).encode()
+    with tarfile.open(path, "w:gz") as tar:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return str(path)
+
+
+def write_preprocessor_output(directory, preprocessor, model_data=None):
+    """The ``preprocessor`` output of preprocessing, naming the warm start model if there is one."""
+    directory.mkdir()
+    (directory / "preprocessor.json").write_text(json.dumps(preprocessor))
+    if model_data is not None:
+        (directory / WARM_START_FILE).write_text(json.dumps({"model_data": model_data}))
+    return str(directory)
+
+
+def test_warm_start_continues_a_model_with_the_same_preprocessor(tmp_path, training):
+    model_data = write_model(tmp_path / "model.tar.gz", PREPROCESSOR)
+    preprocessor_dir = write_preprocessor_output(tmp_path / "preprocessor", PREPROCESSOR, model_data)
+    assert training.load_warm_start(preprocessor_dir).num_boosted_rounds() == 3
+
+
+def test_no_warm_start_without_a_warm_start_model(tmp_path, training):
+    assert training.load_warm_start(write_preprocessor_output(tmp_path / "preprocessor", PREPROCESSOR)) is None
+    assert training.load_warm_start(None) is None
+
+
+def test_warm_start_is_refused_when_the_preprocessor_differs(tmp_path, training):
+    model_data = write_model(tmp_path / "model.tar.gz", PREPROCESSOR)
+    preprocessor_dir = write_preprocessor_output(
+        tmp_path / "preprocessor", {**PREPROCESSOR, "means": [0.6]}, model_data
+    )
+    assert training.load_warm_start(preprocessor_dir) is None
+
+
+def test_warm_start_is_refused_without_a_packaged_preprocessor(tmp_path, training):
+    model_data = write_model(tmp_path / "model.tar.gz", None)
+    preprocessor_dir = write_preprocessor_output(tmp_path / "preprocessor", PREPROCESSOR, model_data)
+    assert training.load_warm_start(preprocessor_dir) is None
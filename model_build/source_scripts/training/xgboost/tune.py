@@ -0,0 +1,241 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# SPDX-License-Identifier: MIT-0
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Local hyperparameter search for the abalone model with successive halving / Hyperband.
+
+Trials run in a process pool on one machine, each worker holding its own copy of the training
+and validation ``DMatrix``. Every rung continues the surviving boosters for more rounds, so bad
+configurations are dropped after a few rounds instead of being trained to completion::
+
+    python tune.py --train <dir> --validation <dir> --max-rounds 500 --output-dir tuning
+
+The best configuration is written to ``best_hyperparameters.json``, which ``get_pipeline``
+reads through its ``hyperparameters_path`` argument, and every rung of every trial is logged
+to ``trials.jsonl``.
+"""
+import argparse
+import importlib.util
+import json
+import logging
+import math
+import os
+import pathlib
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import xgboost as xgb
+
+
+def load_training_module():
+    """Loads the training entry point next to this file without running it."""
+    spec = importlib.util.spec_from_file_location("xgboost_training", pathlib.Path(__file__).with_name("__main__.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# Shares the data loading and core detection of the training job, and its logging setup
+training = load_training_module()
+logger = logging.getLogger()
+
+# Sampled as (low, high, kind) for every trial
+search_space = {
+    "max_depth": (3, 10, "int"),
+    "eta": (0.01, 0.3, "log"),
+    "gamma": (0.0, 10.0, "uniform"),
+    "min_child_weight": (1.0, 10.0, "uniform"),
+    "subsample": (0.5, 1.0, "uniform"),
+}
+fixed_params = {"objective": "reg:squarederror", "eval_metric": "rmse", "tree_method": "hist"}
+
+# Per worker process, set by init_worker
+_data = {}
+
+
+def sample_config(rng):
+    """Draws one configuration from ``search_space``."""
+    config = {}
+    for name, (low, high, kind) in search_space.items():
+        if kind == "int":
+            config[name] = int(rng.integers(low, high + 1))
+        elif kind == "log":
+            config[name] = float(math.exp(rng.uniform(math.log(low), math.log(high))))
+        else:
+            config[name] = float(rng.uniform(low, high))
+    return config
+
+
+def init_worker(train_dir, validation_dir, nthread):
+    X_train, y_train = training.read_channel(train_dir)
+    X_validation, y_validation = training.read_channel(validation_dir)
+    _data["train"] = xgb.DMatrix(X_train, label=y_train, nthread=nthread)
+    _data["validation"] = xgb.DMatrix(X_validation, label=y_validation, nthread=nthread)
+    _data["nthread"] = nthread
+
+
+def run_trial(trial_id, config, rounds, booster, seed):
+    """Continues ``booster`` (or starts a new one) until it has ``rounds`` trees.
+
+    Returns:
+        (trial_id, booster, best validation score of this rung, number of trees at that score,
+        seconds spent in this rung)
+    """
+    params = dict(fixed_params, nthread=_data["nthread"], seed=seed, **config)
+    done = booster.num_boosted_rounds() if booster is not None else 0
+    history = {}
+    start = time.perf_counter()
+    booster = xgb.train(
+        params,
+        _data["train"],
+        num_boost_round=rounds - done,
+        evals=[(_data["validation"], "validation")],
+        evals_result=history,
+        xgb_model=booster,
+        verbose_eval=False,
+    )
+    seconds = time.perf_counter() - start
+    scores = history["validation"][fixed_params["eval_metric"]]
+    best_round = int(np.argmin(scores))
+    return trial_id, booster, float(scores[best_round]), done + best_round + 1, seconds
+
+
+def successive_halving(pool, configs, min_rounds, max_rounds, reduction, seed, log):
+    """Trains every config for ``min_rounds`` and keeps the best ``1/reduction`` for
+    ``reduction`` times more rounds, until ``max_rounds`` or a single config is left.
+
+    A config is scored by its best validation score over every round so far, and
+    ``best_rounds`` is the number of trees giving that score, so it is the ``num_round`` to
+    train the config with.
+
+    Returns:
+        dict of trial id to ``{"config", "rounds", "best_rounds", "score"}`` of the configs still
+        running at the end
+    """
+    trials = {trial_id: {"config": config, "booster": None} for trial_id, config in configs.items()}
+    rounds = min_rounds
+    while True:
+        futures = [
+            pool.submit(run_trial, trial_id, trial["config"], rounds, trial["booster"], seed)
+            for trial_id, trial in trials.items()
+        ]
+        for future in futures:
+            trial_id, booster, score, best_rounds, seconds = future.result()
+            trial = trials[trial_id]
+            if score < trial.get("score", math.inf):
+                trial.update(score=score, best_rounds=best_rounds)
+            trial.update(booster=booster, rounds=rounds)
+            log(
+                {
+                    "trial": trial_id,
+                    "rounds": rounds,
+                    "best_rounds": trial["best_rounds"],
+                    "score": trial["score"],
+                    "seconds": seconds,
+                    **trial["config"],
+                }
+            )
+        if rounds >= max_rounds or len(trials) == 1:
+            break
+        keep = max(1, len(trials) // reduction)
+        ranked = sorted(trials, key=lambda trial_id: trials[trial_id]["score"])
+        logger.info(f"Keeping {keep} of {len(trials)} configs after {rounds} rounds")
+        trials = {trial_id: trials[trial_id] for trial_id in ranked[:keep]}
+        rounds = min(max_rounds, rounds * reduction)
+    return {
+        trial_id: {
+            "config": trial["config"],
+            "rounds": trial["rounds"],
+            "best_rounds": trial["best_rounds"],
+            "score": trial["score"],
+        }
+        for trial_id, trial in trials.items()
+    }
+
+
+def hyperband(pool, max_rounds, min_rounds, reduction, seed, log, brackets=None):
+    """Runs successive halving brackets trading the number of configs against their first budget.
+
+    Returns:
+        the best ``{"config", "rounds", "best_rounds", "score"}`` over all brackets
+    """
+    rng = np.random.default_rng(seed)
+    max_bracket = int(math.log(max_rounds / min_rounds, reduction) + 1e-9)
+    brackets = max_bracket + 1 if brackets is None else min(brackets, max_bracket + 1)
+    best = None
+    trial_id = 0
+    for bracket in range(max_bracket, max_bracket - brackets, -1):
+        n_configs = int(math.ceil((max_bracket + 1) / (bracket + 1) * reduction ** bracket))
+        first_rounds = max(min_rounds, int(max_rounds / reduction ** bracket))
+        logger.info(f"Bracket {bracket}: {n_configs} configs starting at {first_rounds} rounds")
+        configs = {}
+        for _ in range(n_configs):
+            configs[trial_id] = sample_config(rng)
+            trial_id += 1
+        survivors = successive_halving(pool, configs, first_rounds, max_rounds, reduction, seed, log)
+        for trial in survivors.values():
+            if best is None or trial["score"] < best["score"]:
+                best = trial
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--train", type=str, required=True)
+    parser.add_argument("--validation", type=str, required=True)
+    parser.add_argument("--max-rounds", type=int, default=500, help="Most boosting rounds given to a config")
+    parser.add_argument("--min-rounds", type=int, default=10, help="Rounds of the first rung")
+    parser.add_argument("--reduction", type=int, default=3, help="Keep 1/reduction of the configs at every rung")
+    parser.add_argument("--brackets", type=int, default=None, help="Hyperband brackets, 1 is plain successive halving")
+    parser.add_argument("--workers", type=int, default=0, help="Worker processes, 0 uses every detected core")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output-dir", type=str, default="tuning")
+    args = parser.parse_args()
+
+    cores = training.detect_cores()
+    workers = args.workers or cores
+    nthread = max(1, cores // workers)
+    output_dir = pathlib.Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    start = time.perf_counter()
+    with open(output_dir / "trials.jsonl", "w") as trial_log:
+
+        def log(entry):
+            trial_log.write(json.dumps(entry) + "\n")
+            trial_log.flush()
+
+        logger.info(f"Searching with {workers} workers of {nthread} threads")
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=init_worker, initargs=(args.train, args.validation, nthread)
+        ) as pool:
+            best = hyperband(pool, args.max_rounds, args.min_rounds, args.reduction, args.seed, log, args.brackets)
+
+    result = {
+        "hyperparameters": dict(best["config"], num_round=best["best_rounds"]),
+        "validation_score": best["score"],
+        "eval_metric": fixed_params["eval_metric"],
+        "search_seconds": time.perf_counter() - start,
+    }
+    with open(output_dir / "best_hyperparameters.json", "w") as f:
+        json.dump(result, f, indent=2)
+    logger.info(f"Best configuration: {json.dumps(result)}")
+    return result
+
+
+if __name__ == "__main__":
+    main()